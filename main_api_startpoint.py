@@ -1,8 +1,12 @@
-from typing import Union
+from typing import List, Union
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Response, status
 from pydantic import BaseModel
 
+# Constant time comparison of tokens.
+import hmac
+
 # Import own classes.
 # Insert path to own stuff to allow importing them.
 import os
@@ -13,6 +17,10 @@ sys.path.insert(1, os.path.join(os.path.dirname(__file__), "src/", "definitions"
 
 # Database Connection.
 import databaseWrapper as DatabaseWrapper
+import databaseConnectionPool as DatabaseConnectionPool
+import asyncDatabaseWrapper as AsyncDatabaseWrapper
+import heartbeatBuffer as HeartbeatBuffer
+import toolRegistry as ToolRegistry
 
 # StateCheckItem from own models to use location independent.
 import stateCheckItem as StateCheckItem
@@ -20,15 +28,16 @@ import stateCheckItem as StateCheckItem
 # BackupCheckItem from own models to use location independent.
 import backupCheckItem as BackupCheckItem
 
-# Get environment variables.
-import configUtils as ConfigUtils
-configUtils = ConfigUtils.ConfigUtils()
+# Get configuration settings.
+import configSnapshot as ConfigSnapshot
 
-# StateCheckItem as pydantic model to use with fastAPI.
-# To unify usage, this model should be converted to StateCheckItem asap.
-# @see convertPydanticModelToStateCheckItem().
-class StateCheckItem_pydantic(BaseModel):
-    server_auth_token: str
+# Logger.
+import logger as Logger
+# Log configuration errors of this process under the scope of the api.
+ConfigSnapshot.logScope = "api"
+
+# StateCheckItem without server authentication, as sent within batches.
+class StateCheckBatchItem_pydantic(BaseModel):
     name: str
     description: Union[str, "None"] = "None"
     token: str
@@ -37,12 +46,22 @@ class StateCheckItem_pydantic(BaseModel):
     stateCheckFrequency_inMinutes: int
 
 
+# StateCheckItem as pydantic model to use with fastAPI.
+# To unify usage, this model should be converted to StateCheckItem asap.
+# @see convertPydanticModelToStateCheckItem().
+class StateCheckItem_pydantic(StateCheckBatchItem_pydantic):
+    server_auth_token: str
+
 
-# BackupCheckItem as pydantic model to use with fastAPI.
-# To unify usage, this model should be converted to BackupCheckItem asap.
-# @see convertPydanticModelToBackupCheckItem().
-class BackupCheckItem_pydantic(BaseModel):
+# Many StateCheckItems sent with a single server authentication.
+class StateCheckBatch_pydantic(BaseModel):
     server_auth_token: str
+    items: List[StateCheckBatchItem_pydantic]
+
+
+
+# BackupCheckItem without server authentication, as sent within batches.
+class BackupCheckBatchItem_pydantic(BaseModel):
     name: str
     description: Union[str, "None"] = "None"
     token: str
@@ -51,8 +70,56 @@ class BackupCheckItem_pydantic(BaseModel):
     mostRecentBackupFile_hash: str
 
 
+# BackupCheckItem as pydantic model to use with fastAPI.
+# To unify usage, this model should be converted to BackupCheckItem asap.
+# @see convertPydanticModelToBackupCheckItem().
+class BackupCheckItem_pydantic(BackupCheckBatchItem_pydantic):
+    server_auth_token: str
+
+
+# Many BackupCheckItems sent with a single server authentication.
+class BackupCheckBatch_pydantic(BaseModel):
+    server_auth_token: str
+    items: List[BackupCheckBatchItem_pydantic]
+
+
+# Server authentication only, used for endpoints that do not need any other data.
+class ServerAuthentication_pydantic(BaseModel):
+    server_auth_token: str
+
+
+# Non-blocking database access for the endpoints.
+asyncDbWrapper = AsyncDatabaseWrapper.AsyncDatabaseWrapper()
+
+# Names and token hashes of known tools, to validate heartbeats without the database.
+toolRegistry = ToolRegistry.ToolRegistry(ConfigSnapshot.getConfig().toolRegistryTimeToLiveInSeconds)
+
+# Write-behind buffer for heartbeats of known tools (None, if disabled).
+heartbeatBuffer = None
+if ConfigSnapshot.getConfig().heartbeatBufferFlushIntervalInMilliseconds > 0:
+    heartbeatBuffer = HeartbeatBuffer.HeartbeatBuffer(ConfigSnapshot.getConfig().heartbeatBufferFlushIntervalInMilliseconds)
+
+
+# Startup and shutdown of the api.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Fill the tool registry. Without it, tokens are validated by the database until the tools send heartbeats.
+    if toolRegistry.isEnabled():
+        try:
+            toolRegistry.load(await asyncDbWrapper.getAllToolTokens())
+        except Exception as e:
+            Logger.Logger("api").logError(f"main_api_startpoint.lifespan(). Could not load tool registry: {e}")
+    if heartbeatBuffer is not None:
+        heartbeatBuffer.start()
+    yield
+    # Write buffered heartbeats and let running database operations finish.
+    if heartbeatBuffer is not None:
+        heartbeatBuffer.stop()
+    asyncDbWrapper.shutdown()
+
+
 # Instantiate Fast API.
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 @app.get("/")
 async def root_get():
@@ -64,30 +131,70 @@ async def root_get():
 async def statecheck(stateCheckItem_pydantic: StateCheckItem_pydantic, response: Response):
     if is_server_authentication_token_valid(stateCheckItem_pydantic.server_auth_token):
         stateCheckItem = convertPydanticModelToStateCheckItem(stateCheckItem_pydantic)
-        dbWrapper = DatabaseWrapper.DatabaseWrapper()
-        stateCheckItem = dbWrapper.createOrUpdateStateCheck(stateCheckItem)
+
+        # Reject tokens of known tools right away and acknowledge valid heartbeats without waiting for the next flush.
+        tokenState = toolRegistry.checkToken(stateCheckItem.name, stateCheckItem.token)
+        if tokenState == ToolRegistry.TOKEN_INVALID:
+            response.status_code = 401
+            return {"message": "invalid tool token"}
+        if tokenState == ToolRegistry.TOKEN_VALID and heartbeatBuffer is not None:
+            heartbeatBuffer.add(stateCheckItem)
+            return
+
+        stateCheckItem = await asyncDbWrapper.createOrUpdateStateCheck(stateCheckItem)
         if stateCheckItem == None:
             response.status_code = 401
             return {"message": "invalid tool token"}
         else:
+            toolRegistry.remember(stateCheckItem)
             return 
     else:
         response.status_code = 401
         return {"message": "invalid server authentication token"}
 
 
+# Start checking or update the availability of many tools with a single request.
+# All items are written in one transaction, the result of each item is returned in the same order.
+@app.post("/v1/statecheck/batch")
+async def statecheck_batch(stateCheckBatch_pydantic: StateCheckBatch_pydantic, response: Response):
+    if is_server_authentication_token_valid(stateCheckBatch_pydantic.server_auth_token):
+        stateCheckItems = [convertPydanticModelToStateCheckItem(item) for item in stateCheckBatch_pydantic.items]
+
+        # Only items not rejected by the tool registry are written.
+        results = [DatabaseWrapper.HEARTBEAT_INVALID_TOKEN] * len(stateCheckItems)
+        itemIndexesToWrite = [
+            index for index, stateCheckItem in enumerate(stateCheckItems)
+            if toolRegistry.checkToken(stateCheckItem.name, stateCheckItem.token) != ToolRegistry.TOKEN_INVALID
+        ]
+        if itemIndexesToWrite:
+            writeResults = await asyncDbWrapper.createOrUpdateStateChecks([stateCheckItems[index] for index in itemIndexesToWrite])
+            for index, result in zip(itemIndexesToWrite, writeResults):
+                results[index] = result
+                if result != DatabaseWrapper.HEARTBEAT_INVALID_TOKEN:
+                    toolRegistry.remember(stateCheckItems[index])
+        return {"results": convertHeartbeatResultsToResponse(stateCheckItems, results)}
+    else:
+        response.status_code = 401
+        return {"message": "invalid server authentication token"}
+
+
 # Stop checking the availablity of a watched tool.
 @app.post("/v1/statecheck/stop")
 async def stop_statecheck(stateCheckItem_pydantic: StateCheckItem_pydantic, response: Response):
     if is_server_authentication_token_valid(stateCheckItem_pydantic.server_auth_token):
         stateCheckItem = convertPydanticModelToStateCheckItem(stateCheckItem_pydantic)
-        dbWrapper = DatabaseWrapper.DatabaseWrapper()
-        stateCheckItem = dbWrapper.stopStateCheck(stateCheckItem)
-        if stateCheckItem == None:
+        if toolRegistry.checkToken(stateCheckItem.name, stateCheckItem.token) == ToolRegistry.TOKEN_INVALID:
+            response.status_code = 401
+            return {"message": "invalid token"}
+        stopResult = await asyncDbWrapper.stopStateCheck(stateCheckItem)
+        if stopResult == None:
             response.status_code = 401
             return {"message": "invalid token"}
         else:
-            return stateCheckItem
+            toolRegistry.forget(stateCheckItem.name)
+            if heartbeatBuffer is not None:
+                heartbeatBuffer.forgetTool(stateCheckItem.name)
+            return stopResult
     else:
         response.status_code = 401
         return {"message": "invalid server authentication token"}
@@ -99,8 +206,7 @@ async def stop_statecheck(stateCheckItem_pydantic: StateCheckItem_pydantic, resp
 async def backupcheck(backupCheckItem_pydantic: BackupCheckItem_pydantic, response: Response):
     if is_server_authentication_token_valid(backupCheckItem_pydantic.server_auth_token):
         backupCheckItem = convertPydanticModelToBackupCheckItem(backupCheckItem_pydantic)
-        dbWrapper = DatabaseWrapper.DatabaseWrapper()
-        backupCheckItem = dbWrapper.createOrUpdateBackupCheck(backupCheckItem)
+        backupCheckItem = await asyncDbWrapper.createOrUpdateBackupCheck(backupCheckItem)
         if backupCheckItem == None:
             response.status_code = 401
             return {"message": "invalid token"}
@@ -110,13 +216,24 @@ async def backupcheck(backupCheckItem_pydantic: BackupCheckItem_pydantic, respon
         response.status_code = 401
         return {"message": "invalid server authentication token"}
 
+# Start or update many backup checks with a single request.
+# All items are written in one transaction, the result of each item is returned in the same order.
+@app.post("/v1/backupcheck/batch")
+async def backupcheck_batch(backupCheckBatch_pydantic: BackupCheckBatch_pydantic, response: Response):
+    if is_server_authentication_token_valid(backupCheckBatch_pydantic.server_auth_token):
+        backupCheckItems = [convertPydanticModelToBackupCheckItem(item) for item in backupCheckBatch_pydantic.items]
+        results = await asyncDbWrapper.createOrUpdateBackupChecks(backupCheckItems)
+        return {"results": convertHeartbeatResultsToResponse(backupCheckItems, results)}
+    else:
+        response.status_code = 401
+        return {"message": "invalid server authentication token"}
+
 # Stop checking the availablity of a watched tool.
 @app.post("/v1/backupcheck/stop")
 async def stop_backupcheck(backupCheckItem_pydantic: BackupCheckItem_pydantic, response: Response):
     if is_server_authentication_token_valid(backupCheckItem_pydantic.server_auth_token):
         backupCheckItem = convertPydanticModelToBackupCheckItem(backupCheckItem_pydantic)
-        dbWrapper = DatabaseWrapper.DatabaseWrapper()
-        backupCheckItem = dbWrapper.stopBackupCheck(backupCheckItem)
+        backupCheckItem = await asyncDbWrapper.stopBackupCheck(backupCheckItem)
         if backupCheckItem == None:
             response.status_code = 401
             return {"message": "invalid token"}
@@ -128,8 +245,23 @@ async def stop_backupcheck(backupCheckItem_pydantic: BackupCheckItem_pydantic, r
 
 
 
-# Converts pydantic StateCheckItem_pydantic to StateCheckItem.
-def convertPydanticModelToStateCheckItem(stateCheckItem_pydantic: StateCheckItem_pydantic):
+# Get internal metrics of the api process (e.g. database connection pool usage).
+@app.post("/v1/metrics")
+async def metrics(serverAuthentication_pydantic: ServerAuthentication_pydantic, response: Response):
+    if is_server_authentication_token_valid(serverAuthentication_pydantic.server_auth_token):
+        return {
+            "databaseConnectionPool": DatabaseConnectionPool.getDatabaseConnectionPool().getMetrics(),
+            "heartbeatBuffer": heartbeatBuffer.getMetrics() if heartbeatBuffer is not None else None,
+            "toolRegistry": toolRegistry.getMetrics(),
+        }
+    else:
+        response.status_code = 401
+        return {"message": "invalid server authentication token"}
+
+
+
+# Converts pydantic StateCheckItem_pydantic (or StateCheckBatchItem_pydantic) to StateCheckItem.
+def convertPydanticModelToStateCheckItem(stateCheckItem_pydantic: StateCheckBatchItem_pydantic):
 
     # Ensure description is set.
     if stateCheckItem_pydantic.description == None:
@@ -154,8 +286,8 @@ def convertPydanticModelToStateCheckItem(stateCheckItem_pydantic: StateCheckItem
 
 
 
-# Converts pydantic BackupCheckItem_pydantic to BackupCheckItem.
-def convertPydanticModelToBackupCheckItem(backupCheckItem_pydantic: BackupCheckItem_pydantic):
+# Converts pydantic BackupCheckItem_pydantic (or BackupCheckBatchItem_pydantic) to BackupCheckItem.
+def convertPydanticModelToBackupCheckItem(backupCheckItem_pydantic: BackupCheckBatchItem_pydantic):
 
     # Ensure description is set.
     if backupCheckItem_pydantic.description == None:
@@ -173,6 +305,23 @@ def convertPydanticModelToBackupCheckItem(backupCheckItem_pydantic: BackupCheckI
 
 
 
+# Status code per heartbeat result of batch requests.
+heartbeatResultStatusCodes = {
+    DatabaseWrapper.HEARTBEAT_UPDATED: 200,
+    DatabaseWrapper.HEARTBEAT_CREATED: 201,
+    DatabaseWrapper.HEARTBEAT_INVALID_TOKEN: 401,
+}
+
+# Converts the heartbeat results of a batch to the per item response.
+def convertHeartbeatResultsToResponse(items, results):
+    return [
+        {"name": item.name, "status_code": heartbeatResultStatusCodes[result], "message": result}
+        for item, result in zip(items, results)
+    ]
+
+
+
 # Is server authentication token valid?
+# Compared in constant time, so that response times do not leak how much of the token matched.
 def is_server_authentication_token_valid(server_auth_token: str):
-    return configUtils.getServerAuthenticationToken() == server_auth_token
+    return hmac.compare_digest(ConfigSnapshot.getConfig().serverAuthenticationToken.encode(), server_auth_token.encode())
@@ -1,12 +1,17 @@
 ## Execute this file to test if tools are up and running.
 
-# Api for listening to bot commands.
-import telebot
-import time
+# Idempotency keys of notifications.
+import hashlib
+import json
+import uuid
 
 # Be able to write trace to logfile.
 import traceback
 
+# Give up the lease of this replica, when stopped.
+import atexit
+import signal
+
 # Import own classes.
 # Insert path to utils to allow importing them.
 import os
@@ -17,32 +22,70 @@ sys.path.insert(1, os.path.join(os.path.dirname(__file__), "definitions"))
 
 # Own Utils, classes and other imports.
 import stateCheckUtils
-import stringUtils
 import logger as Logger
 import databaseWrapper as DatabaseWrapper
-import configUtils as ConfigUtils
+import configSnapshot as ConfigSnapshot
 import emailUtils as EmailUtils
+import checkScheduler as CheckScheduler
+import toolExpiryTimers as ToolExpiryTimers
+import notificationOutbox as NotificationOutbox
+import telegramSender as TelegramSender
+import notificationCoalescer as NotificationCoalescer
+import toolStateSnapshot as ToolStateSnapshot
+import checkerShards as CheckerShards
 
 ## Initialize vars.
 
-# Get config.
-configUtils = ConfigUtils.ConfigUtils()
-
 # Instantiate classes.
-# Database connection.
-dbWrapper = DatabaseWrapper.DatabaseWrapper()
 # Logger.
 logger = Logger.Logger("check_tools")
 
-# Initialize bots.
-botToken = configUtils.getTelegramBotToken()
-bot = telebot.TeleBot(botToken, parse_mode="HTML")
-errorChatIDs = configUtils.getTelegramErrorChatsIDs()
-infoChatIDs = configUtils.getTelegramInfoChatsIDs()
-
 # Initialize email messaging.
 emailUtils = EmailUtils.EmailUtils()
 
+# Initialize telegram messaging.
+telegramSender = TelegramSender.TelegramSender()
+
+# Telegram messages and emails are only enqueued by the checks and delivered by the workers of the outbox,
+# so that slow or failing delivery does not delay the checks.
+notificationOutbox = NotificationOutbox.NotificationOutbox(
+    {"telegram": telegramSender.send, "email": lambda recipient, subject, text, deliveredParts: emailUtils.send_mail(recipient, subject, text)},
+    ConfigSnapshot.getConfig().notificationWorkers,
+    ConfigSnapshot.getConfig().notificationMaxAttempts)
+
+
+# Enqueue a notification for the error or info recipients (recipientType "error" or "info") of telegram and email.
+# Notifications with the key of a pending notification or repeating the last keys of all their topics are ignored.
+# Returns False, if the notification has been ignored.
+def enqueueNotification(recipientType, text, idempotencyKey, topicKeys=None, viaTelegram=True, viaEmail=True):
+    config = ConfigSnapshot.getConfig()
+    deliveries = []
+    if viaTelegram and config.telegramEnabled:
+        chatIDs = config.telegramErrorChatIDs if recipientType == "error" else config.telegramInfoChatIDs
+        deliveries += [("telegram", chatID, None, text) for chatID in chatIDs]
+    if viaEmail and config.emailEnabled:
+        addresses = config.emailErrorAddresses if recipientType == "error" else config.emailInfoAddresses
+        subject = "State Checker Error" if recipientType == "error" else "State Checker Information"
+        # One email rendered once and sent to all addresses (as BCC).
+        if addresses:
+            deliveries.append(("email", list(addresses), subject, text))
+    return notificationOutbox.enqueue(idempotencyKey, deliveries, topicKeys)
+
+# Database session owned by the loop and reused by all checks, see getLoopDbWrapper().
+loopDbWrapper = None
+
+
+# Get the database session of the loop.
+# Refreshed on every call: pinged (and reconnected, if the server closed it) and with a new transaction,
+# so that heartbeats written by the api meanwhile are visible.
+def getLoopDbWrapper():
+    global loopDbWrapper
+    if loopDbWrapper is None:
+        loopDbWrapper = DatabaseWrapper.DatabaseWrapper()
+    else:
+        loopDbWrapper.refreshSession()
+    return loopDbWrapper
+
 
 # Handles error exceptions (log and info to admin).
 def handleCommandException(exceptionLocationAndAdditionalInformation, exception):
@@ -53,220 +96,337 @@ def handleCommandException(exceptionLocationAndAdditionalInformation, exception)
     traceOfError = traceback.format_exc()
     logger.logError(str(traceOfError) + "\n" + errorLogText)
 
-    # Send error message to admin telegram chat, if intended.
-    if configUtils.areTelegramStatusMessagesEnabled():
-        bot = telebot.TeleBot(botToken, parse_mode="HTML")
-        for errorChatID in errorChatIDs:
-            bot.send_message(errorChatID, errorLogText)
-
-    # Send mails.
-    emailUtils.send_error_mails(errorLogText)
+    # Send error message to admin telegram chats and mails. The same error is only sent once while pending.
+    enqueueNotification("error", errorLogText, "error:" + hashlib.sha1(errorLogText.encode()).hexdigest())
 
 
 # Info, that checking schedule is still taking place (log and info).
 def infoCheckingToolsIsWorking(justStartedChecking=False, telegramTimeReached=False, emailTimeReached=False):
+    # Get current config.
+    config = ConfigSnapshot.getConfig()
+
     # Create info text.
     infoLogText = "<b><u>Tools are being checked.</u></b>\nWebsites are being checked every <b>" + str(
-        checkWebsitesEveryXMinutes) + "</b> minutes"
+        config.websiteChecksEveryXMinutes) + "</b> minutes"
     if justStartedChecking:
         infoLogText += "\nJust (re-)started checking tools.\n"
         
         # Telegram message enabled? -> Add frequency info.
-        if configUtils.areTelegramStatusMessagesEnabled():
-            infoLogText += "\nAbout every <b>" + str(telegramMessageEveryXMinutes) + "</b> minutes a telegram message should be send, to verify that this program is still working correctly."
+        if config.telegramEnabled:
+            infoLogText += "\nAbout every <b>" + str(config.telegramStatusMessagesEveryXMinutes) + "</b> minutes a telegram message should be send, to verify that this program is still working correctly."
         
         # Email message enabled? -> Add frequency info.
-        if configUtils.areEmailStatusMessagesEnabled():
-            infoLogText += "\nAbout every <b>" + str(emailMessageEveryXMinutes) + "</b> minutes a status email should be send, to verify that this program is still working correctly."
+        if config.emailEnabled:
+            infoLogText += "\nAbout every <b>" + str(config.emailStatusMessagesEveryXMinutes) + "</b> minutes a status email should be send, to verify that this program is still working correctly."
     else:
         infoLogText += "\n\nThis is an information to ensure, that the program is working correctly.\n"
         
         # Telegram message enabled and telegramtimeReached? -> Add frequency info.
-        if configUtils.areTelegramStatusMessagesEnabled() and telegramTimeReached:
+        if config.telegramEnabled and telegramTimeReached:
             infoLogText += "\nThis message should show up again in " + str(
-            telegramMessageEveryXMinutes) + " minutes, verifying that this program is still working correctly."
+            config.telegramStatusMessagesEveryXMinutes) + " minutes, verifying that this program is still working correctly."
         
         # Email message enabled and emailtimeReached? -> Add frequency info.
-        if configUtils.areEmailStatusMessagesEnabled() and emailTimeReached:
+        if config.emailEnabled and emailTimeReached:
             infoLogText += "\nThis message should show up again in " + str(
-            emailMessageEveryXMinutes) + " minutes, verifying that this program is still working correctly."
+            config.emailStatusMessagesEveryXMinutes) + " minutes, verifying that this program is still working correctly."
 
     infoLogText += "\nIf not -> Try to restart this program and take a look at the logs."
 
-    # Add status message of checked tools.
-    infoLogText += "\n\n" + stateCheckUtils.getToolStatesMessage()
+    # In sharded mode, each replica only lists the tools it checks.
+    if checkerShards is not None:
+        infoLogText += "\n\nThis is replica <b>" + checkerShards.replicaID + "</b> of <b>" + str(len(checkerShards.getReplicaIDs())) + \
+            "</b> replicas sharing the checks. Only the tools checked by this replica are listed."
+
+    # Add status message of checked tools, rendered from the states the checks determined last.
+    infoLogText += "\n\n" + stateCheckUtils.getToolStatesMessage(getToolStateSnapshot().getToolStates())
 
     # Log information.
     logger.logInformation(infoLogText)
 
-    # Send message to admin telegram chat, if enabled and time reached.
-    if configUtils.areTelegramStatusMessagesEnabled() and (justStartedChecking or telegramTimeReached):
+    # Send message to admin telegram chats and mails, if time reached.
+    enqueueNotification("info", infoLogText, "status:" + uuid.uuid4().hex,
+        viaTelegram=justStartedChecking or telegramTimeReached, viaEmail=justStartedChecking or emailTimeReached)
 
-        # Does message have to be split?
-        if len(infoLogText) > 4096:
 
-            # Split message.
-            individualMessages = stringUtils.splitLongTextIntoWorkingMessages(infoLogText)
+# Latest states of all tools, replaced by each check and rendered by the status messages, see toolStateSnapshot.py.
+toolStateSnapshot = ToolStateSnapshot.ToolStateSnapshot()
 
-            # Send messages.
-            bot = telebot.TeleBot(botToken, parse_mode="HTML")
-            for individualMessage in individualMessages:
-                for infoChatID in infoChatIDs:
-                    bot.send_message(infoChatID, individualMessage)
 
-        else:
-            # Message does not have to be split.
-            bot = telebot.TeleBot(botToken, parse_mode="HTML")
-            for infoChatID in infoChatIDs:
-                bot.send_message(infoChatID, infoLogText)
-
-    # Send mails.
-    if justStartedChecking or emailTimeReached:
-        emailUtils.send_info_mails(infoLogText)
+# Get the latest states of all tools for a status message.
+# If the last api check only selected tools whose state changed, all tools are selected once
+# and kept in the snapshot, so that status messages sent at the same time share the query.
+def getToolStateSnapshot():
+    global toolStateSnapshot
+    if not toolStateSnapshot.hasToolStates("api"):
+        toolStateSnapshot = toolStateSnapshot.withToolStates("api", stateCheckUtils.getToolStates_api(dbWrapper=getLoopDbWrapper()))
+    return toolStateSnapshot
 
 
-## Check whether a scheduled countdown has to be sent.
+# Collect state changes of tools to send them as digests, see notificationCoalescer.py.
+notificationCoalescer = NotificationCoalescer.NotificationCoalescer(lambda: ConfigSnapshot.getConfig().notificationDigestWindowInSeconds)
 
-# Only print every xth time, that we are still checking.
-printEvery = 100
 
-# When to send messages?
-telegramMessageEveryXMinutes = configUtils.getTelegramStatusMessagesEveryXMinutes()
-emailMessageEveryXMinutes = configUtils.getEmailStatusMessagesEveryXMinutes()
+# Collect tools whose state changed and send the digest of changes, if its window is over.
+# The DB is only updated once the digest has been enqueued. Until then, the next iterations find the tools again
+# and the coalescer only keeps their latest change.
+def processToolStateItems(toolStateItems, dbWrapper):
 
-# How often to check websiteStates.
-checkWebsitesEveryXMinutes = configUtils.getWebsiteChecksEveryXMinutes()
-# How often to check google drive backups.
-checkGoogleDriveEveryXMinutes = configUtils.getGoogleDriveChecksEveryXMinutes()
+    # Check the states of the tools.
+    unchangedTopics = []
+    for toolStateItem in toolStateItems:
 
-i = 0
-print("checking ...")
-infoCheckingToolsIsWorking(True)
-while True:
+        # Is the tool down and the error message has not been sent yet or is it up again after an error message?
+        if toolStateItem.toolIsUp == toolStateItem.toolIsDownMessageHasBeenSent:
+            # Output info.
+            if toolStateItem.toolIsUp == False:
+                print("Found tool, that is is down and message has not been sent yet..")
+            else:
+                print("Found tool, that is up again..")
+            print(toolStateItem.name)
+            notificationCoalescer.add(getNotificationTopic(toolStateItem), toolStateItem)
+        else:
+            # Stored state is current, e.g. up again within the digest window, so nothing has to be sent.
+            unchangedTopics.append(getNotificationTopic(toolStateItem))
+    forgetNotificationTopics(unchangedTopics)
+
+    # Send digest right away or wake up, when its window is over.
+    sendNotificationDigest(dbWrapper)
+    scheduler.rescheduleCheck("notificationDigest")
+
+
+# Drop collected changes and forget the notifications of tools, whose state is stored as reported already.
+def forgetNotificationTopics(topics):
+    for topic in topics:
+        notificationCoalescer.discard(topic)
+    notificationOutbox.forgetTopics(topics)
+
+
+# Send the collected state changes, if their window is over, and store that the messages have been sent.
+def sendNotificationDigest(dbWrapper=None):
+    # Leave tools handed over meanwhile (or while the lease of this replica ran out) to the replica checking them now.
+    toolStateItemsByTopic = {topic: toolStateItem for topic, toolStateItem in notificationCoalescer.popDue().items()
+        if stateCheckUtils.isCheckedByThisReplica(topic)}
+    if not toolStateItemsByTopic:
+        return
+    print("sending message now..")
+
+    # Messages of all changes, down first.
+    toolStateItems = sorted(toolStateItemsByTopic.values(), key=lambda toolStateItem: toolStateItem.toolIsUp)
+    toolStateMessages = [getToolStateChangedMessage(toolStateItem) for toolStateItem in toolStateItems]
+    if len(toolStateItems) == 1:
+        digestMessage = toolStateMessages[0]
+    else:
+        amountOfToolsDown = sum(1 for toolStateItem in toolStateItems if toolStateItem.toolIsUp == False)
+        digestMessage = "<b>" + str(len(toolStateItems)) + " tools changed their state</b> (" + str(amountOfToolsDown) + " down, " + str(
+            len(toolStateItems) - amountOfToolsDown) + " up again)\n\n" + "\n\n".join(toolStateMessages)
+
+    # Enqueue before updating the DB. If the update fails, the changes are found again
+    # and the outbox ignores the repeated digest, as it repeats the last state of all its tools.
+    # The DB is updated in that case as well, as the digest has been enqueued before.
+    topicKeys = {topic: "up" if toolStateItem.toolIsUp else "down" for topic, toolStateItem in toolStateItemsByTopic.items()}
+    digestKey = "digest:" + hashlib.sha1(json.dumps(topicKeys, sort_keys=True).encode()).hexdigest()
+    enqueueNotification("error", digestMessage, digestKey, topicKeys)
+
+    # Indicate to DB, that messages have been sent.
+    # Afterwards the DB tells whether a state has been reported, so the outbox forgets the topics of the stored states.
+    dbWrapper = dbWrapper or getLoopDbWrapper()
+    storedTopics = []
     try:
-        # Always recreate database to avoid disconnection error.
-        dbWrapper = DatabaseWrapper.DatabaseWrapper()
-
-        ## Info that checking of schedule is still taking place.
-
-        # Increment counter.
-        i = i + 1
+        for topic, toolStateItem in toolStateItemsByTopic.items():
+            messageHasBeenSentState = 0 if toolStateItem.toolIsUp else 1
+            if toolStateItem.isCustomCheck == True:
+                dbWrapper.updateWebsiteState(toolStateItem.name, "Up" if toolStateItem.toolIsUp else "Down")
+                dbWrapper.updateWebsiteIsDownMessageHasBeenSentState(toolStateItem.name, messageHasBeenSentState)
+            elif toolStateItem.isBackupCheck == True:
+                dbWrapper.updateBackupIsDownMessageHasBeenSentState(toolStateItem.name, messageHasBeenSentState)
+            else:
+                dbWrapper.updateToolIsDownMessageHasBeenSentState(toolStateItem.name, messageHasBeenSentState)
+            storedTopics.append(topic)
+    finally:
+        notificationOutbox.forgetTopics(storedTopics)
 
-        # Output to console.
-        if (i % printEvery == 0):
-            print("checking (" + str(i) + ") ...")
 
-        # Update google drive backup states.
-        if (i % checkGoogleDriveEveryXMinutes == 1):
-            stateCheckUtils.updateGoogleDriveFolderBackupChecks()
+# Topic of the notifications of a tool.
+def getNotificationTopic(toolStateItem):
+    if toolStateItem.isCustomCheck == True:
+        return "website:" + str(toolStateItem.name)
+    elif toolStateItem.isBackupCheck == True:
+        return "backup:" + str(toolStateItem.name)
+    return "tool:" + str(toolStateItem.name)
 
-        # Get states of tools.
-        toolStateItems_api = stateCheckUtils.getToolStates_api()
-        toolStateItems = toolStateItems_api
-        toolStateItems += stateCheckUtils.getToolStates_backups()
 
-        # Check websites.
-        if (i % checkWebsitesEveryXMinutes == 1):
-            toolStateItems += stateCheckUtils.getToolStates_websites()
+# Message, that a tool is down or up again.
+def getToolStateChangedMessage(toolStateItem):
+    if toolStateItem.toolIsUp == False:
+        toolStateChangedMsg = "Your tool is <b>DOWN!</b> \n\n<b>" + str(toolStateItem.name) + "</b>"
+    else:
+        toolStateChangedMsg = "Your tool is <b>UP AGAIN!</b> \n\n<b>" + str(toolStateItem.name) + "</b>"
+    toolStateChangedMsg += "" if toolStateItem.description == "" else "\n" + str(
+        toolStateItem.description)
+    toolStateChangedMsg += "" if toolStateItem.statusMessage == "" or toolStateItem.statusMessage == "OK" else "\n" + str(
+        toolStateItem.statusMessage)
+    return toolStateChangedMsg
 
-        # Check the states of the tools.
-        for toolStateItem in toolStateItems:
 
-            # Is the tool up?
-            if toolStateItem.toolIsUp == False:
+## Checks run by the scheduler.
 
-                # Tool is down.
-
-                # Has the error message already been sent?
-                if toolStateItem.toolIsDownMessageHasBeenSent == False:
-
-                    # The error message has not been sent yet.
-                    # Output info.
-                    print("Found tool, that is is down and message has not been sent yet..")
-                    print(toolStateItem.name)
-                    print("sending mesage now..")
-
-                    # Indicate, that tool is down message has been sent.
-                    if toolStateItem.isCustomCheck == True:
-                        dbWrapper.updateWebsiteState(toolStateItem.name, "Down")
-                        dbWrapper.updateWebsiteIsDownMessageHasBeenSentState(toolStateItem.name, 1)
-                    elif toolStateItem.isBackupCheck == True:
-                        # Indicate to DB, that message has been sent.
-                        dbWrapper.updateBackupIsDownMessageHasBeenSentState(toolStateItem.name, 1)
-                    else:
-                        # Indicate to DB, that message has been sent.
-                        dbWrapper.updateToolIsDownMessageHasBeenSentState(toolStateItem.name, 1)
-
-                    # Send the message to the error message channel.
-                    toolStateItemIsDownMsg = "Your tool is <b>DOWN!</b> \n\n<b>" + str(toolStateItem.name) + "</b>"
-                    toolStateItemIsDownMsg += "" if toolStateItem.description == "" else "\n" + str(
-                        toolStateItem.description)
-                    toolStateItemIsDownMsg += "" if toolStateItem.statusMessage == "" or toolStateItem.statusMessage == "OK" else "\n" + str(
-                        toolStateItem.statusMessage)
-                    
-                    # Send message to admin telegram chat, if enabled.
-                    if configUtils.areTelegramStatusMessagesEnabled():
-                        bot = telebot.TeleBot(botToken, parse_mode="HTML")
-                        for errorChatID in errorChatIDs:
-                            bot.send_message(errorChatID, toolStateItemIsDownMsg)
-
-                    # Send mails.
-                    emailUtils.send_error_mails(toolStateItemIsDownMsg)
-                    
+# Only print every xth time, that we are still checking.
+printEvery = 100
+toolChecks = 0
+
+# Check tools using the api and backups.
+def checkToolsAndBackups():
+    global toolChecks
+    toolChecks += 1
+
+    # Output to console.
+    if (toolChecks % printEvery == 0):
+        print("checking (" + str(toolChecks) + ") ...")
+        print(scheduler.getMetrics())
+        print(notificationOutbox.getMetrics())
+        print(emailUtils.get_metrics())
+        print(telegramSender.getMetrics())
+        print(notificationCoalescer.getMetrics())
+        print(stateCheckUtils.googleDriveFolderTracker.getMetrics())
+        print(stateCheckUtils.googleDriveClient.getMetrics())
+        if checkerShards is not None:
+            print(checkerShards.getMetrics())
+        if ConfigSnapshot.getConfig().toolExpiryTimersEnabled:
+            print(toolExpiryTimers.getMetrics())
+
+    # Get states of tools.
+    global toolStateSnapshot
+    dbWrapper = getLoopDbWrapper()
+    toolStateItems_api = stateCheckUtils.getToolStates_api(onlyStateChanges=onlyToolStateChanges, dbWrapper=dbWrapper)
+    toolStateItems_backups = stateCheckUtils.getToolStates_backups(dbWrapper)
+    if onlyToolStateChanges:
+        toolStateSnapshot = toolStateSnapshot.withoutToolStates("api")
+        # Tools using the api, that are not part of the changes, have the state stored in the DB.
+        changedTopics = {getNotificationTopic(toolStateItem) for toolStateItem in toolStateItems_api}
+        knownTopics = set(notificationOutbox.getTopics()) | set(notificationCoalescer.getTopics())
+        forgetNotificationTopics([topic for topic in knownTopics if topic.startswith("tool:") and topic not in changedTopics])
+    else:
+        toolStateSnapshot = toolStateSnapshot.withToolStates("api", toolStateItems_api)
+    toolStateSnapshot = toolStateSnapshot.withToolStates("backups", toolStateItems_backups)
+    processToolStateItems(toolStateItems_api + toolStateItems_backups, dbWrapper)
+
+# Report tools using the api down the moment their heartbeat expires (if enabled).
+# Tools are re-read when their timer fires, the periodic reload adds new tools and tools that are up again.
+toolExpiryTimers = ToolExpiryTimers.ToolExpiryTimers()
+toolExpiryTimersReloadEveryXMinutes = 10
+
+def reloadToolExpiryTimers():
+    stateCheckUtils.armToolExpiryTimers_api(toolExpiryTimers, getLoopDbWrapper())
+    scheduler.rescheduleCheck("toolExpiries")
+
+def checkExpiredTools():
+    global toolStateSnapshot
+    dbWrapper = getLoopDbWrapper()
+    toolStateItems = stateCheckUtils.getToolStatesOfExpiredTools_api(toolExpiryTimers, dbWrapper)
+    if toolStateItems:
+        toolStateSnapshot = toolStateSnapshot.withoutToolStates("api")
+    processToolStateItems(toolStateItems, dbWrapper)
+
+def getSecondsUntilNextToolExpiry():
+    secondsUntilNextExpiry = toolExpiryTimers.getSecondsUntilNextExpiry()
+    if secondsUntilNextExpiry is None:
+        return toolExpiryTimersReloadEveryXMinutes * 60
+    return secondsUntilNextExpiry
+
+# Check websites.
+def checkWebsites():
+    global toolStateSnapshot
+    dbWrapper = getLoopDbWrapper()
+    toolStateItems = stateCheckUtils.getToolStates_websites(dbWrapper)
+    toolStateSnapshot = toolStateSnapshot.withToolStates("websites", toolStateItems)
+    processToolStateItems(toolStateItems, dbWrapper)
+
+# Update google drive backup states.
+def checkGoogleDriveFolders():
+    stateCheckUtils.updateGoogleDriveFolderBackupChecks(getLoopDbWrapper())
+
+# Send info messages that tool is still checking.
+def sendTelegramStatusMessage():
+    infoCheckingToolsIsWorking(telegramTimeReached=True)
+
+def sendEmailStatusMessage():
+    infoCheckingToolsIsWorking(emailTimeReached=True)
+
+# Renew the lease of this replica. If replicas joined or left, the tools have been rebalanced:
+# Drop pending notifications and states of tools handed over to other replicas and arm the expiry timers of the tools taken over.
+# Timers of tools handed over are skipped when they fire.
+def renewCheckerLease():
+    global toolStateSnapshot
+    if not checkerShards.renewLease(getLoopDbWrapper()):
+        return
+    print("Replicas changed, checking the tools of " + str(len(checkerShards.getReplicaIDs())) + " replicas now: " + ", ".join(checkerShards.getReplicaIDs()))
+    # Topics of notifications are keys of the ring. Changes of tools handed over are reported by their new replica,
+    # and their last keys must not suppress a notification, once a tool comes back to this replica.
+    knownTopics = set(notificationOutbox.getTopics()) | set(notificationCoalescer.getTopics())
+    forgetNotificationTopics([topic for topic in knownTopics if not stateCheckUtils.isCheckedByThisReplica(topic)])
+    toolStateSnapshot = toolStateSnapshot.withoutToolStates("api")
+    for kind in ("websites", "backups"):
+        if toolStateSnapshot.hasToolStates(kind):
+            toolStateSnapshot = toolStateSnapshot.withToolStates(kind, [toolStateItem for toolStateItem in toolStateSnapshot.getToolStates(kind)
+                if stateCheckUtils.isCheckedByThisReplica(getNotificationTopic(toolStateItem))])
+    if ConfigSnapshot.getConfig().toolExpiryTimersEnabled:
+        reloadToolExpiryTimers()
+
+# Give up the lease, so that the other replicas take over right away.
+def releaseCheckerLease():
+    try:
+        checkerShards.releaseLease(getLoopDbWrapper())
+    except Exception as e:
+        logger.logError("Could not release the lease of replica " + checkerShards.replicaID + ": " + str(e))
 
+# Wake up, when the window of collected state changes is over.
+def getSecondsUntilNotificationDigest():
+    secondsUntilDue = notificationCoalescer.getSecondsUntilDue()
+    if secondsUntilDue is None:
+        return 60
+    return secondsUntilDue
 
-            else:
+# Interval of checks configured in minutes, reduced by the status message offset like before.
+def minutesToInterval(getMinutes):
+    return lambda: ConfigSnapshot.getConfig().calculateOffset(60) * getMinutes(ConfigSnapshot.getConfig())
 
-                # Tool is up.
-
-                # Has there been an error cleared message already ?
-                if toolStateItem.toolIsDownMessageHasBeenSent == True:
-
-                    # There has been an error message recently.
-                    # Output info.
-                    print("Found tool, that is up again..")
-                    print(toolStateItem.name)
-                    print("sending message now..")
-
-                    # Indicate, that tool is up message has been sent.
-                    if toolStateItem.isCustomCheck == True:
-                        dbWrapper.updateWebsiteState(toolStateItem.name, "Up")
-                        dbWrapper.updateWebsiteIsDownMessageHasBeenSentState(toolStateItem.name, 0)
-                    elif toolStateItem.isBackupCheck == True:
-                        # Indicate to DB, that message has been sent.
-                        dbWrapper.updateBackupIsDownMessageHasBeenSentState(toolStateItem.name, 0)
-                    else:
-                        # Indicate to DB, that message has been sent.
-                        dbWrapper.updateToolIsDownMessageHasBeenSentState(toolStateItem.name, 0)
-
-                    # Send the message to the error message channel.
-                    toolStateItemIsUpAgainMsg = "Your tool is <b>UP AGAIN!</b> \n\n<b>" + str(
-                        toolStateItem.name) + "</b>"
-                    toolStateItemIsUpAgainMsg += "" if toolStateItem.description == "" else "\n" + str(
-                        toolStateItem.description)
-                    toolStateItemIsUpAgainMsg += "" if toolStateItem.statusMessage == "" or toolStateItem.statusMessage == "OK" else "\n" + str(
-                        toolStateItem.statusMessage)
-                    
-                    # Send message to admin telegram chat, if enabled.
-                    if configUtils.areTelegramStatusMessagesEnabled():
-                        bot = telebot.TeleBot(botToken, parse_mode="HTML")
-                        for errorChatID in errorChatIDs:
-                            bot.send_message(errorChatID, toolStateItemIsUpAgainMsg)
-
-                    # Send mails.
-                    emailUtils.send_error_mails(toolStateItemIsUpAgainMsg)
-
-        # Send info messages that tool is still checking.
-        if (i % telegramMessageEveryXMinutes == 0):
-            infoCheckingToolsIsWorking(telegramTimeReached=True)
-        if (i % emailMessageEveryXMinutes == 0):
-            infoCheckingToolsIsWorking(emailTimeReached=True)
-
-        # Sleep 60 seconds with calculated offset.
-        time.sleep(configUtils.calculateOffset(60))
 
-    except Exception as e:
-        handleCommandException("An Error occured while checking tools: ", str(e))
+print("checking ...")
 
-        # Sleep 60 seconds with calculated offset.
-        time.sleep(configUtils.calculateOffset(60))
+# Let the DB select only tools whose state changed, if the nextDueAt column can be used.
+onlyToolStateChanges = False
+try:
+    onlyToolStateChanges = getLoopDbWrapper().ensureNextDueAtColumn()
+except Exception as e:
+    logger.logError("Could not add nextDueAt column to checked_tools, evaluating all tools every iteration instead: " + str(e))
+
+# In sharded mode, replicas share the checks, see checkerShards.py. Otherwise this process checks everything.
+checkerShards = None
+if ConfigSnapshot.getConfig().shardingEnabled:
+    getLoopDbWrapper().ensureCheckerReplicasTable()
+    checkerShards = CheckerShards.CheckerShards(ConfigSnapshot.getConfig().checkerReplicaID, ConfigSnapshot.getConfig().checkerLeaseInSeconds)
+    stateCheckUtils.checkerShards = checkerShards
+    atexit.register(releaseCheckerLease)
+    signal.signal(signal.SIGTERM, lambda signalNumber, frame: sys.exit(0))
+
+# Each check is re-armed from its own deadline. Checks due at the same time run in the order they are added here,
+# so that the lease is renewed before anything is checked and Google Drive backups are updated before backups are checked.
+scheduler = CheckScheduler.CheckScheduler(
+    onCheckError=lambda checkName, e: handleCommandException("An Error occured while checking tools (" + checkName + "): ", str(e)))
+if checkerShards is not None:
+    scheduler.addCheck("checkerLease", renewCheckerLease, checkerShards.getRenewIntervalInSeconds)
+scheduler.addCheck("googleDrive", checkGoogleDriveFolders, minutesToInterval(lambda config: config.googleDriveChecksEveryXMinutes))
+scheduler.addCheck("toolsAndBackups", checkToolsAndBackups, minutesToInterval(lambda config: 1))
+scheduler.addCheck("websites", checkWebsites, minutesToInterval(lambda config: config.websiteChecksEveryXMinutes))
+scheduler.addCheck("telegramStatusMessage", sendTelegramStatusMessage, minutesToInterval(lambda config: config.telegramStatusMessagesEveryXMinutes), runImmediately=False)
+scheduler.addCheck("emailStatusMessage", sendEmailStatusMessage, minutesToInterval(lambda config: config.emailStatusMessagesEveryXMinutes), runImmediately=False)
+scheduler.addDeadlineCheck("notificationDigest", sendNotificationDigest, getSecondsUntilNotificationDigest)
+if ConfigSnapshot.getConfig().toolExpiryTimersEnabled:
+    scheduler.addCheck("toolExpiryTimersReload", reloadToolExpiryTimers, lambda: toolExpiryTimersReloadEveryXMinutes * 60)
+    scheduler.addDeadlineCheck("toolExpiries", checkExpiredTools, getSecondsUntilNextToolExpiry)
+
+# Run the first checks before the start message, so that it lists the states they determined.
+scheduler.runDueChecks()
+infoCheckingToolsIsWorking(True)
+scheduler.runForever()
@@ -29,6 +29,8 @@ class ToolStateItem:
 		self.isCustomCheck = False
 		self.isBackupCheck = False
 		self.checkingEveryXMinutes = None
+		self.durationInSeconds = None
+		self.latency = None
 
 
 	# Add statusMessage.
@@ -51,6 +53,21 @@ class ToolStateItem:
 		self.checkingEveryXMinutes = checkingEveryXMinutes
 
 
+	# Set how long checking the tool took (e.g. the response time of a website).
+	def setDuration(self, durationInSeconds):
+		self.durationInSeconds = durationInSeconds
+
+
+	# Set latency details of the check (connection phases and percentiles in milliseconds, threshold 0 = latency check disabled).
+	def setLatency(self, phasesInMilliseconds, p50InMilliseconds, p95InMilliseconds, thresholdInMilliseconds):
+		self.latency = {
+			"phases_inMilliseconds": phasesInMilliseconds,
+			"p50_inMilliseconds": p50InMilliseconds,
+			"p95_inMilliseconds": p95InMilliseconds,
+			"threshold_inMilliseconds": thresholdInMilliseconds,
+		}
+
+
 	def asMap(self):
 		return {
 			"name": self.name,
@@ -61,4 +78,6 @@ class ToolStateItem:
 			"isCustomCheck": self.isCustomCheck,
 			"isBackupCheck": self.isBackupCheck,
 			"checkingEveryXMinutes": self.checkingEveryXMinutes,
+			"duration_inSeconds": self.durationInSeconds,
+			"latency": self.latency,
 		}
@@ -0,0 +1,85 @@
+### Non-blocking access to the DB for the async api endpoints.
+### Runs DatabaseWrapper operations on a dedicated thread pool, so that the event loop keeps serving other requests meanwhile.
+
+## Imports.
+# Awaitable execution of blocking calls.
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+## Own classes.
+# Database connection.
+import databaseWrapper as DatabaseWrapper
+# Get configuration settings.
+import configSnapshot as ConfigSnapshot
+
+
+class AsyncDatabaseWrapper:
+    """
+    Awaitable counterpart of DatabaseWrapper.
+
+    Every call checks out a pooled connection on a worker thread, runs the synchronous
+    DatabaseWrapper method of the same name and returns its result unchanged.
+    """
+
+    def __init__(self, maxWorkers=None):
+        """
+        Constructor of the async database wrapper.
+
+        Args:
+            maxWorkers (int): Amount of worker threads. Defaults to the database pool size, so that workers never wait for connections.
+        """
+        if maxWorkers is None:
+            maxWorkers = ConfigSnapshot.getConfig().databasePoolSize
+        self._executor = ThreadPoolExecutor(max_workers=maxWorkers, thread_name_prefix="database")
+
+
+    async def createOrUpdateStateCheck(self, stateCheckItemToCreateOrUpdate):
+        return await self._run("createOrUpdateStateCheck", stateCheckItemToCreateOrUpdate)
+
+    async def createOrUpdateStateChecks(self, stateCheckItemsToCreateOrUpdate):
+        return await self._run("createOrUpdateStateChecks", stateCheckItemsToCreateOrUpdate)
+
+    async def stopStateCheck(self, stateCheckItemToDelete):
+        return await self._run("stopStateCheck", stateCheckItemToDelete)
+
+    async def getAllToolTokens(self):
+        return await self._run("getAllToolTokens")
+
+    async def createOrUpdateBackupCheck(self, backupCheckItemToCreateOrUpdate):
+        return await self._run("createOrUpdateBackupCheck", backupCheckItemToCreateOrUpdate)
+
+    async def createOrUpdateBackupChecks(self, backupCheckItemsToCreateOrUpdate):
+        return await self._run("createOrUpdateBackupChecks", backupCheckItemsToCreateOrUpdate)
+
+    async def stopBackupCheck(self, backupCheckItemToDelete):
+        return await self._run("stopBackupCheck", backupCheckItemToDelete)
+
+
+    def shutdown(self):
+        """
+        Wait for running DB operations to finish and stop the worker threads.
+        """
+        self._executor.shutdown(wait=True)
+
+
+    async def _run(self, methodName, *args):
+        """
+        Run a DatabaseWrapper method on the worker threads without blocking the event loop.
+
+        Args:
+            methodName (str): Name of the DatabaseWrapper method to call.
+            *args: Arguments passed to the method.
+
+        Returns:
+            The return value of the DatabaseWrapper method.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(_runWithDatabaseWrapper, methodName, *args))
+
+
+
+# Executed on a worker thread: check out a connection, run the method and return the connection to the pool.
+def _runWithDatabaseWrapper(methodName, *args):
+    with DatabaseWrapper.DatabaseWrapper() as dbWrapper:
+        return getattr(dbWrapper, methodName)(*args)
@@ -0,0 +1,212 @@
+### Deadline based scheduler for the periodic checks of check_tools.py.
+### Keeps a priority queue of (next due time, check) entries and sleeps exactly until the earliest deadline.
+
+## Imports.
+# Priority queue of deadlines.
+import heapq
+# Deadlines and sleeping.
+import time
+
+
+class ScheduledCheck:
+    """
+    A periodic check and its run statistics.
+    """
+
+    def __init__(self, name, function, getIntervalInSeconds, priority, getSecondsUntilNextRun=None):
+        """
+        Constructor of a scheduled check.
+
+        Args:
+            name (str): Name of the check, used in metrics and error messages.
+            function (callable): Executes the check. Called without arguments.
+            getIntervalInSeconds (callable): Returns the interval of the check, read again after every run so that config changes apply.
+            priority (int): Order of checks that are due at the same time (lower runs first).
+            getSecondsUntilNextRun (callable): For checks without fixed interval. Returns the delay of the next run, measured from now.
+        """
+        self.name = name
+        self.function = function
+        self.getIntervalInSeconds = getIntervalInSeconds
+        self.getSecondsUntilNextRun = getSecondsUntilNextRun
+        self.priority = priority
+
+        # Metrics.
+        self.runs = 0
+        self.errors = 0
+        self.skippedRuns = 0
+        self.lastLagInSeconds = 0.0
+        self.maxLagInSeconds = 0.0
+        self.totalLagInSeconds = 0.0
+        self.lastDurationInSeconds = 0.0
+        self.maxDurationInSeconds = 0.0
+        self.lastDriftInSeconds = 0.0
+        self.maxDriftInSeconds = 0.0
+        self.lastStartedAt = None
+        self.lastIntervalInSeconds = None
+
+
+class CheckScheduler:
+    """
+    Runs registered checks at their deadlines.
+
+    Each check is re-armed from its own previous deadline, not from the time it actually ran,
+    so long running checks do not make the schedule drift. If a check falls behind by more
+    than a whole interval, the missed runs are skipped instead of being executed back to back.
+    """
+
+    def __init__(self, onCheckError=None):
+        """
+        Constructor of the check scheduler.
+
+        Args:
+            onCheckError (callable): Called with (checkName, exception), if a check raises. The check stays scheduled.
+        """
+        self._onCheckError = onCheckError
+        self._deadlines = []
+        self._startedAt = time.monotonic()
+        self._wakeups = 0
+
+
+    def addCheck(self, name, function, getIntervalInSeconds, runImmediately=True):
+        """
+        Register a periodic check.
+
+        Args:
+            name (str): Name of the check.
+            function (callable): Executes the check.
+            getIntervalInSeconds (callable): Returns the interval of the check in seconds.
+            runImmediately (bool): Run the check on the first wakeup, instead of after its first interval.
+        """
+        check = ScheduledCheck(name, function, getIntervalInSeconds, len(self._deadlines))
+        dueAt = time.monotonic()
+        if not runImmediately:
+            dueAt += getIntervalInSeconds()
+        heapq.heappush(self._deadlines, (dueAt, check.priority, check))
+
+
+    def addDeadlineCheck(self, name, function, getSecondsUntilNextRun):
+        """
+        Register a check, that decides itself when it has to run next (e.g. at the next expiry of a timer).
+
+        Args:
+            name (str): Name of the check.
+            function (callable): Executes the check.
+            getSecondsUntilNextRun (callable): Returns the delay of the next run in seconds. Evaluated after every run and on rescheduleCheck().
+        """
+        check = ScheduledCheck(name, function, None, len(self._deadlines), getSecondsUntilNextRun)
+        heapq.heappush(self._deadlines, (time.monotonic() + getSecondsUntilNextRun(), check.priority, check))
+
+
+    def rescheduleCheck(self, name):
+        """
+        Ask a deadline check again for its next run, e.g. after another check changed what it waits for.
+
+        Args:
+            name (str): Name of the check registered via addDeadlineCheck().
+        """
+        for index, (dueAt, priority, check) in enumerate(self._deadlines):
+            if check.name == name:
+                self._deadlines[index] = (time.monotonic() + check.getSecondsUntilNextRun(), priority, check)
+                heapq.heapify(self._deadlines)
+                return
+
+
+    def runForever(self):
+        """
+        Sleep until the earliest deadline and run all due checks, forever.
+        """
+        while True:
+            self.sleepUntilNextDeadline()
+            self.runDueChecks()
+
+
+    def sleepUntilNextDeadline(self):
+        """
+        Sleep until the earliest registered check is due.
+        """
+        if not self._deadlines:
+            return
+        secondsUntilNextDeadline = self._deadlines[0][0] - time.monotonic()
+        if secondsUntilNextDeadline > 0:
+            time.sleep(secondsUntilNextDeadline)
+
+
+    def runDueChecks(self):
+        """
+        Run all checks whose deadline has been reached, in order of their deadlines.
+        """
+        self._wakeups += 1
+        while self._deadlines and self._deadlines[0][0] <= time.monotonic():
+            dueAt, priority, check = heapq.heappop(self._deadlines)
+
+            # Run check.
+            startedAt = time.monotonic()
+            try:
+                check.function()
+            except Exception as e:
+                check.errors += 1
+                if self._onCheckError is not None:
+                    self._onCheckError(check.name, e)
+            finishedAt = time.monotonic()
+            self._recordRun(check, startedAt, startedAt - dueAt, finishedAt - startedAt)
+
+            # Deadline checks decide themselves, when to run next.
+            if check.getSecondsUntilNextRun is not None:
+                heapq.heappush(self._deadlines, (time.monotonic() + check.getSecondsUntilNextRun(), priority, check))
+                continue
+
+            # Re-arm from the previous deadline and skip runs that have been missed completely.
+            intervalInSeconds = max(check.getIntervalInSeconds(), 1)
+            check.lastIntervalInSeconds = intervalInSeconds
+            nextDueAt = dueAt + intervalInSeconds
+            if nextDueAt <= finishedAt:
+                missedRuns = int((finishedAt - nextDueAt) // intervalInSeconds) + 1
+                check.skippedRuns += missedRuns
+                nextDueAt += missedRuns * intervalInSeconds
+            heapq.heappush(self._deadlines, (nextDueAt, priority, check))
+
+
+    def getMetrics(self):
+        """
+        Get lag and run time metrics of all checks.
+
+        Lag is the time between the deadline of a check and the moment it actually started.
+        Drift is how much the time between two consecutive starts of a check differed from its interval.
+
+        Returns:
+            (dict): Scheduler metrics and metrics per check name.
+        """
+        now = time.monotonic()
+        checks = {}
+        for dueAt, priority, check in sorted(self._deadlines):
+            checks[check.name] = {
+                "runs": check.runs,
+                "errors": check.errors,
+                "skippedRuns": check.skippedRuns,
+                "nextRunIn_inSeconds": round(dueAt - now, 3),
+                "lastLag_inSeconds": round(check.lastLagInSeconds, 3),
+                "maxLag_inSeconds": round(check.maxLagInSeconds, 3),
+                "averageLag_inSeconds": round(check.totalLagInSeconds / check.runs, 3) if check.runs else 0.0,
+                "lastDuration_inSeconds": round(check.lastDurationInSeconds, 3),
+                "maxDuration_inSeconds": round(check.maxDurationInSeconds, 3),
+                "lastDrift_inSeconds": round(check.lastDriftInSeconds, 3),
+                "maxDrift_inSeconds": round(check.maxDriftInSeconds, 3),
+            }
+        return {
+            "uptime_inSeconds": round(now - self._startedAt, 3),
+            "wakeups": self._wakeups,
+            "checks": checks,
+        }
+
+
+    def _recordRun(self, check, startedAt, lagInSeconds, durationInSeconds):
+        if check.lastStartedAt is not None and check.lastIntervalInSeconds is not None:
+            check.lastDriftInSeconds = (startedAt - check.lastStartedAt) - check.lastIntervalInSeconds
+            check.maxDriftInSeconds = max(check.maxDriftInSeconds, abs(check.lastDriftInSeconds))
+        check.lastStartedAt = startedAt
+        check.runs += 1
+        check.lastLagInSeconds = lagInSeconds
+        check.maxLagInSeconds = max(check.maxLagInSeconds, lagInSeconds)
+        check.totalLagInSeconds += lagInSeconds
+        check.lastDurationInSeconds = durationInSeconds
+        check.maxDurationInSeconds = max(check.maxDurationInSeconds, durationInSeconds)
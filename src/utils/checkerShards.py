@@ -0,0 +1,181 @@
+### Sharding of the checks across several replicas of check_tools.py.
+### Each replica holds a lease row in the DB. The replicas with a valid lease are placed on a consistent hash ring,
+### and each replica only checks the tools, backups and websites whose key falls into its part of the ring.
+
+## Imports.
+# Positions on the hash ring.
+import bisect
+import hashlib
+# Lease timing.
+import time
+
+
+# Positions per replica on the hash ring. More positions spread the tools more evenly.
+VIRTUAL_NODES_PER_REPLICA = 64
+
+
+class ConsistentHashRing:
+    """
+    Hash ring assigning keys to replicas. Adding or removing a replica only moves the keys of its own positions.
+    """
+
+    def __init__(self, replicaIDs, virtualNodesPerReplica=VIRTUAL_NODES_PER_REPLICA):
+        """
+        Constructor of the hash ring.
+
+        Args:
+            replicaIDs (list): IDs of the replicas to place on the ring.
+            virtualNodesPerReplica (int): Positions per replica.
+        """
+        self.replicaIDs = tuple(sorted(set(replicaIDs)))
+        ring = sorted((_hash(replicaID + "#" + str(index)), replicaID) for replicaID in self.replicaIDs for index in range(virtualNodesPerReplica))
+        self._positions = [position for position, replicaID in ring]
+        self._replicaIDs = [replicaID for position, replicaID in ring]
+
+
+    def getReplicaID(self, key):
+        """
+        Get the replica a key is assigned to.
+
+        Args:
+            key (str): Key, e.g. "tool:name".
+
+        Returns:
+            (str): ID of the replica owning the key or None, if the ring is empty.
+        """
+        if not self._positions:
+            return None
+        index = bisect.bisect(self._positions, _hash(key)) % len(self._positions)
+        return self._replicaIDs[index]
+
+
+class CheckerShards:
+    """
+    Lease and hash ring of this replica.
+
+    renewLease() has to be called regularly (every leaseInSeconds / 3). It extends the lease of this replica
+    and rebuilds the ring from the replicas with a valid lease, so that tools are rebalanced, when a replica
+    joins or its lease runs out. To avoid checking tools twice while the others have not noticed a joining
+    replica yet, it only starts checking after one renewal interval (unless it is alone). A replica, that could
+    not renew its lease for longer than the lease, stops checking, as the others take over its tools.
+    """
+
+    def __init__(self, replicaID, leaseInSeconds):
+        """
+        Constructor of the shards.
+
+        Args:
+            replicaID (str): Unique ID of this replica, e.g. the hostname of its container.
+            leaseInSeconds (int): How long a lease is valid without renewal.
+        """
+        self.replicaID = replicaID
+        self.leaseInSeconds = leaseInSeconds
+        self._ring = ConsistentHashRing([replicaID])
+        self._joinedAt = None
+        self._renewedAt = None
+
+        # Metrics.
+        self._renewals = 0
+        self._failedRenewals = 0
+        self._rebalances = 0
+
+
+    def getRenewIntervalInSeconds(self):
+        """
+        Get how often the lease has to be renewed.
+
+        Returns:
+            (float): Interval in seconds.
+        """
+        return self.leaseInSeconds / 3
+
+
+    def renewLease(self, dbWrapper):
+        """
+        Extend the lease of this replica and update the ring from the replicas with a valid lease.
+
+        Args:
+            dbWrapper (DatabaseWrapper): Database session to use.
+
+        Returns:
+            (bool): True, if the replicas changed since the previous renewal (tools have been rebalanced).
+        """
+        try:
+            replicaIDs = dbWrapper.renewCheckerReplicaLease(self.replicaID, self.leaseInSeconds)
+        except Exception:
+            self._failedRenewals += 1
+            raise
+        now = time.monotonic()
+        if self._joinedAt is None:
+            # Without other replicas, there is nobody to hand over tools, so start checking right away.
+            otherReplicaIDs = set(replicaIDs) - {self.replicaID}
+            self._joinedAt = now if otherReplicaIDs else now - self.getRenewIntervalInSeconds()
+        self._renewedAt = now
+        self._renewals += 1
+
+        ring = ConsistentHashRing(replicaIDs + [self.replicaID])
+        if ring.replicaIDs == self._ring.replicaIDs:
+            return False
+        self._ring = ring
+        self._rebalances += 1
+        return True
+
+
+    def releaseLease(self, dbWrapper):
+        """
+        Give up the lease, e.g. when shutting down, so that the other replicas take over right away.
+
+        Args:
+            dbWrapper (DatabaseWrapper): Database session to use.
+        """
+        dbWrapper.releaseCheckerReplicaLease(self.replicaID)
+        self._renewedAt = None
+
+
+    def owns(self, key):
+        """
+        Check, whether this replica is responsible for a key.
+
+        Args:
+            key (str): Key of a tool ("tool:name"), backup ("backup:name") or website ("website:url").
+
+        Returns:
+            (bool): True, if this replica has to check the key.
+        """
+        if self._renewedAt is None:
+            return False
+        now = time.monotonic()
+        if now - self._joinedAt < self.getRenewIntervalInSeconds() or now - self._renewedAt > self.leaseInSeconds:
+            return False
+        return self._ring.getReplicaID(key) == self.replicaID
+
+
+    def getReplicaIDs(self):
+        """
+        Get the replicas sharing the checks.
+
+        Returns:
+            (tuple): Sorted IDs of the replicas on the ring, including this one.
+        """
+        return self._ring.replicaIDs
+
+
+    def getMetrics(self):
+        """
+        Get lease metrics.
+
+        Returns:
+            (dict): Replicas on the ring, lease renewals, failed renewals and rebalances.
+        """
+        return {
+            "replicaID": self.replicaID,
+            "replicas": len(self._ring.replicaIDs),
+            "renewals": self._renewals,
+            "failedRenewals": self._failedRenewals,
+            "rebalances": self._rebalances,
+        }
+
+
+# Position of a key on the ring.
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
@@ -0,0 +1,371 @@
+## Immutable snapshot of all configuration settings, shared by all modules of a process.
+## Built once via ConfigUtils and atomically replaced, when config.txt or one of the secret files changes.
+
+# Typed, immutable settings.
+from dataclasses import dataclass
+from datetime import tzinfo
+from types import MappingProxyType
+
+# Interaction with operating system (file modification times).
+import os
+
+# Reload checks.
+import threading
+import time
+
+# Get configuration settings.
+import configUtils as ConfigUtils
+
+# Logger.
+import logger as Logger
+
+
+# How often to look for changed config or secret files.
+RELOAD_CHECK_INTERVAL_IN_SECONDS = 5
+
+# Log scope of configuration errors (see Logger), set to "api" by main_api_startpoint.py.
+logScope = "check_tools"
+
+# Environment variables pointing to secret files, whose changes trigger a reload.
+SECRET_FILE_ENVIRONMENT_VARIABLES = (
+    "DB_PW_FILE",
+    "TELEGRAM_SENDER_BOT_TOKEN_FILE",
+    "EMAIL_SENDER_PASSWORD_FILE",
+    "SERVER_AUTHENTICATION_TOKEN_FILE",
+)
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """
+    All configuration settings resolved and validated at one point in time.
+
+    Get the current snapshot via getConfig(). Never cache the snapshot itself for long,
+    so that changes of config.txt and secret files are picked up.
+    """
+    tolerancePeriodInSeconds: int
+    toolExpiryTimersEnabled: bool
+    heartbeatBufferFlushIntervalInMilliseconds: int
+    toolRegistryTimeToLiveInSeconds: int
+    websitesToCheck: tuple
+
+    # Database.
+    databaseHost: str
+    databaseUser: str
+    databasePassword: str
+    databaseName: str
+    databasePoolSize: int
+    databasePoolTimeoutInSeconds: float
+
+    # Telegram.
+    telegramEnabled: bool
+    telegramStatusMessagesEveryXMinutes: int
+    telegramBotToken: str
+    telegramErrorChatIDs: tuple
+    telegramInfoChatIDs: tuple
+
+    # Status messages.
+    statusMessagesTimeOffsetPercentage: float
+
+    # Notification delivery.
+    notificationWorkers: int
+    notificationMaxAttempts: int
+    notificationDigestWindowInSeconds: float
+
+    # Email.
+    emailEnabled: bool
+    emailSenderUser: str
+    emailSenderPassword: str
+    emailSenderHost: str
+    emailSenderPort: int
+    emailErrorAddresses: tuple
+    emailInfoAddresses: tuple
+    emailStatusMessagesEveryXMinutes: int
+
+    # Check frequency.
+    websiteChecksEveryXMinutes: int
+    websiteProbeConcurrency: int
+    websiteProbeConnectTimeoutInSeconds: float
+    websiteProbeReadTimeoutInSeconds: float
+    websiteLatencyThresholdInMilliseconds: int
+    websiteLatencyThresholdsInMilliseconds: MappingProxyType
+    websiteProbeMethod: str
+    websiteProbeMethods: MappingProxyType
+    websiteProbeMaxBodyBytes: int
+    websiteProbeExpectedContents: MappingProxyType
+    googleDriveFoldersToCheck: tuple
+    googleDriveChecksEveryXMinutes: int
+    googleDriveChangesFeedEnabled: bool
+    googleDriveWorkers: int
+    googleDriveBatchRequestsEnabled: bool
+
+    # Sharding.
+    shardingEnabled: bool
+    checkerReplicaID: str
+    checkerLeaseInSeconds: int
+
+    # Other.
+    timezone: tzinfo
+    serverAuthenticationToken: str
+
+
+    def calculateOffset(self, base_to_calulate_offset_from):
+        """
+        Calculate reduced time based on provided offset.
+
+        Offset is caused from the time consumed by operation time of checking tools.
+
+        Args:
+        - base_to_calulate_offset_from (int): The base value to calculate offset of.
+
+        Returns:
+            (float): Minutes with calculated offset.
+        """
+        calculated_value_with_offset = float(base_to_calulate_offset_from - (
+                    base_to_calulate_offset_from * self.statusMessagesTimeOffsetPercentage / 100))
+        # Avoid zero devision error.
+        if calculated_value_with_offset <= 0:
+            calculated_value_with_offset = 1
+
+        return float(calculated_value_with_offset)
+
+
+    def getWebsiteLatencyThresholdInMilliseconds(self, url):
+        """
+        Get the latency above which a website is considered down.
+
+        Args:
+            url (str): Url of the website.
+
+        Returns:
+            (int): Threshold in milliseconds of the website itself or the default threshold. Zero, if the latency check is disabled.
+        """
+        return self.websiteLatencyThresholdsInMilliseconds.get(url, self.websiteLatencyThresholdInMilliseconds)
+
+
+    def getWebsiteProbeMethod(self, url):
+        """
+        Get how to probe a website.
+
+        Args:
+            url (str): Url of the website.
+
+        Returns:
+            (str): Probe method of the website itself or the default probe method (see ConfigUtils.WEBSITE_PROBE_METHODS).
+        """
+        return self.websiteProbeMethods.get(url, self.websiteProbeMethod)
+
+
+    def getWebsiteProbeExpectedContent(self, url):
+        """
+        Get the text, that the response body of a website must contain.
+
+        Args:
+            url (str): Url of the website.
+
+        Returns:
+            (str): Expected content or None, if the body is not checked.
+        """
+        return self.websiteProbeExpectedContents.get(url)
+
+
+
+# Snapshot field, ConfigUtils getter and default used if the setting is missing or invalid.
+_SETTINGS = (
+    ("tolerancePeriodInSeconds", "getTolerencePeriodInSeconds", 100),
+    ("toolExpiryTimersEnabled", "areToolExpiryTimersEnabled", False),
+    ("heartbeatBufferFlushIntervalInMilliseconds", "getHeartbeatBufferFlushIntervalInMilliseconds", 0),
+    ("toolRegistryTimeToLiveInSeconds", "getToolRegistryTimeToLiveInSeconds", 300),
+    ("websitesToCheck", "getWebsitesToCheck", ()),
+    ("databaseHost", "getDatabaseHost", ""),
+    ("databaseUser", "getDatabaseUser", ""),
+    ("databasePassword", "getDatabasePassword", ""),
+    ("databaseName", "getDatabaseName", ""),
+    ("databasePoolSize", "getDatabasePoolSize", 5),
+    ("databasePoolTimeoutInSeconds", "getDatabasePoolTimeoutInSeconds", 10.0),
+    ("telegramEnabled", "areTelegramStatusMessagesEnabled", True),
+    ("telegramStatusMessagesEveryXMinutes", "getTelegramStatusMessagesEveryXMinutes", 60),
+    ("telegramBotToken", "getTelegramBotToken", ""),
+    ("telegramErrorChatIDs", "getTelegramErrorChatsIDs", ()),
+    ("telegramInfoChatIDs", "getTelegramInfoChatsIDs", ()),
+    ("statusMessagesTimeOffsetPercentage", "_getStatusMessagesTimeOffsetPercentage", 2.5),
+    ("notificationWorkers", "getNotificationWorkers", 4),
+    ("notificationMaxAttempts", "getNotificationMaxAttempts", 8),
+    ("notificationDigestWindowInSeconds", "getNotificationDigestWindowInSeconds", 0.0),
+    ("emailEnabled", "areEmailStatusMessagesEnabled", False),
+    ("emailSenderUser", "getEmailSenderUser", ""),
+    ("emailSenderPassword", "getEmailSenderPassword", ""),
+    ("emailSenderHost", "getEmailSenderHost", ""),
+    ("emailSenderPort", "getEmailSenderPort", 587),
+    ("emailErrorAddresses", "getEmailErrorAdresses", ()),
+    ("emailInfoAddresses", "getEmailInfoAdresses", ()),
+    ("emailStatusMessagesEveryXMinutes", "getEmailStatusMessagesEveryXMinutes", 60),
+    ("websiteChecksEveryXMinutes", "getWebsiteChecksEveryXMinutes", 30),
+    ("websiteProbeConcurrency", "getWebsiteProbeConcurrency", 8),
+    ("websiteProbeConnectTimeoutInSeconds", "getWebsiteProbeConnectTimeoutInSeconds", 5.0),
+    ("websiteProbeReadTimeoutInSeconds", "getWebsiteProbeReadTimeoutInSeconds", 10.0),
+    ("websiteLatencyThresholdInMilliseconds", "getWebsiteLatencyThresholdInMilliseconds", 0),
+    ("websiteLatencyThresholdsInMilliseconds", "getWebsiteLatencyThresholdsInMilliseconds", {}),
+    ("websiteProbeMethod", "getWebsiteProbeMethod", "POST"),
+    ("websiteProbeMethods", "getWebsiteProbeMethods", {}),
+    ("websiteProbeMaxBodyBytes", "getWebsiteProbeMaxBodyBytes", 65536),
+    ("websiteProbeExpectedContents", "getWebsiteProbeExpectedContents", {}),
+    ("googleDriveFoldersToCheck", "getGoogleDriveFoldersToCheck", ()),
+    ("googleDriveChecksEveryXMinutes", "getGoogleDriveChecksEveryXMinutes", 60),
+    ("googleDriveChangesFeedEnabled", "isGoogleDriveChangesFeedEnabled", False),
+    ("googleDriveWorkers", "getGoogleDriveWorkers", 4),
+    ("googleDriveBatchRequestsEnabled", "areGoogleDriveBatchRequestsEnabled", False),
+    ("shardingEnabled", "isShardingEnabled", False),
+    ("checkerReplicaID", "getCheckerReplicaID", ""),
+    ("checkerLeaseInSeconds", "getCheckerLeaseInSeconds", 30),
+    ("timezone", "getTimezone", None),
+    ("serverAuthenticationToken", "getServerAuthenticationToken", ""),
+)
+
+# Settings, that are used as divisor or interval and must therefore be positive.
+_POSITIVE_SETTINGS = (
+    "databasePoolSize",
+    "databasePoolTimeoutInSeconds",
+    "telegramStatusMessagesEveryXMinutes",
+    "emailStatusMessagesEveryXMinutes",
+    "notificationWorkers",
+    "notificationMaxAttempts",
+    "websiteChecksEveryXMinutes",
+    "websiteProbeConcurrency",
+    "websiteProbeConnectTimeoutInSeconds",
+    "websiteProbeReadTimeoutInSeconds",
+    "websiteProbeMaxBodyBytes",
+    "googleDriveChecksEveryXMinutes",
+    "googleDriveWorkers",
+    "checkerLeaseInSeconds",
+)
+
+# Settings without a sensible default. Building a snapshot fails, if one of them is missing or invalid.
+_REQUIRED_SETTINGS = (
+    "databaseHost",
+    "databaseUser",
+    "databasePassword",
+    "databaseName",
+    "serverAuthenticationToken",
+)
+
+
+def buildConfigSnapshot():
+    """
+    Resolve and validate all settings.
+
+    Missing optional settings fall back to their defaults. Unparsable optional settings fall back as well,
+    but are logged as errors.
+
+    Returns:
+        (ConfigSnapshot): The new snapshot.
+
+    Raises:
+        ValueError: If the config cannot be read, a required setting is missing or invalid or a setting is out of range.
+    """
+    configUtils = ConfigUtils.ConfigUtils()
+
+    values = {}
+    fallbacks = []
+    invalidSettings = []
+    missingRequiredSettings = []
+    for field, getterName, default in _SETTINGS:
+        try:
+            value = getattr(configUtils, getterName)()
+        except Exception as e:
+            if field in _REQUIRED_SETTINGS:
+                raise ValueError("configSnapshot: Required setting " + field + " is invalid: " + str(e)) from e
+            invalidSettings.append(field + " (" + str(e) + ")")
+            value = default
+        if field in _REQUIRED_SETTINGS and not value:
+            missingRequiredSettings.append(field)
+            continue
+        if value is None:
+            value = default
+            fallbacks.append(field)
+
+        # Make containers immutable as well.
+        if isinstance(value, list):
+            value = tuple(MappingProxyType(dict(item)) if isinstance(item, dict) else item for item in value)
+        elif isinstance(value, dict):
+            value = MappingProxyType(dict(value))
+        values[field] = value
+
+    if missingRequiredSettings:
+        raise ValueError("configSnapshot: Missing required settings: " + ", ".join(missingRequiredSettings))
+    if invalidSettings:
+        logger = Logger.Logger(logScope)
+        logger.logError("configSnapshot: Using defaults for invalid settings: " + ", ".join(invalidSettings))
+    if fallbacks:
+        print("configSnapshot: Using defaults for missing settings: " + ", ".join(fallbacks))
+
+    for field in _POSITIVE_SETTINGS:
+        if values[field] <= 0:
+            raise ValueError("configSnapshot: Setting " + field + " must be greater than zero, got " + str(values[field]))
+    if values["tolerancePeriodInSeconds"] < 0:
+        raise ValueError("configSnapshot: Setting tolerancePeriodInSeconds must not be negative, got " + str(values["tolerancePeriodInSeconds"]))
+
+    return ConfigSnapshot(**values)
+
+
+
+# Current snapshot of this process.
+_currentConfig = None
+_watchedFilesSignature = None
+_nextReloadCheck = 0.0
+_reloadLock = threading.Lock()
+
+
+def getConfig():
+    """
+    Get the current config snapshot.
+
+    Builds the snapshot on first use. Afterwards, at most every RELOAD_CHECK_INTERVAL_IN_SECONDS,
+    the modification times of config.txt and the secret files are compared and the snapshot is
+    rebuilt and swapped, if one of them changed.
+
+    Returns:
+        (ConfigSnapshot): The current snapshot.
+    """
+    global _currentConfig, _watchedFilesSignature, _nextReloadCheck
+    if _currentConfig is not None and time.monotonic() < _nextReloadCheck:
+        return _currentConfig
+
+    with _reloadLock:
+        if _currentConfig is None:
+            _watchedFilesSignature = _getWatchedFilesSignature()
+            _currentConfig = buildConfigSnapshot()
+        elif time.monotonic() >= _nextReloadCheck:
+            watchedFilesSignature = _getWatchedFilesSignature()
+            if watchedFilesSignature != _watchedFilesSignature:
+                _watchedFilesSignature = watchedFilesSignature
+                try:
+                    _currentConfig = buildConfigSnapshot()
+                    print("configSnapshot: Reloaded configuration after config or secret files changed.")
+                except Exception as e:
+                    logger = Logger.Logger(logScope)
+                    logger.logError("configSnapshot: Keeping previous configuration, reload failed: " + str(e))
+        _nextReloadCheck = time.monotonic() + RELOAD_CHECK_INTERVAL_IN_SECONDS
+    return _currentConfig
+
+
+def _getWatchedFilesSignature():
+    """
+    Get modification times of config.txt and all configured secret files.
+
+    Returns:
+        (tuple): (path, mtime or None) for every watched file.
+    """
+    watchedFiles = [ConfigUtils.CONFIG_FILE_PATH]
+    for environmentVariable in SECRET_FILE_ENVIRONMENT_VARIABLES:
+        secretFile = os.getenv(environmentVariable)
+        if secretFile:
+            watchedFiles.append(secretFile.strip().strip("\""))
+
+    signature = []
+    for watchedFile in watchedFiles:
+        try:
+            signature.append((watchedFile, os.stat(watchedFile).st_mtime_ns))
+        except OSError:
+            signature.append((watchedFile, None))
+    return tuple(signature)
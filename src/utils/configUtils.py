@@ -7,6 +7,9 @@ from oauth2client.service_account import ServiceAccountCredentials
 # Interaction with operating system (read write files).
 import os
 
+# Default replica ID (hostname).
+import socket
+
 # For getting config.
 import json
 
@@ -19,6 +22,16 @@ import pytz
 # For safely parsing json string to dict (https://stackoverflow.com/questions/988228/convert-a-string-representation-of-a-dictionary-to-a-dictionary).
 import ast
 
+# Secret files are only read again, if they changed.
+import secretCache
+
+
+# Ways to probe a website: POST (default), HEAD, GET with capped body and GET revalidating via If-None-Match / If-Modified-Since.
+WEBSITE_PROBE_METHODS = ("POST", "HEAD", "GET", "CONDITIONAL_GET")
+
+# Location of the optional config file (takes precedence over environment variable STATECHECKER_SERVER_CONFIG).
+CONFIG_FILE_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "config.txt")
+
 
 class ConfigUtils:
     """
@@ -28,9 +41,8 @@ class ConfigUtils:
     def __init__(self):
           
         try:
-            config_file_pathAndName = os.path.join(os.path.dirname(__file__), "..", "..", "config.txt")
-            config_file = open(config_file_pathAndName)
-            self._config_array = json.load(config_file)
+            with open(CONFIG_FILE_PATH) as config_file:
+                self._config_array = json.load(config_file)
         except:
             # Get config array from Environment Variable.
             statechecker_server_config = os.getenv("STATECHECKER_SERVER_CONFIG")
@@ -69,6 +81,61 @@ class ConfigUtils:
         return int(tools_using_api_tolerance_period_in_seconds)
     
 
+    def areToolExpiryTimersEnabled(self):
+        """
+        Should tools using the api be reported down the moment their heartbeat expires, instead of at the next minute tick?
+
+        Returns:
+            (bool): Whether expiry timers are enabled.
+        """
+        are_tool_expiry_timers_enabled=os.getenv("TOOL_EXPIRY_TIMERS_ENABLED")
+        if are_tool_expiry_timers_enabled:
+            are_tool_expiry_timers_enabled = are_tool_expiry_timers_enabled.strip().strip("\"").lower() == "true"
+        else:
+            are_tool_expiry_timers_enabled = False
+            if "toolsUsingApi_expiryTimers_enabled" in self._config_array:
+                are_tool_expiry_timers_enabled = str(self._config_array["toolsUsingApi_expiryTimers_enabled"]).strip().strip("\"").lower() == "true"
+        return bool(are_tool_expiry_timers_enabled)
+    
+
+    def getHeartbeatBufferFlushIntervalInMilliseconds(self):
+        """
+        Get interval in which buffered heartbeats of the api are written to the database.
+
+        Zero disables buffering, so every heartbeat is written immediately.
+
+        Returns:
+            (int): Flush interval in milliseconds.
+        """
+        flush_interval=os.getenv("HEARTBEAT_BUFFER_FLUSH_INTERVAL_IN_MILLISECONDS")
+        if flush_interval:
+            flush_interval = flush_interval.strip().strip("\"")
+        else:
+            flush_interval = 0
+            if "heartbeatBuffer_flushInterval_inMilliseconds" in self._config_array:
+                flush_interval = self._config_array["heartbeatBuffer_flushInterval_inMilliseconds"]
+        return max(0, int(flush_interval))
+
+
+    def getToolRegistryTimeToLiveInSeconds(self):
+        """
+        Get how long the api trusts its in-memory registry of tool names and tokens, before asking the database again.
+
+        Zero disables the registry, so every token is validated by the database.
+
+        Returns:
+            (int): Time to live of registry entries in seconds.
+        """
+        time_to_live=os.getenv("TOOL_REGISTRY_TTL_IN_SECONDS")
+        if time_to_live:
+            time_to_live = time_to_live.strip().strip("\"")
+        else:
+            time_to_live = 300
+            if "toolRegistry_ttl_inSeconds" in self._config_array:
+                time_to_live = self._config_array["toolRegistry_ttl_inSeconds"]
+        return max(0, int(time_to_live))
+
+
     def getWebsitesToCheck(self):
         """
         Get websites to check.
@@ -129,15 +196,13 @@ class ConfigUtils:
         """
         db_pw=""
         try:
-            DB_PW_FILE = os.getenv("DB_PW_FILE")
-            with open(f"{DB_PW_FILE}", "r") as db_pw_file:
-                db_pw = db_pw_file.read().strip()
+            db_pw = secretCache.readSecretFile(os.getenv("DB_PW_FILE"))
         except:
             pass
         finally:
             # In case of an error or the secret is not set.
             if not db_pw or db_pw.lower() == "none":
-                db_pw = os.getenv('DB_PW').strip().strip("\"")
+                db_pw = os.getenv('DB_PW', "").strip().strip("\"")
         if not db_pw or db_pw == "":
             # Get PW from config.
             if "database" in self._config_array:
@@ -161,7 +226,41 @@ class ConfigUtils:
                 if "database" in self._config_array["database"]:
                     db_name = self._config_array["database"]["database"]
         return db_name
-    
+
+    def getDatabasePoolSize(self):
+        """
+        Get maximum amount of database connections kept open per process.
+
+        Returns:
+            (int): Size of the database connection pool.
+        """
+        db_pool_size=os.getenv("DB_POOL_SIZE")
+        if db_pool_size:
+            db_pool_size = db_pool_size.strip().strip("\"")
+        else:
+            db_pool_size = 5
+            if "database" in self._config_array:
+                if "poolSize" in self._config_array["database"]:
+                    db_pool_size = self._config_array["database"]["poolSize"]
+        return max(1, int(db_pool_size))
+
+    def getDatabasePoolTimeoutInSeconds(self):
+        """
+        Get amount of seconds to wait for a free pooled database connection.
+
+        Returns:
+            (float): Seconds to wait, before giving up on getting a connection.
+        """
+        db_pool_timeout=os.getenv("DB_POOL_TIMEOUT_IN_SECONDS")
+        if db_pool_timeout:
+            db_pool_timeout = db_pool_timeout.strip().strip("\"")
+        else:
+            db_pool_timeout = 10
+            if "database" in self._config_array:
+                if "poolTimeout_inSeconds" in self._config_array["database"]:
+                    db_pool_timeout = self._config_array["database"]["poolTimeout_inSeconds"]
+        return float(db_pool_timeout)
+
     # Telegram settings.
     def areTelegramStatusMessagesEnabled(self):
         """
@@ -210,15 +309,13 @@ class ConfigUtils:
         """
         bot_token=""
         try:
-            TELEGRAM_SENDER_BOT_TOKEN_FILE = os.getenv("TELEGRAM_SENDER_BOT_TOKEN_FILE")
-            with open(f"{TELEGRAM_SENDER_BOT_TOKEN_FILE}", "r") as bot_token_file:
-                bot_token = bot_token_file.read().strip()
+            bot_token = secretCache.readSecretFile(os.getenv("TELEGRAM_SENDER_BOT_TOKEN_FILE"))
         except:
             pass
         finally:
             # In case of an error or the secret is not set.
             if not bot_token or bot_token.lower() == "none":
-                bot_token = os.getenv('TELEGRAM_SENDER_BOT_TOKEN').strip().strip("\"")
+                bot_token = os.getenv('TELEGRAM_SENDER_BOT_TOKEN', "").strip().strip("\"")
         if not bot_token or bot_token == "":
             # Get PW from config.
             if "telegram" in self._config_array:
@@ -337,6 +434,65 @@ class ConfigUtils:
                     telegramStatusMessageEveryXMinutes = self._config_array["telegram"]["adminStatusMessage_operationTime_offsetPercentage"]
         return float(telegramStatusMessageEveryXMinutes)
     
+
+    # Notification delivery.
+    def getNotificationWorkers(self):
+        """
+        How many telegram messages and emails to deliver at the same time?
+
+        Read once, when check_tools.py starts.
+
+        Returns:
+            (int): Amount of notification outbox workers.
+        """
+        notification_workers=os.getenv("NOTIFICATION_WORKERS")
+        if notification_workers:
+            notification_workers = notification_workers.strip().strip("\"")
+        else:
+            notification_workers = 4
+            if "notifications" in self._config_array:
+                if "workers" in self._config_array["notifications"]:
+                    notification_workers = self._config_array["notifications"]["workers"]
+        return int(notification_workers)
+    
+    def getNotificationMaxAttempts(self):
+        """
+        How often to try delivering a telegram message or email, before giving up?
+
+        Read once, when check_tools.py starts.
+
+        Returns:
+            (int): Maximum attempts per notification and recipient.
+        """
+        max_attempts=os.getenv("NOTIFICATION_MAX_ATTEMPTS")
+        if max_attempts:
+            max_attempts = max_attempts.strip().strip("\"")
+        else:
+            max_attempts = 8
+            if "notifications" in self._config_array:
+                if "maxAttempts" in self._config_array["notifications"]:
+                    max_attempts = self._config_array["notifications"]["maxAttempts"]
+        return int(max_attempts)
+    
+    def getNotificationDigestWindowInSeconds(self):
+        """
+        How long to collect state changes of tools, before sending them as a single digest?
+
+        Zero sends the state changes found by a single check as one digest right away.
+
+        Returns:
+            (float): Digest window in seconds.
+        """
+        digest_window=os.getenv("NOTIFICATION_DIGEST_WINDOW_IN_SECONDS")
+        if digest_window:
+            digest_window = digest_window.strip().strip("\"")
+        else:
+            digest_window = 0
+            if "notifications" in self._config_array:
+                if "digestWindow_inSeconds" in self._config_array["notifications"]:
+                    digest_window = self._config_array["notifications"]["digestWindow_inSeconds"]
+        return max(0.0, float(digest_window))
+    
     
 
     # Email.
@@ -386,15 +542,13 @@ class ConfigUtils:
         """
         email_sender_password=""
         try:
-            EMAIL_SENDER_PASSWORD_FILE = os.getenv("EMAIL_SENDER_PASSWORD_FILE")
-            with open(f"{EMAIL_SENDER_PASSWORD_FILE}", "r") as email_sender_password_file:
-                email_sender_password = email_sender_password_file.read().strip()
+            email_sender_password = secretCache.readSecretFile(os.getenv("EMAIL_SENDER_PASSWORD_FILE"))
         except:
             pass
         finally:
             # In case of an error or the secret is not set.
             if not email_sender_password or email_sender_password.lower() == "none":
-                email_sender_password = os.getenv('EMAIL_SENDER_PASSWORD').strip().strip("\"")
+                email_sender_password = os.getenv('EMAIL_SENDER_PASSWORD', "").strip().strip("\"")
         if not email_sender_password or email_sender_password == "":
             # Get PW from config.
             email_sender_password = ""
@@ -569,6 +723,214 @@ class ConfigUtils:
         return int(websiteChecksEveryXMinutes)
     
 
+    def getWebsiteProbeConcurrency(self):
+        """
+        How many websites to probe at the same time?
+
+        Returns:
+            (int): Maximum amount of concurrent website probes.
+        """
+        probe_concurrency=os.getenv("WEBSITE_PROBE_CONCURRENCY")
+        if probe_concurrency:
+            probe_concurrency = probe_concurrency.strip().strip("\"")
+        else:
+            probe_concurrency = 8
+            if "websites" in self._config_array:
+                if "probeConcurrency" in self._config_array["websites"]:
+                    probe_concurrency = self._config_array["websites"]["probeConcurrency"]
+        return int(probe_concurrency)
+    
+    def getWebsiteProbeConnectTimeoutInSeconds(self):
+        """
+        How long to wait for the connection to a website, before considering it down?
+
+        Returns:
+            (float): Connect timeout in seconds.
+        """
+        connect_timeout=os.getenv("WEBSITE_PROBE_CONNECT_TIMEOUT_IN_SECONDS")
+        if connect_timeout:
+            connect_timeout = connect_timeout.strip().strip("\"")
+        else:
+            connect_timeout = 5
+            if "websites" in self._config_array:
+                if "probeConnectTimeout_inSeconds" in self._config_array["websites"]:
+                    connect_timeout = self._config_array["websites"]["probeConnectTimeout_inSeconds"]
+        return float(connect_timeout)
+    
+    def getWebsiteProbeReadTimeoutInSeconds(self):
+        """
+        How long to wait for the response of a website, before considering it down?
+
+        Returns:
+            (float): Read timeout in seconds.
+        """
+        read_timeout=os.getenv("WEBSITE_PROBE_READ_TIMEOUT_IN_SECONDS")
+        if read_timeout:
+            read_timeout = read_timeout.strip().strip("\"")
+        else:
+            read_timeout = 10
+            if "websites" in self._config_array:
+                if "probeReadTimeout_inSeconds" in self._config_array["websites"]:
+                    read_timeout = self._config_array["websites"]["probeReadTimeout_inSeconds"]
+        return float(read_timeout)
+    
+    def getWebsiteLatencyThresholdInMilliseconds(self):
+        """
+        Latency above which a website is considered down, unless a threshold for the website itself is set.
+
+        A website is only down, if both its current response and the p95 of its latest responses are slower.
+        Zero disables the latency check.
+
+        Returns:
+            (int): Default latency threshold in milliseconds.
+        """
+        latency_threshold=os.getenv("WEBSITE_LATENCY_THRESHOLD_IN_MILLISECONDS")
+        if latency_threshold:
+            latency_threshold = latency_threshold.strip().strip("\"")
+        else:
+            latency_threshold = 0
+            if "websites" in self._config_array:
+                if "latencyThreshold_inMilliseconds" in self._config_array["websites"]:
+                    latency_threshold = self._config_array["websites"]["latencyThreshold_inMilliseconds"]
+        return max(0, int(latency_threshold))
+    
+    def getWebsiteLatencyThresholdsInMilliseconds(self):
+        """
+        Latency thresholds of individual websites (zero disables the latency check of a website).
+
+        Environment variable format: "https://website1.com=500, https://website2.com=2000".
+
+        Returns:
+            (dict): Latency threshold in milliseconds per website url.
+        """
+        latency_thresholds={}
+        latency_thresholds_string=os.getenv("WEBSITE_LATENCY_THRESHOLDS_IN_MILLISECONDS")
+        if latency_thresholds_string:
+            latency_thresholds = self._get_url_dict_from_url_list_string(latency_thresholds_string)
+        else:
+            if "websites" in self._config_array:
+                if "latencyThresholds_inMilliseconds" in self._config_array["websites"]:
+                    latency_thresholds = self._config_array["websites"]["latencyThresholds_inMilliseconds"]
+        return {url: max(0, int(threshold)) for url, threshold in latency_thresholds.items()}
+    
+    def getWebsiteProbeMethod(self):
+        """
+        How to probe websites, unless a method for the website itself is set?
+
+        One of WEBSITE_PROBE_METHODS. POST and GET read at most getWebsiteProbeMaxBodyBytes() of the response,
+        HEAD reads no body at all and CONDITIONAL_GET lets the website answer "304 Not Modified" instead of resending its body.
+
+        Returns:
+            (str): Default probe method.
+        """
+        probe_method=os.getenv("WEBSITE_PROBE_METHOD")
+        if probe_method:
+            probe_method = probe_method.strip().strip("\"")
+        else:
+            probe_method = "POST"
+            if "websites" in self._config_array:
+                if "probeMethod" in self._config_array["websites"]:
+                    probe_method = self._config_array["websites"]["probeMethod"]
+        return self._get_validated_website_probe_method(probe_method)
+    
+    def getWebsiteProbeMethods(self):
+        """
+        Probe methods of individual websites.
+
+        Environment variable format: "https://website1.com=HEAD, https://website2.com=CONDITIONAL_GET".
+        Websites with an unknown probe method are left out and use the default probe method.
+
+        Returns:
+            (dict): Probe method per website url.
+        """
+        probe_methods={}
+        probe_methods_string=os.getenv("WEBSITE_PROBE_METHODS")
+        if probe_methods_string:
+            probe_methods = self._get_url_dict_from_url_list_string(probe_methods_string)
+        else:
+            if "websites" in self._config_array:
+                if "probeMethods" in self._config_array["websites"]:
+                    probe_methods = self._config_array["websites"]["probeMethods"]
+        validated_probe_methods = {}
+        for url, method in probe_methods.items():
+            try:
+                validated_probe_methods[url] = self._get_validated_website_probe_method(method)
+            except ValueError as e:
+                print(str(e) + ", ignoring probe method of " + url)
+        return validated_probe_methods
+    
+    def getWebsiteProbeMaxBodyBytes(self):
+        """
+        How much of a response body to read at most, before closing the connection?
+
+        Returns:
+            (int): Maximum amount of body bytes read per probe.
+        """
+        max_body_bytes=os.getenv("WEBSITE_PROBE_MAX_BODY_BYTES")
+        if max_body_bytes:
+            max_body_bytes = max_body_bytes.strip().strip("\"")
+        else:
+            max_body_bytes = 65536
+            if "websites" in self._config_array:
+                if "probeMaxBodyBytes" in self._config_array["websites"]:
+                    max_body_bytes = self._config_array["websites"]["probeMaxBodyBytes"]
+        return int(max_body_bytes)
+    
+    def getWebsiteProbeExpectedContents(self):
+        """
+        Text, that must be contained in the (capped) response body of individual websites to consider them up.
+
+        Not checked for HEAD probes. Environment variable format: "https://website1.com=Welcome, https://website2.com=<title>Shop".
+
+        Returns:
+            (dict): Expected content per website url.
+        """
+        expected_contents={}
+        expected_contents_string=os.getenv("WEBSITE_PROBE_EXPECTED_CONTENTS")
+        if expected_contents_string:
+            expected_contents = self._get_url_dict_from_url_list_string(expected_contents_string)
+        else:
+            if "websites" in self._config_array:
+                if "probeExpectedContents" in self._config_array["websites"]:
+                    expected_contents = self._config_array["websites"]["probeExpectedContents"]
+        return {url: str(expected_content) for url, expected_content in expected_contents.items() if str(expected_content)}
+    
+    def _get_url_dict_from_url_list_string(self, url_list_string):
+        """
+        Get dict from a string with comma-separated url=value items.
+
+        Args:
+            url_list_string (str): String like "https://website1.com=500, https://website2.com=2000".
+
+        Returns:
+            (dict): Values by url.
+        """
+        url_dict = {}
+        for item in url_list_string.strip().strip("\"").split(','):
+            if item.strip():
+                url, value = item.strip().rsplit('=', 1)
+                url_dict[url.strip()] = value.strip()
+        return url_dict
+    
+    def _get_validated_website_probe_method(self, probe_method):
+        """
+        Normalize a probe method and ensure it is supported.
+
+        Args:
+            probe_method (str): Probe method, case insensitive.
+
+        Returns:
+            (str): Upper case probe method.
+
+        Raises:
+            ValueError: If the probe method is not one of WEBSITE_PROBE_METHODS.
+        """
+        probe_method = str(probe_method).strip().upper()
+        if probe_method not in WEBSITE_PROBE_METHODS:
+            raise ValueError("configUtils: Unknown website probe method " + probe_method + ", use one of " + ", ".join(WEBSITE_PROBE_METHODS))
+        return probe_method
+    
+
     # Google Drive.
     def getGoogleDriveFoldersToCheck(self):
         """
@@ -584,6 +946,19 @@ class ConfigUtils:
         return foldersToCheck
     
 
+    def getGoogleDriveServiceAccountJsonFile(self):
+        """
+        Get the path of the google drive service account json file.
+
+        Returns:
+            (str): The swarm secret file, if deployed via swarm, otherwise service_account_key.json in the working directory.
+        """
+        swarm_credentials_secret_json = os.getenv("GOOGLE_DRIVE_SERVICE_ACCOUNT_JSON_FILE")
+        if swarm_credentials_secret_json == "/run/secrets/SET THIS ENVIRONMENT VAR IN SWARM DEPLOY ENVIRONMENTS":
+            return 'service_account_key.json'
+        return swarm_credentials_secret_json
+
+
     def getGoogleDriveServiceAccountCredentials(self):
         """
         Get google drive service account credentials.
@@ -597,16 +972,69 @@ class ConfigUtils:
 
         # If deployed via swarm -> use secret file, if not use service_account_key.json nin main directory.
         if swarm_credentials_secret_json == "/run/secrets/SET THIS ENVIRONMENT VAR IN SWARM DEPLOY ENVIRONMENTS":
-            credentials = ServiceAccountCredentials.from_json_keyfile_name('service_account_key.json', scope)
+            credentials = ServiceAccountCredentials.from_json_keyfile_name(self.getGoogleDriveServiceAccountJsonFile(), scope)
         else:
-            GOOGLE_DRIVE_SERVICE_ACCOUNT_JSON_FILE = swarm_credentials_secret_json
-            with open(f"{GOOGLE_DRIVE_SERVICE_ACCOUNT_JSON_FILE}", "r") as googleDriveServiceAccountJson_file:
-                googleDriveServiceAccountJson_dict = ast.literal_eval(googleDriveServiceAccountJson_file.read().strip())
-                credentials = ServiceAccountCredentials. from_json_keyfile_dict(googleDriveServiceAccountJson_dict, scope)
+            GOOGLE_DRIVE_SERVICE_ACCOUNT_JSON_FILE = self.getGoogleDriveServiceAccountJsonFile()
+            googleDriveServiceAccountJson_dict = ast.literal_eval(secretCache.readSecretFile(GOOGLE_DRIVE_SERVICE_ACCOUNT_JSON_FILE))
+            credentials = ServiceAccountCredentials. from_json_keyfile_dict(googleDriveServiceAccountJson_dict, scope)
     
         return credentials
     
     
+    def isGoogleDriveChangesFeedEnabled(self):
+        """
+        Should google drive folders be updated from the changes feed of the drive, instead of querying every folder each run?
+
+        Returns:
+            (bool): Whether the changes feed is used.
+        """
+        is_changes_feed_enabled=os.getenv("GOOGLE_DRIVE_CHANGES_FEED_ENABLED")
+        if is_changes_feed_enabled:
+            is_changes_feed_enabled = is_changes_feed_enabled.strip().strip("\"").lower() == "true"
+        else:
+            is_changes_feed_enabled = False
+            if "googleDrive" in self._config_array:
+                if "changesFeed_enabled" in self._config_array["googleDrive"]:
+                    is_changes_feed_enabled = str(self._config_array["googleDrive"]["changesFeed_enabled"]).strip().strip("\"").lower() == "true"
+        return bool(is_changes_feed_enabled)
+    
+
+    def getGoogleDriveWorkers(self):
+        """
+        How many google drive folders (or batches of folders) to query at the same time?
+
+        Returns:
+            (int): Amount of google drive folder workers.
+        """
+        google_drive_workers=os.getenv("GOOGLE_DRIVE_WORKERS")
+        if google_drive_workers:
+            google_drive_workers = google_drive_workers.strip().strip("\"")
+        else:
+            google_drive_workers = 4
+            if "googleDrive" in self._config_array:
+                if "workers" in self._config_array["googleDrive"]:
+                    google_drive_workers = self._config_array["googleDrive"]["workers"]
+        return int(google_drive_workers)
+    
+
+    def areGoogleDriveBatchRequestsEnabled(self):
+        """
+        Should the queries of many google drive folders be combined into a single batch request?
+
+        Returns:
+            (bool): Whether batch requests are used.
+        """
+        are_batch_requests_enabled=os.getenv("GOOGLE_DRIVE_BATCH_REQUESTS_ENABLED")
+        if are_batch_requests_enabled:
+            are_batch_requests_enabled = are_batch_requests_enabled.strip().strip("\"").lower() == "true"
+        else:
+            are_batch_requests_enabled = False
+            if "googleDrive" in self._config_array:
+                if "batchRequests_enabled" in self._config_array["googleDrive"]:
+                    are_batch_requests_enabled = str(self._config_array["googleDrive"]["batchRequests_enabled"]).strip().strip("\"").lower() == "true"
+        return bool(are_batch_requests_enabled)
+    
+
     def getGoogleDriveChecksEveryXMinutes(self):
         """
         How often to check google drive folders?
@@ -625,6 +1053,69 @@ class ConfigUtils:
         return int(googleDriveChecksEveryXMinutes)
     
 
+    # Sharding.
+    def isShardingEnabled(self):
+        """
+        Should several replicas of check_tools.py share the checks (coordinated via leases in the database)?
+
+        Read once, when check_tools.py starts.
+
+        Returns:
+            (bool): Whether sharding is enabled.
+        """
+        is_sharding_enabled=os.getenv("CHECKER_SHARDING_ENABLED")
+        if is_sharding_enabled:
+            is_sharding_enabled = is_sharding_enabled.strip().strip("\"").lower() == "true"
+        else:
+            is_sharding_enabled = False
+            if "sharding" in self._config_array:
+                if "enabled" in self._config_array["sharding"]:
+                    is_sharding_enabled = str(self._config_array["sharding"]["enabled"]).strip().strip("\"").lower() == "true"
+        return bool(is_sharding_enabled)
+    
+
+    def getCheckerReplicaID(self):
+        """
+        Get the unique ID of this replica of check_tools.py.
+
+        Read once, when check_tools.py starts.
+
+        Returns:
+            (str): Replica ID, the hostname (container ID in swarm) if not set.
+        """
+        replica_id=os.getenv("CHECKER_REPLICA_ID")
+        if replica_id:
+            replica_id = replica_id.strip().strip("\"")
+        else:
+            replica_id = ""
+            if "sharding" in self._config_array:
+                if "replicaID" in self._config_array["sharding"]:
+                    replica_id = str(self._config_array["sharding"]["replicaID"]).strip()
+        if not replica_id:
+            replica_id = socket.gethostname()
+        return replica_id
+    
+
+    def getCheckerLeaseInSeconds(self):
+        """
+        How long is the lease of a replica valid, before the other replicas take over its checks?
+
+        Read once, when check_tools.py starts. Leases are renewed every third of this time.
+
+        Returns:
+            (int): Lease in seconds.
+        """
+        lease_in_seconds=os.getenv("CHECKER_LEASE_IN_SECONDS")
+        if lease_in_seconds:
+            lease_in_seconds = lease_in_seconds.strip().strip("\"")
+        else:
+            lease_in_seconds = 30
+            if "sharding" in self._config_array:
+                if "lease_inSeconds" in self._config_array["sharding"]:
+                    lease_in_seconds = self._config_array["sharding"]["lease_inSeconds"]
+        return int(lease_in_seconds)
+    
+
     # Other methods.
     def calculateOffset(self, base_to_calulate_offset_from):
         """
@@ -686,15 +1177,13 @@ class ConfigUtils:
         """
         server_auth_token=""
         try:
-            SERVER_AUTHENTICATION_TOKEN_FILE = os.getenv("SERVER_AUTHENTICATION_TOKEN_FILE")
-            with open(f"{SERVER_AUTHENTICATION_TOKEN_FILE}", "r") as server_auth_token_file:
-                server_auth_token = server_auth_token_file.read().strip()
+            server_auth_token = secretCache.readSecretFile(os.getenv("SERVER_AUTHENTICATION_TOKEN_FILE"))
         except:
             pass
         finally:
             # In case of an error or the secret is not set.
             if not server_auth_token or server_auth_token == "" or server_auth_token.lower() == "none":
-                server_auth_token = os.getenv('SERVER_AUTHENTICATION_TOKEN').strip().strip("\"")
+                server_auth_token = os.getenv('SERVER_AUTHENTICATION_TOKEN', "").strip().strip("\"")
         if not server_auth_token or server_auth_token == "":
             # Get PW from config.
             server_auth_token = ""
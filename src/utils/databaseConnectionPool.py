@@ -0,0 +1,259 @@
+### Process-wide pool of database connections.
+### DatabaseWrapper checks out a connection from here instead of connecting anew for every request.
+
+## Imports.
+# database connection.
+import mysql.connector
+from mysql.connector.constants import ClientFlag
+# Thread safe pool of idle connections.
+import queue
+import threading
+# To measure wait times and idle times.
+import time
+
+# Get configuration settings.
+import configSnapshot as ConfigSnapshot
+
+
+class DatabaseConnectionPool:
+    """
+    Thread safe pool of authenticated database connections.
+
+    Connections are created lazily up to the pool size, health-checked with a ping when they
+    have been idle for a while and handed back to the pool once the caller is done with them.
+    """
+
+    # Idle connections older than this are pinged (and reconnected if necessary) before being handed out.
+    _PING_IF_IDLE_FOR_SECONDS = 30
+
+    def __init__(self, getConnectionArguments, poolSize=5, poolTimeoutInSeconds=10):
+        """
+        Constructor of the connection pool.
+
+        Args:
+            getConnectionArguments (callable): Returns the keyword arguments passed to mysql.connector.connect(). Called for every new connection, so that changed credentials are picked up.
+            poolSize (int): Maximum amount of connections kept open at the same time.
+            poolTimeoutInSeconds (float): How long to wait for a free connection before raising an error.
+        """
+        self._getConnectionArguments = getConnectionArguments
+        self._poolSize = poolSize
+        self._poolTimeoutInSeconds = poolTimeoutInSeconds
+
+        # Idle connections as (connection, lastTimeReleased) tuples. Last released connection is reused first.
+        self._idleConnections = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._openConnections = 0
+
+        # Metrics.
+        self._checkouts = 0
+        self._checkoutsThatWaited = 0
+        self._totalWaitTimeInSeconds = 0.0
+        self._maxWaitTimeInSeconds = 0.0
+        self._timeouts = 0
+        self._connectionsCreated = 0
+        self._reconnects = 0
+
+
+    def getConnection(self):
+        """
+        Check out a healthy connection from the pool.
+
+        Waits up to the pool timeout, if all connections are in use.
+
+        Returns:
+            (MySQLConnection): Connection that has to be returned via releaseConnection().
+        """
+        waitStart = time.monotonic()
+        connection, lastTimeReleased, waited = self._acquire()
+        waitTime = time.monotonic() - waitStart
+
+        # Record pool wait metrics.
+        with self._lock:
+            self._checkouts += 1
+            if waited:
+                self._checkoutsThatWaited += 1
+                self._totalWaitTimeInSeconds += waitTime
+                self._maxWaitTimeInSeconds = max(self._maxWaitTimeInSeconds, waitTime)
+
+        # Health check connections that have been idle for a while.
+        if lastTimeReleased is not None and time.monotonic() - lastTimeReleased > self._PING_IF_IDLE_FOR_SECONDS:
+            connection = self.checkConnection(connection)
+
+        return connection
+
+
+    def checkConnection(self, connection):
+        """
+        Ping a checked out connection and replace it, if the server closed it (e.g. wait_timeout).
+
+        Used for long-lived connections, that are not returned to the pool between uses.
+
+        Args:
+            connection (MySQLConnection): Connection previously obtained via getConnection().
+
+        Returns:
+            (MySQLConnection): The same connection or its replacement. If no replacement can be opened, the slot is freed and the error raised.
+        """
+        try:
+            connection.ping()
+            return connection
+        except Exception:
+            pass
+
+        self._closeQuietly(connection)
+        try:
+            connection = self._connect()
+        except Exception:
+            self._forgetConnection()
+            raise
+        with self._lock:
+            self._reconnects += 1
+        return connection
+
+
+    def releaseConnection(self, connection):
+        """
+        Return a connection to the pool.
+
+        Uncommitted work is rolled back, so that the next user starts with a clean session.
+
+        Args:
+            connection (MySQLConnection): Connection previously obtained via getConnection().
+        """
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+        except Exception:
+            # Connection is unusable -> drop it and free its slot.
+            self.discardConnection(connection)
+            return
+        self._idleConnections.put((connection, time.monotonic()))
+
+
+    def discardConnection(self, connection):
+        """
+        Close a broken connection instead of returning it to the pool.
+
+        Args:
+            connection (MySQLConnection): Connection previously obtained via getConnection().
+        """
+        self._closeQuietly(connection)
+        self._forgetConnection()
+
+
+    def getMetrics(self):
+        """
+        Get usage metrics of the pool.
+
+        Returns:
+            (dict): Pool size, connection counts and pool wait statistics.
+        """
+        with self._lock:
+            return {
+                "poolSize": self._poolSize,
+                "openConnections": self._openConnections,
+                "idleConnections": self._idleConnections.qsize(),
+                "connectionsCreated": self._connectionsCreated,
+                "reconnects": self._reconnects,
+                "checkouts": self._checkouts,
+                "checkoutsThatWaited": self._checkoutsThatWaited,
+                "totalWaitTime_inMilliseconds": round(self._totalWaitTimeInSeconds * 1000, 3),
+                "maxWaitTime_inMilliseconds": round(self._maxWaitTimeInSeconds * 1000, 3),
+                "timeouts": self._timeouts,
+            }
+
+
+    def _acquire(self):
+        """
+        Get an idle connection, open a new one or wait for one to be released.
+
+        Returns:
+            (tuple): (connection, lastTimeReleased or None for new connections, whether the caller had to wait).
+        """
+        # Reuse an idle connection.
+        try:
+            connection, lastTimeReleased = self._idleConnections.get_nowait()
+            return connection, lastTimeReleased, False
+        except queue.Empty:
+            pass
+
+        # Open a new connection, if the pool is not exhausted yet.
+        mayCreateConnection = False
+        with self._lock:
+            if self._openConnections < self._poolSize:
+                self._openConnections += 1
+                mayCreateConnection = True
+        if mayCreateConnection:
+            try:
+                return self._connect(), None, False
+            except Exception:
+                self._forgetConnection()
+                raise
+
+        # Wait for another user to release a connection.
+        try:
+            connection, lastTimeReleased = self._idleConnections.get(timeout=self._poolTimeoutInSeconds)
+            return connection, lastTimeReleased, True
+        except queue.Empty:
+            with self._lock:
+                self._timeouts += 1
+            raise TimeoutError("databaseConnectionPool: No database connection available within " + str(self._poolTimeoutInSeconds) + " seconds (pool size " + str(self._poolSize) + ")")
+
+
+    def _connect(self):
+        connection = mysql.connector.connect(**self._getConnectionArguments())
+        with self._lock:
+            self._connectionsCreated += 1
+        return connection
+
+
+    def _forgetConnection(self):
+        with self._lock:
+            self._openConnections = max(0, self._openConnections - 1)
+
+
+    def _closeQuietly(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+
+# The pool shared by all DatabaseWrappers of this process.
+_databaseConnectionPool = None
+_databaseConnectionPoolLock = threading.Lock()
+
+
+def getDatabaseConnectionPool():
+    """
+    Get the process-wide connection pool, creating it on first use.
+
+    Returns:
+        (DatabaseConnectionPool): The shared connection pool.
+    """
+    global _databaseConnectionPool
+    if _databaseConnectionPool is None:
+        with _databaseConnectionPoolLock:
+            if _databaseConnectionPool is None:
+                config = ConfigSnapshot.getConfig()
+                _databaseConnectionPool = DatabaseConnectionPool(
+                    _getConnectionArguments,
+                    config.databasePoolSize,
+                    config.databasePoolTimeoutInSeconds
+                )
+    return _databaseConnectionPool
+
+
+# Connection arguments based on the current config snapshot.
+def _getConnectionArguments():
+    config = ConfigSnapshot.getConfig()
+    return {
+        "host": config.databaseHost,
+        "user": config.databaseUser,
+        "password": config.databasePassword,
+        "database": config.databaseName,
+        "port": 3306,
+        # UPDATE row counts report matched instead of changed rows, so conditional updates can be used as token checks.
+        "client_flags": [ClientFlag.FOUND_ROWS],
+    }
@@ -28,57 +28,151 @@ import backupCheckItem as BackupCheckItem
 # WebsiteState item from own models to use location independent.
 import websiteStateAndMessageSentItem as WebsiteStateAndMessageSentItem
 
-# Get configuration settings.
-import configUtils as ConfigUtils
+# Process-wide pool of database connections.
+import databaseConnectionPool as DatabaseConnectionPool
+
+# Reuse passed wrappers or open own ones.
+from contextlib import contextmanager
+
+
+# Results of writing a heartbeat (see createOrUpdateStateCheck() and createOrUpdateBackupCheck()).
+HEARTBEAT_UPDATED = "updated"
+HEARTBEAT_CREATED = "created"
+HEARTBEAT_INVALID_TOKEN = "invalid token"
+
+# Columns read to create StateCheckItems and BackupCheckItems (see createStateCheckItemFromRow() and createBackupCheckItemFromRow()).
+STATE_CHECK_COLUMNS = "ID, name, description, token, stateCheckFrequency_inMinutes, lastTimeToolWasUp, toolIsDownMessageHasBeenSent"
+BACKUP_CHECK_COLUMNS = "ID, name, description, token, stateCheckFrequency_inMinutes, mostRecentBackupFile_creationDate, mostRecentBackupFile_hash, backupIsDownMessageHasBeenSent"
+
+# Amount of rows fetched per round trip, when streaming all checks.
+STREAMING_BATCH_SIZE = 1000
+
+# Index on checked_tools to select tools whose state changed (see ensureNextDueAtColumn()).
+NEXT_DUE_AT_INDEX = "idx_checked_tools_stateChange"
+
+# Leases of the replicas of check_tools.py in sharded mode (see ensureCheckerReplicasTable()).
+CHECKER_REPLICAS_TABLE = "checker_replicas"
 
 
 class DatabaseWrapper:
 
 	# Constructor.
+	# Checks out a connection of the process-wide pool. Return it via close() or use the wrapper as context manager.
 	def __init__(self):
 
-		# Get connection to database.
-		configUtils = ConfigUtils.ConfigUtils()
-
 		# Database connection
-		self.mydb = mysql.connector.connect(
-			host=configUtils.getDatabaseHost(),
-			user=configUtils.getDatabaseUser(),
-			password=configUtils.getDatabasePassword(),
-			database=configUtils.getDatabaseName(),
-			port=3306
-		)
+		self._pool = DatabaseConnectionPool.getDatabaseConnectionPool()
+		self.mydb = self._pool.getConnection()
 		self.mycursor = self.mydb.cursor(buffered=True) # need to buffer to fix mysql.connector.errors.InternalError: Unread result found (https://stackoverflow.com/questions/29772337/python-mysql-connector-unread-result-found-when-using-fetchone)
 
 
+	# Return the connection to the pool.
+	def close(self):
+		if getattr(self, "mydb", None) is None:
+			return
+		try:
+			self.mycursor.close()
+		except Exception:
+			pass
+		self._pool.releaseConnection(self.mydb)
+		self.mydb = None
+		self.mycursor = None
+
+	# Prepare a long-lived wrapper for its next use.
+	# Ends the open transaction, so that following reads see current data, and replaces the connection, if the server closed it.
+	def refreshSession(self):
+		if self.mydb is None:
+			self.mydb = self._pool.getConnection()
+		else:
+			try:
+				if self.mydb.in_transaction:
+					self.mydb.rollback()
+			except Exception:
+				pass
+			connection, self.mydb, self.mycursor = self.mydb, None, None
+			self.mydb = self._pool.checkConnection(connection)
+		self.mycursor = self.mydb.cursor(buffered=True)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	# Safety net for wrappers that are never closed explicitly, so that their connection is not lost for the pool.
+	def __del__(self):
+		self.close()
+
+
 
 	# Create or update state check of a tool.
 	# Pass stateCheckItem as parameter.
+	# Returns the passed stateCheckItem or None, if the token is invalid.
 	def createOrUpdateStateCheck(self, stateCheckItemToCreateOrUpdate):
+		result = self.upsertStateCheck(stateCheckItemToCreateOrUpdate, int(time.time()))
+		self.mydb.commit()
+		if result == HEARTBEAT_INVALID_TOKEN:
+			return None
+		return stateCheckItemToCreateOrUpdate
 
-		# Current time.
+	# Create or update state checks of many tools in a single transaction.
+	# Pass list of stateCheckItems as parameter.
+	# Returns one of HEARTBEAT_UPDATED, HEARTBEAT_CREATED or HEARTBEAT_INVALID_TOKEN per item.
+	def createOrUpdateStateChecks(self, stateCheckItemsToCreateOrUpdate):
 		now = int(time.time())
+		results = [self.upsertStateCheck(stateCheckItem, now) for stateCheckItem in stateCheckItemsToCreateOrUpdate]
+		self.mydb.commit()
+		return results
 
-		# Does item already exist?
-		stateCheckItem = self.getStateCheckItemByName(stateCheckItemToCreateOrUpdate.name)
-		if stateCheckItem == None:
-			# Create new tool to check for.
-			stateCheckItem = self.createNewStateCheck(stateCheckItemToCreateOrUpdate)
-		else:
-			# Check if the token is the same.
-			if stateCheckItem.token == stateCheckItemToCreateOrUpdate.token:
-				# Update last time tool was up.
-				stateCheckItem = self.indicateThatToolIsUp(stateCheckItem, stateCheckItemToCreateOrUpdate.description, stateCheckItemToCreateOrUpdate.stateCheckFrequency_inMinutes)
-			else:
-				# token is invalid.
-				return None
-		return stateCheckItem
+	# Write the heartbeat of a tool without committing.
+	# Known tools with a valid token only cost a single conditional UPDATE.
+	# Unknown tools are inserted, unless the name is already taken by a tool with another token.
+	# Returns HEARTBEAT_UPDATED, HEARTBEAT_CREATED or HEARTBEAT_INVALID_TOKEN.
+	def upsertStateCheck(self, stateCheckItem, now):
+
+		# Update last time tool was up, if name and token match.
+		sql = "UPDATE checked_tools SET lastTimeToolWasUp = %s, description = %s, stateCheckFrequency_inMinutes = %s WHERE name = %s AND token = %s"
+		val = (now, stateCheckItem.description, stateCheckItem.stateCheckFrequency_inMinutes, stateCheckItem.name, stateCheckItem.token)
+		self.mycursor.execute(sql, val)
+		if self.mycursor.rowcount > 0:
+			return HEARTBEAT_UPDATED
+
+		# Create new tool to check for, if the name is not taken yet.
+		insertSql = "INSERT INTO checked_tools (name, description, token, stateCheckFrequency_inMinutes, lastTimeToolWasUp) SELECT %s, %s, %s, %s, %s FROM DUAL WHERE NOT EXISTS (SELECT ID FROM checked_tools WHERE name = %s)"
+		val = (stateCheckItem.name, stateCheckItem.description, stateCheckItem.token, stateCheckItem.stateCheckFrequency_inMinutes, now, stateCheckItem.name)
+		self.mycursor.execute(insertSql, val)
+		if self.mycursor.rowcount > 0:
+			stateCheckItem.ID = self.mycursor.lastrowid
+			return HEARTBEAT_CREATED
+
+		# Name exists with another token.
+		return HEARTBEAT_INVALID_TOKEN
+
+	# Write buffered heartbeats of many tools at once.
+	# Pass list of (stateCheckItem, lastTimeToolWasUp) tuples as parameter.
+	# Each chunk of tools is updated by a single statement, tools whose token does not match are skipped.
+	def updateLastTimeToolsWereUp(self, heartbeats, chunkSize=500):
+		for chunkStart in range(0, len(heartbeats), chunkSize):
+			chunk = heartbeats[chunkStart:chunkStart + chunkSize]
+			whenThen = " ".join(["WHEN %s THEN %s"] * len(chunk))
+			sql = "UPDATE checked_tools SET lastTimeToolWasUp = CASE name " + whenThen + " END, description = CASE name " + whenThen + " END, stateCheckFrequency_inMinutes = CASE name " + whenThen + " END WHERE (name, token) IN (" + ", ".join(["(%s, %s)"] * len(chunk)) + ")"
+			val = []
+			for stateCheckItem, lastTimeToolWasUp in chunk:
+				val += [stateCheckItem.name, lastTimeToolWasUp]
+			for stateCheckItem, lastTimeToolWasUp in chunk:
+				val += [stateCheckItem.name, stateCheckItem.description]
+			for stateCheckItem, lastTimeToolWasUp in chunk:
+				val += [stateCheckItem.name, stateCheckItem.stateCheckFrequency_inMinutes]
+			for stateCheckItem, lastTimeToolWasUp in chunk:
+				val += [stateCheckItem.name, stateCheckItem.token]
+			self.mycursor.execute(sql, tuple(val))
+		self.mydb.commit()
 
 	# Get StateCheckItem by its name.
 	# Pass name as parameter.
 	# Return is stateCheckItem with DB ID or None.
 	def getStateCheckItemByName(self, name):
-		query = "SELECT ID, name, description, token, stateCheckFrequency_inMinutes, lastTimeToolWasUp, toolIsDownMessageHasBeenSent FROM checked_tools WHERE name=%s "
+		query = "SELECT " + STATE_CHECK_COLUMNS + " FROM checked_tools WHERE name=%s "
 		val = (name, )
 		self.mycursor.execute(query, val)
 		myresult = self.mycursor.fetchone()
@@ -86,82 +180,10 @@ class DatabaseWrapper:
 		# Did query retrieve valid stateCheckItem?
 		stateCheckItem = None
 		if (myresult != None):
-
-			stateCheckItemHelper = {
-				'ID': myresult[0],
-				'name': myresult[1],
-				'description': myresult[2],
-				'token': myresult[3],
-				'stateCheckFrequency_inMinutes': myresult[4],
-				'lastTimeToolWasUp': myresult[5],
-				'toolIsDownMessageHasBeenSent': myresult[6]
-			}
-
-			stateCheckItem = StateCheckItem.StateCheckItem(
-				stateCheckItemHelper["name"],
-				stateCheckItemHelper["token"], 
-				stateCheckItemHelper["stateCheckFrequency_inMinutes"], 
-				stateCheckItemHelper["description"],
-				stateCheckItemHelper["ID"],
-				stateCheckItemHelper["lastTimeToolWasUp"],
-				stateCheckItemHelper["toolIsDownMessageHasBeenSent"]
-			)
+			stateCheckItem = createStateCheckItemFromRow(myresult)
 		return stateCheckItem
 
 
-	# Create a new stateCheck.
-	# Pass stateCheckItem as parameter.
-	def createNewStateCheck(self, stateCheckItemToCreate):
-
-		# Current time.
-		now = int(time.time())
-
-		# Does item already exist?
-		stateCheckItem = self.getStateCheckItemByName(stateCheckItemToCreate.name)
-		if stateCheckItem == None:
-
-			# Create new tool to check state of.
-			# Execute insert query to create a new state check item.
-			insertSql = "INSERT INTO checked_tools (name, description, token, stateCheckFrequency_inMinutes, lastTimeToolWasUp) VALUES (%s, %s, %s, %s, %s)"
-			val = (stateCheckItemToCreate.name, stateCheckItemToCreate.description, stateCheckItemToCreate.token, stateCheckItemToCreate.stateCheckFrequency_inMinutes, now)
-			self.mycursor.execute(insertSql, val)
-			self.mydb.commit()
-
-			# Return newly created user.
-			return self.getStateCheckItemByName(stateCheckItemToCreate.name)
-		else:
-			# Item already exists -> do nothing and return None.
-			return None
-
-
-
-	# Update lastTimeToolWasUp.
-	# Returns updated stateItem.
-	def indicateThatToolIsUp(self, stateCheckItemToUpdate, description, stateCheckFrequency_inMinutes):
-
-		# Check if the token is the same.
-		stateCheckItem = self.getStateCheckItemByName(stateCheckItemToUpdate.name)
-		if stateCheckItem.token == stateCheckItemToUpdate.token:
-
-			# Current time.
-			now = int(time.time())
-
-			sql = "UPDATE checked_tools SET lastTimeToolWasUp = %s, description = %s, stateCheckFrequency_inMinutes = %s WHERE ID = %s"
-			val = (now, description, stateCheckFrequency_inMinutes, stateCheckItemToUpdate.ID)
-
-			# Execute query.
-			self.mycursor.execute(sql, val)
-			self.mydb.commit()
-
-			# Return updated item.
-			return self.getStateCheckItemByName(stateCheckItemToUpdate.name)
-
-		else:
-			# Token is invalid.
-			return None
-
-
-
 	# Update state of ToolIsDownMessageHasBeenSent.
 	# Pass stateCheckItemName and new state as parameter.
 	def updateToolIsDownMessageHasBeenSentState(self, stateCheckItemName, newToolIsDownMessageHasBeenSentState):
@@ -187,16 +209,13 @@ class DatabaseWrapper:
 	# Pass stateCheckItem as parameter.
 	def stopStateCheck(self, stateCheckItemToDelete):
 
-		# Verify correct token.
-		stateCheckItem = self.getStateCheckItemByName(stateCheckItemToDelete.name)
-		if stateCheckItem != None and stateCheckItemToDelete.token == stateCheckItem.token:
-
-			# Delete state check.
-			query = "DELETE FROM checked_tools WHERE ID=%s "
-			val = (stateCheckItem.ID, )
-			self.mycursor.execute(query, val)
-			self.mydb.commit()
+		# Delete state check, if the token is correct.
+		query = "DELETE FROM checked_tools WHERE name=%s AND token=%s"
+		val = (stateCheckItemToDelete.name, stateCheckItemToDelete.token)
+		self.mycursor.execute(query, val)
+		self.mydb.commit()
 
+		if self.mycursor.rowcount > 0:
 			return "Successfully stopped checking state"
 		else:
 			return None
@@ -204,18 +223,54 @@ class DatabaseWrapper:
 
 
 
-	# Get all tools to check.
-	# Return is an associative array or an empty array.
+	# Get all tools to check with a single query.
+	# Return is an array of stateCheckItems or an empty array.
 	def getAllToolsToCheck(self):
-		query = "SELECT name FROM checked_tools ORDER BY ID"
+		query = "SELECT " + STATE_CHECK_COLUMNS + " FROM checked_tools ORDER BY ID"
+		self.mycursor.execute(query)
+		return [createStateCheckItemFromRow(row) for row in self.mycursor.fetchall()]
+
+	# Stream all tools to check with a single query, without holding all rows in memory.
+	# Yields stateCheckItems. Do not use this wrapper for other queries before the generator is exhausted or closed.
+	def iterateAllToolsToCheck(self, batchSize=STREAMING_BATCH_SIZE):
+		query = "SELECT " + STATE_CHECK_COLUMNS + " FROM checked_tools ORDER BY ID"
+		for row in self.streamRows(query, batchSize):
+			yield createStateCheckItemFromRow(row)
+
+	# Get only the tools whose up/down state disagrees with their toolIsDownMessageHasBeenSent flag.
+	# Pass the time before which the heartbeat of a tool must be due to consider it down (now - tolerance period).
+	# Requires the nextDueAt column, see ensureNextDueAtColumn(). Both ranges are served by the stateChange index.
+	# Return is an array of stateCheckItems or an empty array.
+	def getToolsWithChangedState(self, downIfDueBefore):
+		query = "SELECT " + STATE_CHECK_COLUMNS + " FROM checked_tools WHERE (toolIsDownMessageHasBeenSent = 0 AND nextDueAt < %s) OR (toolIsDownMessageHasBeenSent = 1 AND nextDueAt >= %s) ORDER BY ID"
+		val = (downIfDueBefore, downIfDueBefore)
+		self.mycursor.execute(query, val)
+		return [createStateCheckItemFromRow(row) for row in self.mycursor.fetchall()]
+
+	# Add the stored generated column nextDueAt (time when the next heartbeat of a tool is due) and its index to checked_tools, if missing.
+	# Safe to call on every start. Return is True, once the column and index exist.
+	def ensureNextDueAtColumn(self):
+		query = "SELECT COUNT(*) FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'checked_tools' AND COLUMN_NAME = 'nextDueAt'"
 		self.mycursor.execute(query)
-		myresults = self.mycursor.fetchall()
+		if self.mycursor.fetchone()[0] == 0:
+			self.mycursor.execute("ALTER TABLE checked_tools ADD COLUMN nextDueAt BIGINT AS (CAST(lastTimeToolWasUp AS SIGNED) + stateCheckFrequency_inMinutes * 60) STORED")
 
-		toolsToCheck = []
-		for result in myresults:
-			toolToCheck = self.getStateCheckItemByName(result[0])
-			toolsToCheck.append(toolToCheck)
-		return toolsToCheck
+		query = "SELECT COUNT(*) FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'checked_tools' AND INDEX_NAME = %s"
+		val = (NEXT_DUE_AT_INDEX, )
+		self.mycursor.execute(query, val)
+		if self.mycursor.fetchone()[0] == 0:
+			self.mycursor.execute("ALTER TABLE checked_tools ADD INDEX " + NEXT_DUE_AT_INDEX + " (toolIsDownMessageHasBeenSent, nextDueAt)")
+		return True
+
+	# Get name, token and settings of all tools with a single query, e.g. to fill the tool registry of the api.
+	# Return is a list of stateCheckItems without state information.
+	def getAllToolTokens(self):
+		query = "SELECT ID, name, description, token, stateCheckFrequency_inMinutes FROM checked_tools"
+		self.mycursor.execute(query)
+		return [
+			StateCheckItem.StateCheckItem(name, token, stateCheckFrequency_inMinutes, description, ID)
+			for ID, name, description, token, stateCheckFrequency_inMinutes in self.mycursor.fetchall()
+		]
 
 
 
@@ -223,31 +278,61 @@ class DatabaseWrapper:
 
 	# Create or update backup check of a tool.
 	# Pass backupCheckItem as parameter.
+	# Returns the passed backupCheckItem or None, if the token is invalid.
 	def createOrUpdateBackupCheck(self, backupCheckItemToCreateOrUpdate):
+		result = self.upsertBackupCheck(backupCheckItemToCreateOrUpdate)
+		self.mydb.commit()
+		if result == HEARTBEAT_INVALID_TOKEN:
+			return None
+		return backupCheckItemToCreateOrUpdate
 
-		# Current time.
-		now = int(time.time())
+	# Create or update backup checks of many backups in a single transaction.
+	# Pass list of backupCheckItems as parameter.
+	# Returns one of HEARTBEAT_UPDATED, HEARTBEAT_CREATED or HEARTBEAT_INVALID_TOKEN per item.
+	def createOrUpdateBackupChecks(self, backupCheckItemsToCreateOrUpdate):
+		results = [self.upsertBackupCheck(backupCheckItem) for backupCheckItem in backupCheckItemsToCreateOrUpdate]
+		self.mydb.commit()
+		return results
+
+	# Write the state of a backup without committing.
+	# Known backups with a valid token only cost a single conditional UPDATE.
+	# Unknown backups are inserted, unless the name is already taken by a backup with another token.
+	# Returns HEARTBEAT_UPDATED, HEARTBEAT_CREATED or HEARTBEAT_INVALID_TOKEN.
+	def upsertBackupCheck(self, backupCheckItem):
+
+		# Update backup state, if name and token match.
+		# The creation date is only taken over, if the hash changed. Otherwise a client resending the same backup
+		# with a new date would keep a stale backup up. MySQL assigns from left to right, so the date has to be
+		# compared before the hash is overwritten.
+		sql = "UPDATE checked_backups SET description = %s, stateCheckFrequency_inMinutes = %s, mostRecentBackupFile_creationDate = IF(mostRecentBackupFile_hash <=> %s, mostRecentBackupFile_creationDate, %s), mostRecentBackupFile_hash = %s WHERE name = %s AND token = %s"
+		val = (
+			backupCheckItem.description,
+			backupCheckItem.stateCheckFrequency_inMinutes,
+			backupCheckItem.mostRecentBackupFile_hash,
+			backupCheckItem.mostRecentBackupFile_creationDate,
+			backupCheckItem.mostRecentBackupFile_hash,
+			backupCheckItem.name,
+			backupCheckItem.token
+		)
+		self.mycursor.execute(sql, val)
+		if self.mycursor.rowcount > 0:
+			return HEARTBEAT_UPDATED
 
-		# Does item already exist?
-		backupCheckItem = self.getBackupCheckItemByName(backupCheckItemToCreateOrUpdate.name)
-		if backupCheckItem == None:
-			# Create new tool to check for.
-			backupCheckItem = self.createNewBackupCheck(backupCheckItemToCreateOrUpdate)
-		else:
-			# Check if the token is the same.
-			if backupCheckItem.token == backupCheckItemToCreateOrUpdate.token:
-				# Update last time tool was up.
-				backupCheckItem = self.updateBackupCheck(backupCheckItemToCreateOrUpdate)
-			else:
-				# token is invalid.
-				return None
-		return backupCheckItem
+		# Create new backup to check, if the name is not taken yet.
+		insertSql = "INSERT INTO checked_backups (name, description, token, stateCheckFrequency_inMinutes, mostRecentBackupFile_creationDate, mostRecentBackupFile_hash) SELECT %s, %s, %s, %s, %s, %s FROM DUAL WHERE NOT EXISTS (SELECT ID FROM checked_backups WHERE name = %s)"
+		val = (backupCheckItem.name, backupCheckItem.description, backupCheckItem.token, backupCheckItem.stateCheckFrequency_inMinutes, backupCheckItem.mostRecentBackupFile_creationDate, backupCheckItem.mostRecentBackupFile_hash, backupCheckItem.name)
+		self.mycursor.execute(insertSql, val)
+		if self.mycursor.rowcount > 0:
+			return HEARTBEAT_CREATED
+
+		# Name exists with another token.
+		return HEARTBEAT_INVALID_TOKEN
 
 	# Get BackupCheckItem by its name.
 	# Pass name as parameter.
 	# Return is backupCheckItem with DB ID or None.
 	def getBackupCheckItemByName(self, name):
-		query = "SELECT ID, name, description, token, stateCheckFrequency_inMinutes, mostRecentBackupFile_creationDate, mostRecentBackupFile_hash, backupIsDownMessageHasBeenSent FROM checked_backups WHERE name=%s "
+		query = "SELECT " + BACKUP_CHECK_COLUMNS + " FROM checked_backups WHERE name=%s "
 		val = (name, )
 		self.mycursor.execute(query, val)
 		myresult = self.mycursor.fetchone()
@@ -255,92 +340,10 @@ class DatabaseWrapper:
 		# Did query retrieve valid backupCheckItem?
 		backupCheckItem = None
 		if (myresult != None):
-
-			backupCheckItemHelper = {
-				'ID': myresult[0],
-				'name': myresult[1],
-				'description': myresult[2],
-				'token': myresult[3],
-				'stateCheckFrequency_inMinutes': myresult[4],
-				'mostRecentBackupFile_creationDate': myresult[5],
-				'mostRecentBackupFile_hash': myresult[6],
-				'backupIsDownMessageHasBeenSent': myresult[7]
-			}
-
-			backupCheckItem = BackupCheckItem.BackupCheckItem(
-				backupCheckItemHelper["name"],
-				backupCheckItemHelper["token"], 
-				backupCheckItemHelper["stateCheckFrequency_inMinutes"], 
-				backupCheckItemHelper["mostRecentBackupFile_creationDate"],
-				backupCheckItemHelper["mostRecentBackupFile_hash"],
-				backupCheckItemHelper["description"],
-				backupCheckItemHelper["ID"],
-				backupCheckItemHelper["backupIsDownMessageHasBeenSent"]
-			)
+			backupCheckItem = createBackupCheckItemFromRow(myresult)
 		return backupCheckItem
 
 
-	# Create a new stateCheck.
-	# Pass backupCheckItem as parameter.
-	def createNewBackupCheck(self, backupCheckItemToCreate):
-
-		# Current time.
-		now = int(time.time())
-
-		# Does item already exist?
-		backupCheckItem = self.getBackupCheckItemByName(backupCheckItemToCreate.name)
-		if backupCheckItem == None:
-
-			# Create new tool to check state of.
-			# Execute insert query to create a new backup check item.
-			insertSql = "INSERT INTO checked_backups (name, description, token, stateCheckFrequency_inMinutes, mostRecentBackupFile_creationDate, mostRecentBackupFile_hash) VALUES (%s, %s, %s, %s, %s, %s)"
-			val = (backupCheckItemToCreate.name, backupCheckItemToCreate.description, backupCheckItemToCreate.token, backupCheckItemToCreate.stateCheckFrequency_inMinutes, backupCheckItemToCreate.mostRecentBackupFile_creationDate, backupCheckItemToCreate.mostRecentBackupFile_hash)
-			self.mycursor.execute(insertSql, val)
-			self.mydb.commit()
-
-			# Return newly created user.
-			return self.getBackupCheckItemByName(backupCheckItemToCreate.name)
-		else:
-			# Item already exists -> do nothing and return None.
-			return None
-
-
-
-	# Update backup state.
-	# Returns updated stateItem.
-	def updateBackupCheck(self, backupCheckItemToUpdate):
-
-		# Check if the token is the same.
-		backupCheckItem = self.getBackupCheckItemByName(backupCheckItemToUpdate.name)
-		if backupCheckItem.token == backupCheckItemToUpdate.token:
-
-			# Only update the item, if the hash changed.
-			if backupCheckItem.mostRecentBackupFile_hash == backupCheckItemToUpdate.mostRecentBackupFile_hash:
-				print ("hash did not change")
-				return backupCheckItem
-			else:
-				sql = "UPDATE checked_backups SET description = %s, stateCheckFrequency_inMinutes = %s, mostRecentBackupFile_creationDate = %s, mostRecentBackupFile_hash = %s WHERE ID = %s"
-				val = (
-					backupCheckItemToUpdate.description, 
-					backupCheckItemToUpdate.stateCheckFrequency_inMinutes, 
-					backupCheckItemToUpdate.mostRecentBackupFile_creationDate, 
-					backupCheckItemToUpdate.mostRecentBackupFile_hash, 
-					backupCheckItem.ID
-				)
-
-				# Execute query.
-				self.mycursor.execute(sql, val)
-				self.mydb.commit()
-
-				# Return updated item.
-				return self.getBackupCheckItemByName(backupCheckItemToUpdate.name)
-
-		else:
-			# Token is invalid.
-			return None
-
-
-
 	# Update state of backupIsDownMessageHasBeenSent.
 	# Pass backupCheckItemName and new state as parameter.
 	def updateBackupIsDownMessageHasBeenSentState(self, backupCheckItemName, newBackupIsDownMessageHasBeenSentState):
@@ -366,16 +369,13 @@ class DatabaseWrapper:
 	# Pass backupCheckItem as parameter.
 	def stopBackupCheck(self, backupCheckItemToDelete):
 
-		# Verify correct token.
-		backupCheckItem = self.getBackupCheckItemByName(backupCheckItemToDelete.name)
-		if backupCheckItem != None and backupCheckItemToDelete.token == backupCheckItem.token:
-
-			# Delete backup check.
-			query = "DELETE FROM checked_backups WHERE ID=%s "
-			val = (backupCheckItem.ID, )
-			self.mycursor.execute(query, val)
-			self.mydb.commit()
+		# Delete backup check, if the token is correct.
+		query = "DELETE FROM checked_backups WHERE name=%s AND token=%s"
+		val = (backupCheckItemToDelete.name, backupCheckItemToDelete.token)
+		self.mycursor.execute(query, val)
+		self.mydb.commit()
 
+		if self.mycursor.rowcount > 0:
 			return "Successfully stopped checking backup"
 		else:
 			return None
@@ -383,18 +383,41 @@ class DatabaseWrapper:
 
 
 
-	# Get all backups to check.
-	# Return is an associative array or an empty array.
+	# Get all backups to check with a single query.
+	# Return is an array of backupCheckItems or an empty array.
 	def getAllBackupsToCheck(self):
-		query = "SELECT name FROM checked_backups ORDER BY ID"
+		query = "SELECT " + BACKUP_CHECK_COLUMNS + " FROM checked_backups ORDER BY ID"
 		self.mycursor.execute(query)
-		myresults = self.mycursor.fetchall()
+		return [createBackupCheckItemFromRow(row) for row in self.mycursor.fetchall()]
+
+	# Stream all backups to check with a single query, without holding all rows in memory.
+	# Yields backupCheckItems. Do not use this wrapper for other queries before the generator is exhausted or closed.
+	def iterateAllBackupsToCheck(self, batchSize=STREAMING_BATCH_SIZE):
+		query = "SELECT " + BACKUP_CHECK_COLUMNS + " FROM checked_backups ORDER BY ID"
+		for row in self.streamRows(query, batchSize):
+			yield createBackupCheckItemFromRow(row)
 
-		toolsToCheck = []
-		for result in myresults:
-			toolToCheck = self.getBackupCheckItemByName(result[0])
-			toolsToCheck.append(toolToCheck)
-		return toolsToCheck
+
+	# Stream the rows of a query through an unbuffered (server-side) cursor, batchSize rows per round trip.
+	def streamRows(self, query, batchSize=STREAMING_BATCH_SIZE):
+		cursor = self.mydb.cursor(buffered=False)
+		allRowsRead = False
+		try:
+			cursor.execute(query)
+			rows = cursor.fetchmany(batchSize)
+			while rows:
+				for row in rows:
+					yield row
+				rows = cursor.fetchmany(batchSize)
+			allRowsRead = True
+		finally:
+			# The connection cannot run other queries while rows are unread, e.g. when the caller stopped early.
+			if not allRowsRead:
+				try:
+					cursor.fetchall()
+				except Exception:
+					pass
+			cursor.close()
 
 
 
@@ -484,3 +507,57 @@ class DatabaseWrapper:
 		# Return updated item.
 		return self.getWebsiteCheckItemByName(websiteCheckItem.name)
 
+
+
+	# Create the table holding the leases of the checker replicas, if it does not exist yet.
+	def ensureCheckerReplicasTable(self):
+		self.mycursor.execute("CREATE TABLE IF NOT EXISTS " + CHECKER_REPLICAS_TABLE + " (replicaID VARCHAR(255) NOT NULL PRIMARY KEY, leaseExpiresAt BIGINT NOT NULL)")
+		self.mydb.commit()
+
+	# Create or extend the lease of a checker replica.
+	# Leases are measured with the clock of the DB, so that replicas on hosts with different clocks agree.
+	# Returns the IDs of all replicas with a valid lease (including the renewed one), sorted.
+	def renewCheckerReplicaLease(self, replicaID, leaseInSeconds):
+		sql = "INSERT INTO " + CHECKER_REPLICAS_TABLE + " (replicaID, leaseExpiresAt) VALUES (%s, UNIX_TIMESTAMP() + %s) ON DUPLICATE KEY UPDATE leaseExpiresAt = VALUES(leaseExpiresAt)"
+		val = (replicaID, int(leaseInSeconds))
+		self.mycursor.execute(sql, val)
+
+		# Forget replicas, whose lease expired long ago.
+		sql = "DELETE FROM " + CHECKER_REPLICAS_TABLE + " WHERE leaseExpiresAt < UNIX_TIMESTAMP() - %s"
+		val = (int(leaseInSeconds) * 10, )
+		self.mycursor.execute(sql, val)
+		self.mydb.commit()
+
+		query = "SELECT replicaID FROM " + CHECKER_REPLICAS_TABLE + " WHERE leaseExpiresAt >= UNIX_TIMESTAMP() ORDER BY replicaID"
+		self.mycursor.execute(query)
+		return [row[0] for row in self.mycursor.fetchall()]
+
+	# Give up the lease of a checker replica, so that the others take over its tools right away.
+	def releaseCheckerReplicaLease(self, replicaID):
+		sql = "DELETE FROM " + CHECKER_REPLICAS_TABLE + " WHERE replicaID = %s"
+		val = (replicaID, )
+		self.mycursor.execute(sql, val)
+		self.mydb.commit()
+
+
+
+# Create a StateCheckItem from a row selected with STATE_CHECK_COLUMNS.
+def createStateCheckItemFromRow(row):
+	ID, name, description, token, stateCheckFrequency_inMinutes, lastTimeToolWasUp, toolIsDownMessageHasBeenSent = row
+	return StateCheckItem.StateCheckItem(name, token, stateCheckFrequency_inMinutes, description, ID, lastTimeToolWasUp, toolIsDownMessageHasBeenSent)
+
+# Create a BackupCheckItem from a row selected with BACKUP_CHECK_COLUMNS.
+def createBackupCheckItemFromRow(row):
+	ID, name, description, token, stateCheckFrequency_inMinutes, mostRecentBackupFile_creationDate, mostRecentBackupFile_hash, backupIsDownMessageHasBeenSent = row
+	return BackupCheckItem.BackupCheckItem(name, token, stateCheckFrequency_inMinutes, mostRecentBackupFile_creationDate, mostRecentBackupFile_hash, description, ID, backupIsDownMessageHasBeenSent)
+
+
+
+# Use the passed wrapper (e.g. the long-lived one of the check loop) or open an own one for the duration of the with block.
+@contextmanager
+def useOrOpenDatabaseWrapper(dbWrapper=None):
+	if dbWrapper is not None:
+		yield dbWrapper
+	else:
+		with DatabaseWrapper() as ownDbWrapper:
+			yield ownDbWrapper
@@ -6,17 +6,16 @@ from datetime import datetime
 import time
 
 # Get timezone from config.
-import configUtils as ConfigUtils
-configUtils = ConfigUtils.ConfigUtils()
+import configSnapshot as ConfigSnapshot
 
 # Get string like "2022_03_31".
 def getDateStringForLogFileName():
-	now  = datetime.now(configUtils.getTimezone())
+	now  = datetime.now(ConfigSnapshot.getConfig().timezone)
 	return now.strftime("%Y_%m_%d")
 
 # Get string like "[2022-03-31 22:02:04]".
 def getDateStringForLogTag():
-	now  = datetime.now(configUtils.getTimezone())
+	now  = datetime.now(ConfigSnapshot.getConfig().timezone)
 	date_time = now.strftime("%Y-%m-%d %H:%M:%S")
 	currentLogTimeString = "[" + date_time + "]"
 	return currentLogTimeString
@@ -5,13 +5,24 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
-# Get environment variables.
-import configUtils as ConfigUtils
+# Shared SMTP sessions and send metrics.
+import threading
+import time
+
+# Get configuration settings.
+import configSnapshot as ConfigSnapshot
 
 # Definitions.
 from valid_values import VALID_SMTP_PORTS
 
 
+# Check with NOOP, whether an SMTP session idle for longer is still alive, before reusing it.
+SMTP_NOOP_AFTER_IDLE_SECONDS = 30
+# Close SMTP sessions idle for longer instead of reusing them (servers drop idle sessions after a few minutes).
+SMTP_MAX_IDLE_SECONDS = 240
+# Maximum amount of recipients of a single sent message. More recipients get the same rendered message in further batches.
+MAX_RECIPIENTS_PER_MESSAGE = 50
+
 
 class EmailUtils:
 
@@ -22,37 +33,68 @@ class EmailUtils:
         Args:
             useDateString (bool): Whether to use the datestringUtils or not. Prevents an infinite loop from datestringUtils.
         """
-        # Get config.
-        configUtils = ConfigUtils.ConfigUtils()
-
         # Unknown service indicator.
         self._unknownServiceIndicator = "Global"
+
+        # Authenticated SMTP sessions, that are not in use right now, as (server, idle since).
+        self._idle_sessions = []
+        self._sessions_lock = threading.Lock()
+        self._config_lock = threading.Lock()
+
+        # Metrics.
+        self._metrics = {
+            "messages_sent": 0,
+            "recipients_sent": 0,
+            "recipients_refused": 0,
+            "sessions_opened": 0,
+            "sessions_reused": 0,
+            "noops": 0,
+            "reconnects": 0,
+            "send_failures": 0,
+            "sending_seconds": 0.0,
+        }
+
+        # Setup email sender and recipients from current config.
+        self._apply_config(ConfigSnapshot.getConfig())
+
+
+    def _apply_config(self, config):
+        """
+        Setup sender and recipients from a config snapshot and test the sender login.
+
+        Args:
+            config (ConfigSnapshot): The config to apply.
+        """
+        self._config = config
+
+        # Sessions of the previous config might belong to another sender.
+        self._close_idle_sessions()
         
         # Are E-Mail status messages enabled?
-        self._email_enabled = configUtils.areEmailStatusMessagesEnabled()
+        self._email_enabled = config.emailEnabled
  
         # Setup email sender and recipients.
         if self._email_enabled:
             self._sender={}
 
             # Sender User.
-            self._sender["user"] = configUtils.getEmailSenderUser()
+            self._sender["user"] = config.emailSenderUser
 
             # Sender Password.
-            self._sender["password"] = configUtils.getEmailSenderPassword()
+            self._sender["password"] = config.emailSenderPassword
 
             # Sender Host.
-            self._sender["host"] = configUtils.getEmailSenderHost()
+            self._sender["host"] = config.emailSenderHost
 
             # Sender Port.
-            self._sender["port"] = configUtils.getEmailSenderPort()
+            self._sender["port"] = config.emailSenderPort
             if self._sender["port"] not in VALID_SMTP_PORTS:
                 self._email_enabled = False
 
             # Default Recipients.
             self._recipients={}
-            self._recipients["error"] = configUtils.getEmailErrorAdresses()
-            self._recipients["info"] = configUtils.getEmailInfoAdresses()
+            self._recipients["error"] = config.emailErrorAddresses
+            self._recipients["info"] = config.emailInfoAddresses
             
 
         # Test sender login.
@@ -60,68 +102,190 @@ class EmailUtils:
             smpt_login_successful=self._test_smtp_login(self._sender)
             if smpt_login_successful != True:
                 self._email_enabled = False
+
+
+    def _refresh_config(self):
+        """
+        Re-apply the config, if it has been reloaded since it was applied last.
+        """
+        config = ConfigSnapshot.getConfig()
+        if config is not self._config:
+            with self._config_lock:
+                if config is not self._config:
+                    self._apply_config(config)
     
 
     def send_error_mails(self, message):
+        self._refresh_config()
         if self._email_enabled:
-            for error_mail in self._recipients["error"]:
-                self._send_email(self._sender, error_mail, "State Checker Error", message)
+            self.send_mail(self._recipients["error"], "State Checker Error", message)
 
     def send_info_mails(self, message):
+        self._refresh_config()
         if self._email_enabled:
-            for info_mail in self._recipients["info"]:
-                self._send_email(self._sender, info_mail, "State Checker Information", message)
+            self.send_mail(self._recipients["info"], "State Checker Information", message)
 
-    def _test_smtp_login(self, sender):
-        try:
-            if (sender["port"]) not in VALID_SMTP_PORTS: 
-                raise Exception("Port %s not one of %s" % (sender["port"], VALID_SMTP_PORTS))
+    def send_mail(self, recipient_emails, subject, message):
+        """
+        Send an email to one or many recipients, e.g. a delivery of the notification outbox.
 
-            if sender["port"] in (465,):
-                server = smtplib.SMTP_SSL(sender["host"], sender["port"])
-            else:
-                server = smtplib.SMTP(sender["host"], sender["port"])
+        The message is rendered once and sent over a shared, already authenticated SMTP session.
+        With more than one recipient, the recipients are only set as envelope recipients (BCC),
+        in batches of at most MAX_RECIPIENTS_PER_MESSAGE.
 
-            # Optional.
-            server.ehlo()
+        Args:
+            recipient_emails (str or list): Address(es) to send the email to.
+            subject (str): Subject of the email.
+            message (str): Message, may contain html.
 
-            if sender["port"] in (587,): 
-                server.starttls()
-                
-            server.login(sender["user"], sender["password"])
-            server.quit()
+        Raises:
+            Exception: If the email could not be sent, so that it can be retried.
+        """
+        self._refresh_config()
+        if not self._email_enabled:
+            return
+        if isinstance(recipient_emails, str):
+            recipient_emails = [recipient_emails]
+        else:
+            recipient_emails = list(recipient_emails)
+        if not recipient_emails:
+            return
+
+        rendered_message = self._render_email(self._sender, recipient_emails[0] if len(recipient_emails) == 1 else self._sender["user"], subject, message)
+        for batch_start in range(0, len(recipient_emails), MAX_RECIPIENTS_PER_MESSAGE):
+            self._send_rendered_email(self._sender, recipient_emails[batch_start:batch_start + MAX_RECIPIENTS_PER_MESSAGE], rendered_message)
+
+    def get_metrics(self):
+        """
+        Get send metrics, e.g. to compare throughput before and after config changes.
+
+        Returns:
+            (dict): Counts of sent messages, recipients, SMTP sessions and failures, and messages sent per second of sending time.
+        """
+        with self._sessions_lock:
+            metrics = dict(self._metrics)
+            metrics["idle_sessions"] = len(self._idle_sessions)
+        metrics["messages_per_second"] = round(metrics["messages_sent"] / metrics["sending_seconds"], 2) if metrics["sending_seconds"] else 0.0
+        metrics["sending_seconds"] = round(metrics["sending_seconds"], 3)
+        return metrics
+
+    def _test_smtp_login(self, sender):
+        try:
+            # Keep the session of the successful login for the first email.
+            self._release_session(self._open_session(sender))
             return True
         except Exception as e:
             return f"SMTP login failed. Error: <EMPHASIZE_STRING_START_TAG>{e}</EMPHASIZE_STRING_END_TAG>"
 
 
-    def _send_email(self, sender, recipient_email, subject, message):
+    def _open_session(self, sender):
+        """
+        Connect and log in to the SMTP server of the sender.
 
-        # Set up the MIME.
-        msg = MIMEMultipart()
-        msg['From'] = sender["user"]
-        msg['To'] = recipient_email
-        msg['Subject'] = subject
+        Args:
+            sender (dict): Sender user, password, host and port.
 
-        try:
-            if sender["port"] not in VALID_SMTP_PORTS: 
-                raise Exception("Port %s not one of %s" % (sender["port"], VALID_SMTP_PORTS))
+        Returns:
+            (smtplib.SMTP): Authenticated SMTP session.
+        """
+        if sender["port"] not in VALID_SMTP_PORTS: 
+            raise Exception("Port %s not one of %s" % (sender["port"], VALID_SMTP_PORTS))
 
-            if sender["port"] in (465,):
-                server = smtplib.SMTP_SSL(sender["host"], sender["port"])
-            else:
-                server = smtplib.SMTP(sender["host"], sender["port"])
+        if sender["port"] in (465,):
+            server = smtplib.SMTP_SSL(sender["host"], sender["port"])
+        else:
+            server = smtplib.SMTP(sender["host"], sender["port"])
 
+        try:
             # Optional.
             server.ehlo()
 
             if sender["port"] in (587,): 
                 server.starttls()
+                server.ehlo()
 
-        except Exception as e:
-            return e
+            server.login(sender["user"], sender["password"])
+        except Exception:
+            self._close_session(server)
+            raise
+
+        with self._sessions_lock:
+            self._metrics["sessions_opened"] += 1
+        return server
 
-        server.login(sender["user"], sender["password"])
+
+    def _acquire_session(self, sender):
+        """
+        Get an idle SMTP session, that is still alive, or open a new one.
+
+        Args:
+            sender (dict): Sender to open a new session for.
+
+        Returns:
+            (smtplib.SMTP): Authenticated SMTP session, exclusively used by the caller until released.
+        """
+        while True:
+            with self._sessions_lock:
+                if not self._idle_sessions:
+                    break
+                server, idle_since = self._idle_sessions.pop()
+            idle_seconds = time.monotonic() - idle_since
+            if idle_seconds > SMTP_MAX_IDLE_SECONDS:
+                self._close_session(server)
+                continue
+            if idle_seconds > SMTP_NOOP_AFTER_IDLE_SECONDS:
+                with self._sessions_lock:
+                    self._metrics["noops"] += 1
+                try:
+                    if server.noop()[0] != 250:
+                        raise smtplib.SMTPException("NOOP rejected")
+                except Exception:
+                    self._close_session(server)
+                    continue
+            with self._sessions_lock:
+                self._metrics["sessions_reused"] += 1
+            return server
+        return self._open_session(sender)
+
+
+    def _release_session(self, server):
+        with self._sessions_lock:
+            self._idle_sessions.append((server, time.monotonic()))
+
+
+    def _close_idle_sessions(self):
+        with self._sessions_lock:
+            idle_sessions = self._idle_sessions
+            self._idle_sessions = []
+        for server, idle_since in idle_sessions:
+            self._close_session(server)
+
+
+    def _close_session(self, server):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+
+    def _render_email(self, sender, to_header, subject, message):
+        """
+        Render the MIME message once for all recipients.
+
+        Args:
+            sender (dict): Sender of the email.
+            to_header (str): Address shown as recipient.
+            subject (str): Subject of the email.
+            message (str): Message, may contain html.
+
+        Returns:
+            (str): The rendered message.
+        """
+        # Set up the MIME.
+        msg = MIMEMultipart()
+        msg['From'] = sender["user"]
+        msg['To'] = to_header
+        msg['Subject'] = subject
 
         # Make message html.
         message = "<html><body>" + message + "</html></body>"
@@ -135,9 +299,41 @@ class EmailUtils:
 
         # Attach message.
         msg.attach(MIMEText(message, 'html'))
+        return msg.as_string()
+
 
-        # Send the email.
-        server.sendmail(sender["user"], recipient_email, msg.as_string())
+    def _send_rendered_email(self, sender, recipient_emails, rendered_message):
+        """
+        Send a rendered message to a batch of recipients, reconnecting once, if the server closed the session.
 
-        # Close the connection.
-        server.quit()
+        Args:
+            sender (dict): Sender of the email.
+            recipient_emails (list): Envelope recipients.
+            rendered_message (str): Message rendered by _render_email().
+        """
+        send_start = time.monotonic()
+        server = self._acquire_session(sender)
+        try:
+            try:
+                refused_recipients = server.sendmail(sender["user"], recipient_emails, rendered_message)
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                self._close_session(server)
+                with self._sessions_lock:
+                    self._metrics["reconnects"] += 1
+                server = self._open_session(sender)
+                refused_recipients = server.sendmail(sender["user"], recipient_emails, rendered_message)
+        except Exception:
+            self._close_session(server)
+            with self._sessions_lock:
+                self._metrics["send_failures"] += 1
+                self._metrics["sending_seconds"] += time.monotonic() - send_start
+            raise
+        self._release_session(server)
+
+        if refused_recipients:
+            print("emailUtils: Recipients refused by SMTP server: " + ", ".join(refused_recipients))
+        with self._sessions_lock:
+            self._metrics["messages_sent"] += 1
+            self._metrics["recipients_sent"] += len(recipient_emails) - len(refused_recipients)
+            self._metrics["recipients_refused"] += len(refused_recipients)
+            self._metrics["sending_seconds"] += time.monotonic() - send_start
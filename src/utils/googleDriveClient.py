@@ -0,0 +1,107 @@
+### Long-lived Google Drive client of the checker.
+### Credentials, the authorized HTTP connection and the Drive service are created once and reused by every
+### folder check, instead of reading the service account and parsing the discovery document on each run.
+
+## Imports.
+# Thread safe access.
+import threading
+# Interaction with operating system (modification time of the service account file).
+import os
+
+# HTTP connection to Google Drive, kept alive between requests.
+import httplib2
+# For accessing google drive.
+from googleapiclient.discovery import build
+
+## Own classes.
+# Get the service account credentials.
+import configUtils as ConfigUtils
+
+
+class GoogleDriveClient:
+    """
+    Drive v3 service, built once per service account with the discovery document shipped with googleapiclient.
+
+    The access token is only refreshed, when it expired. The service is built again,
+    if the service account file changed (e.g. an updated Docker secret).
+    httplib2 connections are not thread safe, so requests executed on other threads use getThreadHttp().
+    """
+
+    def __init__(self):
+        """
+        Constructor of the client. Nothing is read before the first call of getService().
+        """
+        self._lock = threading.Lock()
+        self._service = None
+        self._credentials = None
+        self._serviceAccountFileVersion = None
+        # Unauthorized connection used to refresh the access token.
+        self._tokenHttp = httplib2.Http()
+        # Authorized connection per thread.
+        self._threadLocal = threading.local()
+
+        # Metrics.
+        self._builds = 0
+        self._tokenRefreshes = 0
+
+
+    def getService(self):
+        """
+        Get the Drive service with a valid access token.
+
+        Returns:
+            (googleapiclient.discovery.Resource): Google Drive v3 service.
+        """
+        with self._lock:
+            configUtils = ConfigUtils.ConfigUtils()
+            serviceAccountFileVersion = _getFileVersion(configUtils.getGoogleDriveServiceAccountJsonFile())
+            if self._service is None or serviceAccountFileVersion != self._serviceAccountFileVersion:
+                self._credentials = configUtils.getGoogleDriveServiceAccountCredentials()
+                self._service = build("drive", "v3", http=self._credentials.authorize(httplib2.Http()), static_discovery=True, cache_discovery=False)
+                self._serviceAccountFileVersion = serviceAccountFileVersion
+                self._builds += 1
+
+            # Refresh before the token expires, instead of sending a request that is answered with 401 first.
+            if not self._credentials.access_token or self._credentials.access_token_expired:
+                self._credentials.get_access_token(self._tokenHttp)
+                self._tokenRefreshes += 1
+            return self._service
+
+
+    def getThreadHttp(self):
+        """
+        Get the authorized connection of the calling thread, kept alive for further requests of the thread.
+
+        Call getService() first, the connection uses the credentials of the current service.
+
+        Returns:
+            (httplib2.Http): Connection to pass to execute() of requests of the service.
+        """
+        credentials = self._credentials
+        if getattr(self._threadLocal, "credentials", None) is not credentials:
+            self._threadLocal.http = credentials.authorize(httplib2.Http())
+            self._threadLocal.credentials = credentials
+        return self._threadLocal.http
+
+
+    def getMetrics(self):
+        """
+        Get client metrics.
+
+        Returns:
+            (dict): Amount of built services and access token refreshes.
+        """
+        with self._lock:
+            return {
+                "builds": self._builds,
+                "tokenRefreshes": self._tokenRefreshes,
+            }
+
+
+# Version of a file as (modification time, size), None if it does not exist.
+def _getFileVersion(filePath):
+    try:
+        fileStat = os.stat(filePath)
+    except OSError:
+        return None
+    return (fileStat.st_mtime_ns, fileStat.st_size)
@@ -0,0 +1,253 @@
+### Tracks the newest file of the Google Drive folders to check, e.g. the latest backup.
+### Only the newest file of a folder is queried (ordered by Google Drive, not listed page by page),
+### and with the changes feed enabled, later runs only fetch the changes since the previous run.
+### Folders are queried concurrently (optionally combined into batch requests), each one failing on its own.
+
+## Imports.
+# Concurrent folder queries.
+from concurrent.futures import ThreadPoolExecutor
+# Result of a folder check.
+from collections import namedtuple
+# Full resync of the changes feed and durations of folder queries.
+import time
+
+
+# Fields of a file, that are needed to create the backup check.
+FILE_FIELDS = "id, name, createdTime, md5Checksum"
+
+# Query all folders again after this time, even if the changes feed is used, in case a change has been missed.
+CHANGES_FEED_RESYNC_AFTER_SECONDS = 24 * 60 * 60
+
+# Amount of changes fetched per request of the changes feed.
+CHANGES_PAGE_SIZE = 1000
+
+# Maximum amount of queries Google Drive accepts in a single batch request.
+MAX_QUERIES_PER_BATCH = 100
+
+
+# Result of checking a single folder. The newest file is None for empty folders or if the query failed (see error).
+# The duration is the one of the latest query of the folder (of its whole batch, if batch requests are used).
+GoogleDriveFolderCheckResult = namedtuple("GoogleDriveFolderCheckResult", ["folderID", "newestFile", "error", "durationInSeconds"])
+
+
+class GoogleDriveFolderTracker:
+    """
+    Newest file per Google Drive folder.
+
+    Without the changes feed, every run asks Google Drive for the newest file of each folder (one query per folder).
+    With the changes feed, the newest file of each folder is only queried on the first run (or after a resync) and kept
+    up to date from the changes of the Drive afterwards. The changes feed belongs to the Drive of the service account,
+    not to a folder, so a single cursor (page token) serves all folders.
+
+    Queries run on a bounded thread pool. A folder, whose query failed, is queried again on the next run,
+    without affecting the other folders.
+    """
+
+    def __init__(self, useChangesFeed=False, workerCount=1, useBatchRequests=False):
+        """
+        Constructor of the tracker.
+
+        Args:
+            useChangesFeed (bool): Fetch only the changes since the previous run instead of querying every folder.
+            workerCount (int): Maximum amount of (batch) requests sent at the same time.
+            useBatchRequests (bool): Combine the queries of up to MAX_QUERIES_PER_BATCH folders into a single request.
+        """
+        self.useChangesFeed = useChangesFeed
+        self.workerCount = workerCount
+        self.useBatchRequests = useBatchRequests
+        self._executor = None
+        self._executorWorkerCount = None
+        self._newestFileByFolderID = {}
+        self._durationByFolderID = {}
+        self._pageToken = None
+        self._resyncedAt = None
+        self._service = None
+
+        # Metrics.
+        self._folderQueries = 0
+        self._failedFolderQueries = 0
+        self._batchRequests = 0
+        self._changesRequests = 0
+        self._appliedChanges = 0
+
+
+    def checkFolders(self, googleDriveClient, folderIDs):
+        """
+        Get the newest file of each folder.
+
+        Args:
+            googleDriveClient (GoogleDriveClient): Client providing the Drive service and a connection per worker thread.
+            folderIDs (list): IDs of the folders to check.
+
+        Returns:
+            (list): One GoogleDriveFolderCheckResult per folder, in the order of the folder IDs.
+        """
+        service = googleDriveClient.getService()
+
+        # The cursor belongs to the drive of the service account, start over with another service.
+        if service is not self._service:
+            self._service = service
+            self._pageToken = None
+
+        # Forget folders, that are not checked anymore.
+        self._newestFileByFolderID = {folderID: newestFile for folderID, newestFile in self._newestFileByFolderID.items() if folderID in folderIDs}
+        self._durationByFolderID = {folderID: duration for folderID, duration in self._durationByFolderID.items() if folderID in folderIDs}
+
+        # Apply the changes since the previous run, start over without changes feed or if a resync is due.
+        if not self.useChangesFeed:
+            self._newestFileByFolderID = {}
+            self._pageToken = None
+        elif self._pageToken is None or time.monotonic() - self._resyncedAt > CHANGES_FEED_RESYNC_AFTER_SECONDS:
+            # Get the cursor first, so that no change made while querying the folders is missed.
+            self._pageToken = service.changes().getStartPageToken().execute()["startPageToken"]
+            self._resyncedAt = time.monotonic()
+            self._newestFileByFolderID = {}
+        else:
+            try:
+                self._applyChanges(service)
+            except Exception as e:
+                # Query all folders instead and start over with a new cursor next run.
+                print("googleDriveFolderTracker: Could not fetch changes, querying all folders: " + str(e))
+                self._pageToken = None
+                self._newestFileByFolderID = {}
+
+        # Query folders, whose newest file is unknown.
+        errorByFolderID = {}
+        foldersToQuery = [folderID for folderID in dict.fromkeys(folderIDs) if folderID not in self._newestFileByFolderID]
+        for folderID, newestFile, error, durationInSeconds in self._queryFolders(googleDriveClient, service, foldersToQuery):
+            self._durationByFolderID[folderID] = durationInSeconds
+            self._folderQueries += 1
+            if error is None:
+                self._newestFileByFolderID[folderID] = newestFile
+            else:
+                errorByFolderID[folderID] = error
+                self._failedFolderQueries += 1
+
+        return [GoogleDriveFolderCheckResult(
+            folderID,
+            self._newestFileByFolderID.get(folderID),
+            errorByFolderID.get(folderID),
+            self._durationByFolderID.get(folderID)
+        ) for folderID in folderIDs]
+
+
+    def getMetrics(self):
+        """
+        Get request metrics.
+
+        Returns:
+            (dict): Queried folders, requests to the changes feed and changes that concerned a tracked folder.
+        """
+        return {
+            "folderQueries": self._folderQueries,
+            "failedFolderQueries": self._failedFolderQueries,
+            "batchRequests": self._batchRequests,
+            "changesRequests": self._changesRequests,
+            "appliedChanges": self._appliedChanges,
+        }
+
+
+    # Query the newest file of the folders on the thread pool, one request per folder or per batch of folders.
+    # Returns a GoogleDriveFolderCheckResult per folder.
+    def _queryFolders(self, googleDriveClient, service, folderIDs):
+        if not folderIDs:
+            return []
+        if self._executor is None or self._executorWorkerCount != self.workerCount:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            self._executor = ThreadPoolExecutor(max_workers=self.workerCount, thread_name_prefix="googleDriveFolder")
+            self._executorWorkerCount = self.workerCount
+
+        if not self.useBatchRequests:
+            return list(self._executor.map(lambda folderID: _queryFolder(googleDriveClient, service, folderID), folderIDs))
+        batches = [folderIDs[batchStart:batchStart + MAX_QUERIES_PER_BATCH] for batchStart in range(0, len(folderIDs), MAX_QUERIES_PER_BATCH)]
+        self._batchRequests += len(batches)
+        return [result for batchResults in self._executor.map(lambda batch: _queryFolderBatch(googleDriveClient, service, batch), batches) for result in batchResults]
+
+
+    # Fetch the changes since the previous run and update the newest files.
+    # Folders, whose newest file has been removed or moved, are queried again afterwards.
+    def _applyChanges(self, service):
+        pageToken = self._pageToken
+        while pageToken is not None:
+            response = service.changes().list(
+                pageToken=pageToken,
+                pageSize=CHANGES_PAGE_SIZE,
+                spaces="drive",
+                fields="nextPageToken, newStartPageToken, changes(fileId, removed, file(" + FILE_FIELDS + ", parents, trashed))").execute()
+            self._changesRequests += 1
+            for change in response.get("changes", []):
+                self._applyChange(change)
+            pageToken = response.get("nextPageToken")
+            if "newStartPageToken" in response:
+                self._pageToken = response["newStartPageToken"]
+
+
+    def _applyChange(self, change):
+        changedFile = change.get("file")
+        fileIsGone = change.get("removed", False) or changedFile is None or changedFile.get("trashed", False)
+        parents = [] if fileIsGone else changedFile.get("parents", [])
+        for folderID, newestFile in list(self._newestFileByFolderID.items()):
+            if folderID in parents:
+                if newestFile is None or newestFile["id"] == changedFile["id"] or changedFile["createdTime"] > newestFile["createdTime"]:
+                    self._newestFileByFolderID[folderID] = {field: changedFile[field] for field in changedFile if field not in ("parents", "trashed")}
+                    self._appliedChanges += 1
+            elif newestFile is not None and newestFile["id"] == change.get("fileId"):
+                # Newest file deleted, trashed or moved away.
+                del self._newestFileByFolderID[folderID]
+                self._appliedChanges += 1
+
+
+# Request for the newest file of a folder (ordered by creation date, newest first).
+def _getNewestFileRequest(service, folderID):
+    return service.files().list(
+        q="'" + folderID + "' in parents and trashed = false",
+        orderBy="createdTime desc",
+        pageSize=1,
+        fields="files(" + FILE_FIELDS + ")")
+
+
+# Newest file of a response to _getNewestFileRequest() or None, if the folder is empty.
+def _getNewestFileOfResponse(response):
+    files = response.get("files", [])
+    return files[0] if files else None
+
+
+# Query a single folder on the connection of the current thread (connections must not be shared between threads).
+def _queryFolder(googleDriveClient, service, folderID):
+    queryStart = time.monotonic()
+    try:
+        response = _getNewestFileRequest(service, folderID).execute(http=googleDriveClient.getThreadHttp())
+        return GoogleDriveFolderCheckResult(folderID, _getNewestFileOfResponse(response), None, time.monotonic() - queryStart)
+    except Exception as e:
+        return GoogleDriveFolderCheckResult(folderID, None, e, time.monotonic() - queryStart)
+
+
+# Query many folders with a single batch request. A failed query only fails its own folder.
+def _queryFolderBatch(googleDriveClient, service, folderIDs):
+    responseByFolderID = {}
+    errorByFolderID = {}
+
+    def onResponse(folderID, response, error):
+        if error is None:
+            responseByFolderID[folderID] = response
+        else:
+            errorByFolderID[folderID] = error
+
+    queryStart = time.monotonic()
+    try:
+        batch = service.new_batch_http_request(callback=onResponse)
+        for folderID in folderIDs:
+            batch.add(_getNewestFileRequest(service, folderID), request_id=folderID)
+        batch.execute(http=googleDriveClient.getThreadHttp())
+    except Exception as e:
+        errorByFolderID = {folderID: e for folderID in folderIDs}
+    durationInSeconds = time.monotonic() - queryStart
+
+    results = []
+    for folderID in folderIDs:
+        if folderID in responseByFolderID:
+            results.append(GoogleDriveFolderCheckResult(folderID, _getNewestFileOfResponse(responseByFolderID[folderID]), None, durationInSeconds))
+        else:
+            results.append(GoogleDriveFolderCheckResult(folderID, None, errorByFolderID.get(folderID, Exception("No response in batch")), durationInSeconds))
+    return results
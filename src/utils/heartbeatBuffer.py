@@ -0,0 +1,159 @@
+### Write-behind buffer for heartbeats received by the api.
+### Keeps the latest heartbeat per tool in memory and writes all of them to the DB at once in a fixed interval.
+
+## Imports.
+# Background flushing.
+import threading
+# Timestamps and flush latency.
+import time
+
+## Own classes.
+# Database connection.
+import databaseWrapper as DatabaseWrapper
+# Logger.
+import logger as Logger
+
+
+class HeartbeatBuffer:
+    """
+    Coalescing buffer for heartbeats of tools, whose token has already been validated by the tool registry.
+
+    Heartbeats of known tools are acknowledged immediately and only the latest heartbeat per tool
+    is kept. A background thread flushes the pending heartbeats with one bulk statement per interval.
+    Heartbeats of unknown tools have to be written directly, as they may create a new state check.
+    """
+
+    def __init__(self, flushIntervalInMilliseconds):
+        """
+        Constructor of the heartbeat buffer.
+
+        Args:
+            flushIntervalInMilliseconds (int): Interval in which pending heartbeats are written to the database.
+        """
+        self._flushIntervalInSeconds = flushIntervalInMilliseconds / 1000
+        self._lock = threading.Lock()
+        self._flushLock = threading.Lock()
+        self._stopEvent = threading.Event()
+        self._flushThread = None
+
+        # Latest heartbeat per tool name as (stateCheckItem, lastTimeToolWasUp).
+        self._pendingHeartbeats = {}
+
+        # Metrics.
+        self._bufferedHeartbeats = 0
+        self._coalescedHeartbeats = 0
+        self._flushes = 0
+        self._flushedHeartbeats = 0
+        self._flushErrors = 0
+        self._lastFlushLatencyInSeconds = 0.0
+        self._maxFlushLatencyInSeconds = 0.0
+        self._totalFlushLatencyInSeconds = 0.0
+
+
+    def start(self):
+        """
+        Start flushing pending heartbeats in the background.
+        """
+        self._stopEvent.clear()
+        self._flushThread = threading.Thread(target=self._flushPeriodically, name="heartbeatBuffer", daemon=True)
+        self._flushThread.start()
+
+
+    def stop(self):
+        """
+        Stop the background thread and write all pending heartbeats.
+        """
+        self._stopEvent.set()
+        if self._flushThread is not None:
+            self._flushThread.join()
+            self._flushThread = None
+        self.flush()
+
+
+    def add(self, stateCheckItem):
+        """
+        Buffer the heartbeat of a tool, whose token has been confirmed by the tool registry.
+
+        The flush only updates tools whose name and token still match, so a stale confirmation never creates or overwrites a tool.
+
+        Args:
+            stateCheckItem (StateCheckItem): Heartbeat received by the api.
+        """
+        with self._lock:
+            if stateCheckItem.name in self._pendingHeartbeats:
+                self._coalescedHeartbeats += 1
+            self._pendingHeartbeats[stateCheckItem.name] = (stateCheckItem, int(time.time()))
+            self._bufferedHeartbeats += 1
+
+
+    def forgetTool(self, name):
+        """
+        Drop the pending heartbeat of a tool, e.g. when its state check is stopped.
+
+        Args:
+            name (str): Name of the tool.
+        """
+        with self._lock:
+            self._pendingHeartbeats.pop(name, None)
+
+
+    def flush(self):
+        """
+        Write all pending heartbeats to the database.
+
+        Heartbeats that could not be written are kept, unless a newer heartbeat of the same tool arrived meanwhile.
+        """
+        with self._flushLock:
+            with self._lock:
+                pendingHeartbeats = self._pendingHeartbeats
+                self._pendingHeartbeats = {}
+            if not pendingHeartbeats:
+                return
+
+            flushStart = time.monotonic()
+            try:
+                with DatabaseWrapper.DatabaseWrapper() as dbWrapper:
+                    dbWrapper.updateLastTimeToolsWereUp(list(pendingHeartbeats.values()))
+            except Exception as e:
+                with self._lock:
+                    self._flushErrors += 1
+                    for name, heartbeat in pendingHeartbeats.items():
+                        self._pendingHeartbeats.setdefault(name, heartbeat)
+                logger = Logger.Logger("api")
+                logger.logError(f"heartbeatBuffer.flush(). Error trying to write {len(pendingHeartbeats)} buffered heartbeats: {e}")
+                return
+            flushLatency = time.monotonic() - flushStart
+
+            with self._lock:
+                self._flushes += 1
+                self._flushedHeartbeats += len(pendingHeartbeats)
+                self._lastFlushLatencyInSeconds = flushLatency
+                self._maxFlushLatencyInSeconds = max(self._maxFlushLatencyInSeconds, flushLatency)
+                self._totalFlushLatencyInSeconds += flushLatency
+
+
+    def getMetrics(self):
+        """
+        Get usage metrics of the buffer.
+
+        Returns:
+            (dict): Buffer depth, heartbeat counts and flush latencies.
+        """
+        with self._lock:
+            return {
+                "flushInterval_inMilliseconds": round(self._flushIntervalInSeconds * 1000),
+                "bufferDepth": len(self._pendingHeartbeats),
+                "bufferedHeartbeats": self._bufferedHeartbeats,
+                "coalescedHeartbeats": self._coalescedHeartbeats,
+                "flushes": self._flushes,
+                "flushedHeartbeats": self._flushedHeartbeats,
+                "flushErrors": self._flushErrors,
+                "lastFlushLatency_inMilliseconds": round(self._lastFlushLatencyInSeconds * 1000, 3),
+                "maxFlushLatency_inMilliseconds": round(self._maxFlushLatencyInSeconds * 1000, 3),
+                "averageFlushLatency_inMilliseconds": round(self._totalFlushLatencyInSeconds * 1000 / self._flushes, 3) if self._flushes else 0.0,
+            }
+
+
+    def _flushPeriodically(self):
+        while not self._stopEvent.wait(self._flushIntervalInSeconds):
+            self.flush()
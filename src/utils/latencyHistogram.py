@@ -0,0 +1,120 @@
+### Rolling latency histograms, e.g. of the websites to check.
+### Keeps the latest samples per name in memory to report percentiles and bucket counts.
+
+## Imports.
+# Rolling window of samples.
+from collections import deque
+# Nearest rank of percentiles.
+import math
+# Thread safe access.
+import threading
+
+
+# Upper bounds of the histogram buckets in milliseconds. Slower samples are counted in a last, open bucket.
+BUCKET_BOUNDS_IN_MILLISECONDS = (50, 100, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000, 10000)
+
+# Amount of latest samples kept per histogram.
+DEFAULT_WINDOW_SIZE = 100
+
+
+class LatencyHistogram:
+    """
+    Histogram over the latest latency samples.
+    """
+
+    def __init__(self, windowSize=DEFAULT_WINDOW_SIZE):
+        """
+        Constructor of the latency histogram.
+
+        Args:
+            windowSize (int): Amount of latest samples to keep. Older samples are dropped.
+        """
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=windowSize)
+        self._bucketCounts = [0] * (len(BUCKET_BOUNDS_IN_MILLISECONDS) + 1)
+
+
+    def add(self, latencyInMilliseconds):
+        """
+        Add a sample, dropping the oldest one if the window is full.
+
+        Args:
+            latencyInMilliseconds (float): Observed latency.
+        """
+        with self._lock:
+            if len(self._samples) == self._samples.maxlen:
+                self._bucketCounts[_getBucketIndex(self._samples[0])] -= 1
+            self._samples.append(latencyInMilliseconds)
+            self._bucketCounts[_getBucketIndex(latencyInMilliseconds)] += 1
+
+
+    def getPercentile(self, percentile):
+        """
+        Get a percentile of the samples in the window (nearest rank).
+
+        Args:
+            percentile (float): Percentile between 0 and 100, e.g. 95.
+
+        Returns:
+            (float): Latency in milliseconds or None, if there are no samples yet.
+        """
+        with self._lock:
+            if not self._samples:
+                return None
+            sortedSamples = sorted(self._samples)
+        rank = math.ceil(percentile / 100 * len(sortedSamples))
+        return sortedSamples[min(max(rank, 1), len(sortedSamples)) - 1]
+
+
+    def getBucketCounts(self):
+        """
+        Get the amount of samples per bucket.
+
+        Returns:
+            (list): (upper bound in milliseconds or None for the open bucket, count) per bucket.
+        """
+        with self._lock:
+            return list(zip(BUCKET_BOUNDS_IN_MILLISECONDS + (None,), self._bucketCounts))
+
+
+    def getSampleCount(self):
+        """
+        Get the amount of samples in the window.
+
+        Returns:
+            (int): Amount of samples.
+        """
+        with self._lock:
+            return len(self._samples)
+
+
+
+# Histograms of this process by name.
+_latencyHistograms = {}
+_latencyHistogramsLock = threading.Lock()
+
+
+def getLatencyHistogram(name):
+    """
+    Get the histogram of a name (e.g. the url of a website), created on first use.
+
+    Args:
+        name (str): Name of the histogram.
+
+    Returns:
+        (LatencyHistogram): The histogram.
+    """
+    with _latencyHistogramsLock:
+        latencyHistogram = _latencyHistograms.get(name)
+        if latencyHistogram is None:
+            latencyHistogram = LatencyHistogram()
+            _latencyHistograms[name] = latencyHistogram
+        return latencyHistogram
+
+
+# Index of the bucket a sample is counted in.
+def _getBucketIndex(latencyInMilliseconds):
+    for index, bound in enumerate(BUCKET_BOUNDS_IN_MILLISECONDS):
+        if latencyInMilliseconds <= bound:
+            return index
+    return len(BUCKET_BOUNDS_IN_MILLISECONDS)
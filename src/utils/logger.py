@@ -21,6 +21,10 @@ class Logger:
 			self.logtext_info = "TOOLCHECKER_INFO"
 			self.logtext_warning = "TOOLCHECKER_WARNING"
 			self.logtext_error = "TOOLCHECKER_ERROR"
+		elif logScope == "api":
+			self.logtext_info = "API_INFO"
+			self.logtext_warning = "API_WARNING"
+			self.logtext_error = "API_ERROR"
 		else:
 			self.logtext_info = "UNKNOWN_INFO"
 			self.logtext_warning = "UNKNOWN_WARNING"
@@ -0,0 +1,121 @@
+### Coalesces state changes of tools into digest notifications.
+### During an incident many tools change their state at once. Instead of one message per tool,
+### all changes within a window are collected and sent as a single digest.
+
+## Imports.
+# Window timing.
+import time
+
+
+class NotificationCoalescer:
+    """
+    Collects state changes per topic (e.g. "website:https://example.com") until their window is over.
+
+    The window starts with the first collected change. A topic, that changes again within the window,
+    only keeps its latest state change. A topic, that is back in its reported state (e.g. a tool up again
+    within the window), has to be discarded, so that neither the flap nor its recovery is sent.
+    """
+
+    def __init__(self, getWindowInSeconds):
+        """
+        Constructor of the coalescer.
+
+        Args:
+            getWindowInSeconds (callable): Returns how long to collect changes, read again for every window. Zero collects
+                only the changes of a single check, which are flushed right after the check.
+        """
+        self._getWindowInSeconds = getWindowInSeconds
+        self._pendingByTopic = {}
+        self._windowStartedAt = None
+
+        # Metrics.
+        self._collectedChanges = 0
+        self._discardedChanges = 0
+        self._sentDigests = 0
+        self._sentChanges = 0
+
+
+    def add(self, topic, toolStateItem):
+        """
+        Collect the state change of a tool.
+
+        Args:
+            topic (str): Topic of the tool.
+            toolStateItem (ToolStateItem): Tool, whose state changed.
+        """
+        if self._windowStartedAt is None:
+            self._windowStartedAt = time.monotonic()
+        previousToolStateItem = self._pendingByTopic.get(topic)
+        if previousToolStateItem is None or previousToolStateItem.toolIsUp != toolStateItem.toolIsUp:
+            self._collectedChanges += 1
+        self._pendingByTopic[topic] = toolStateItem
+
+
+    def discard(self, topic):
+        """
+        Drop the collected change of a topic, e.g. because its tool is back in the reported state.
+
+        Args:
+            topic (str): Topic of the tool. Topics without a collected change are ignored.
+        """
+        if self._pendingByTopic.pop(topic, None) is None:
+            return
+        self._discardedChanges += 1
+        if not self._pendingByTopic:
+            self._windowStartedAt = None
+
+
+    def getTopics(self):
+        """
+        Get the topics with a collected change.
+
+        Returns:
+            (list): Topics, whose changes have not been sent yet.
+        """
+        return list(self._pendingByTopic)
+
+
+    def getSecondsUntilDue(self):
+        """
+        Get the time until the current window is over.
+
+        Returns:
+            (float): Seconds until the collected changes are due (zero, if they are due already) or None, if nothing is collected.
+        """
+        if self._windowStartedAt is None:
+            return None
+        return max(self._windowStartedAt + self._getWindowInSeconds() - time.monotonic(), 0.0)
+
+
+    def popDue(self):
+        """
+        Remove and return the collected changes, if their window is over.
+
+        Returns:
+            (dict): ToolStateItem per topic, empty if nothing is due.
+        """
+        secondsUntilDue = self.getSecondsUntilDue()
+        if secondsUntilDue is None or secondsUntilDue > 0:
+            return {}
+        dueByTopic = self._pendingByTopic
+        self._pendingByTopic = {}
+        self._windowStartedAt = None
+        self._sentDigests += 1
+        self._sentChanges += len(dueByTopic)
+        return dueByTopic
+
+
+    def getMetrics(self):
+        """
+        Get coalescing metrics.
+
+        Returns:
+            (dict): Collected, discarded and pending changes, sent digests and the changes they contained.
+        """
+        return {
+            "collectedChanges": self._collectedChanges,
+            "discardedChanges": self._discardedChanges,
+            "pendingChanges": len(self._pendingByTopic),
+            "sentDigests": self._sentDigests,
+            "sentChanges": self._sentChanges,
+        }
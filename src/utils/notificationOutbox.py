@@ -0,0 +1,353 @@
+### Durable outbox for telegram and email notifications.
+### The check loop only appends notifications to a local journal file. Worker threads deliver them
+### with retries and exponential backoff, so slow or failing delivery never delays the checks.
+
+## Imports.
+# Journal entries.
+import json
+# Interaction with operating system (journal file).
+import os
+# Retry queue ordered by next attempt.
+import heapq
+# Worker threads.
+import threading
+# Backoff and timestamps.
+import time
+# Unique delivery ids.
+import itertools
+
+
+# Location of the journal (append-only, one json object per line).
+OUTBOX_FILE_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "outbox", "notifications.jsonl")
+
+# Backoff before the second attempt of a delivery, doubled for every further attempt.
+INITIAL_BACKOFF_IN_SECONDS = 5
+# Longest backoff between two attempts.
+MAX_BACKOFF_IN_SECONDS = 600
+
+# Rewrite the journal with only the pending deliveries, once it holds this many finished lines.
+COMPACT_AFTER_FINISHED_LINES = 1000
+
+
+class RetryAfter(Exception):
+    """
+    Raised by a sender, that cannot deliver right now (e.g. rate limited), to postpone a delivery without counting an attempt.
+    """
+
+    def __init__(self, seconds):
+        """
+        Constructor of the exception.
+
+        Args:
+            seconds (float): Delay after which the delivery is attempted again.
+        """
+        super().__init__("Retry after " + str(round(seconds, 3)) + " seconds")
+        self.seconds = seconds
+
+
+class PartiallyDelivered(Exception):
+    """
+    Raised by a sender, that delivered the first parts of a notification split into several messages, before it failed.
+    The delivery is resumed with the first missing part instead of sending the delivered parts again.
+    """
+
+    def __init__(self, deliveredParts, cause):
+        """
+        Constructor of the exception.
+
+        Args:
+            deliveredParts (int): Amount of parts delivered so far.
+            cause (Exception): Why the next part could not be delivered, RetryAfter postpones the delivery.
+        """
+        super().__init__(str(deliveredParts) + " parts delivered, then: " + str(cause))
+        self.deliveredParts = deliveredParts
+        self.cause = cause
+
+
+class NotificationOutbox:
+    """
+    Queue of notification deliveries, persisted in an append-only journal and drained by worker threads.
+
+    A notification is enqueued with an idempotency key and expanded into one delivery per channel and recipient,
+    so that a retry never resends to recipients that already got the notification. Enqueueing a key, that is still
+    pending, or repeating the last keys of all its topics (e.g. "tool X is down" twice in a row) is ignored.
+    The key of a topic is only kept, until the caller stored that the notification has been sent (see forgetTopics()),
+    so that the same state can be reported again after it has changed in between.
+    Pending deliveries survive restarts and are resumed from the journal.
+    """
+
+    def __init__(self, senders, workerCount, maxAttempts, path=OUTBOX_FILE_PATH):
+        """
+        Constructor of the outbox. Resumes pending deliveries of the journal and starts the workers.
+
+        Args:
+            senders (dict): Callable (recipient, subject, text, deliveredParts) per channel name. Must raise, if delivery failed,
+                or raise RetryAfter to postpone the delivery. Senders splitting a notification into several messages
+                raise PartiallyDelivered and skip the deliveredParts of the notification on the next attempt.
+            workerCount (int): Amount of worker threads delivering notifications.
+            maxAttempts (int): Attempts per delivery before it is given up.
+            path (str): Location of the journal.
+        """
+        self._senders = senders
+        self._maxAttempts = maxAttempts
+        self._path = path
+
+        self._condition = threading.Condition()
+        self._pending = {}
+        self._lastKeyByTopic = {}
+        self._retryQueue = []
+        self._sequence = itertools.count()
+        self._finishedLines = 0
+        self._stopped = False
+
+        # Metrics.
+        self._enqueued = 0
+        self._deduplicated = 0
+        self._delivered = 0
+        self._retried = 0
+        self._deferred = 0
+        self._failed = 0
+
+        # Resume from journal.
+        self._replayJournal()
+        self._compactJournal()
+        for delivery in self._pending.values():
+            heapq.heappush(self._retryQueue, (delivery["nextAttemptAt"], next(self._sequence), delivery["id"]))
+
+        self._workers = [threading.Thread(target=self._work, name="notificationOutbox" + str(index), daemon=True) for index in range(workerCount)]
+        for worker in self._workers:
+            worker.start()
+
+
+    def enqueue(self, idempotencyKey, deliveries, topicKeys=None):
+        """
+        Persist a notification and hand it to the workers.
+
+        Args:
+            idempotencyKey (str): Identifies the notification, e.g. "down:website:https://example.com".
+            deliveries (list): (channel, recipient, subject, text) per recipient.
+            topicKeys (dict): Optional key of the notification per topic it reports on, e.g. {"website:https://example.com": "down"}.
+                If set, the notification is only ignored, if it repeats the last key of every topic,
+                instead of repeating the key of a pending notification.
+
+        Returns:
+            (bool): True, if the notification has been enqueued. False, if it is a duplicate.
+        """
+        with self._condition:
+            if topicKeys:
+                isDuplicate = all(self._lastKeyByTopic.get(topic) == key for topic, key in topicKeys.items())
+            else:
+                isDuplicate = any(delivery["key"] == idempotencyKey for delivery in self._pending.values())
+            if isDuplicate:
+                self._deduplicated += 1
+                return False
+
+            now = time.time()
+            entries = []
+            for topic, key in (topicKeys or {}).items():
+                self._lastKeyByTopic[topic] = key
+                entries.append({"op": "topic", "topic": topic, "key": key})
+            for channel, recipient, subject, text in deliveries:
+                delivery = {
+                    "id": idempotencyKey + "|" + channel + "|" + str(recipient) + "|" + str(now),
+                    "key": idempotencyKey,
+                    "channel": channel,
+                    "recipient": recipient,
+                    "subject": subject,
+                    "text": text,
+                    "attempts": 0,
+                    "deliveredParts": 0,
+                    "nextAttemptAt": now,
+                }
+                entries.append(dict(delivery, op="enqueue"))
+                self._pending[delivery["id"]] = delivery
+                heapq.heappush(self._retryQueue, (now, next(self._sequence), delivery["id"]))
+            self._appendToJournal(entries, sync=True)
+            self._enqueued += 1
+            self._condition.notify_all()
+            return True
+
+
+    def getTopics(self):
+        """
+        Get the topics, whose last key is kept.
+
+        Returns:
+            (list): Topics of notifications, that have not been stored as sent by the caller yet.
+        """
+        with self._condition:
+            return list(self._lastKeyByTopic)
+
+
+    def forgetTopics(self, topics):
+        """
+        Forget the last keys of topics, e.g. once the state of their tools has been stored as sent.
+
+        Args:
+            topics (iterable): Topics to forget. Unknown topics are ignored.
+        """
+        with self._condition:
+            entries = [{"op": "forget", "topic": topic} for topic in topics if self._lastKeyByTopic.pop(topic, None) is not None]
+            if entries:
+                self._appendToJournal(entries, sync=True)
+
+
+    def close(self):
+        """
+        Stop the workers after their current delivery. Pending deliveries stay in the journal.
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+
+    def getMetrics(self):
+        """
+        Get delivery metrics of the outbox.
+
+        Returns:
+            (dict): Pending deliveries and counts of enqueued, deduplicated, delivered, retried, deferred and failed notifications.
+        """
+        with self._condition:
+            return {
+                "pendingDeliveries": len(self._pending),
+                "enqueuedNotifications": self._enqueued,
+                "deduplicatedNotifications": self._deduplicated,
+                "deliveredDeliveries": self._delivered,
+                "retriedDeliveries": self._retried,
+                "deferredDeliveries": self._deferred,
+                "failedDeliveries": self._failed,
+            }
+
+
+    def _work(self):
+        while True:
+            delivery = self._takeDueDelivery()
+            if delivery is None:
+                return
+            try:
+                self._senders[delivery["channel"]](delivery["recipient"], delivery["subject"], delivery["text"], delivery.get("deliveredParts", 0))
+                self._finishDelivery(delivery, {"op": "done", "id": delivery["id"]})
+            except Exception as e:
+                if isinstance(e, PartiallyDelivered):
+                    self._recordDeliveredParts(delivery, e.deliveredParts)
+                    e = e.cause
+                if isinstance(e, RetryAfter):
+                    self._deferDelivery(delivery, e.seconds)
+                else:
+                    self._retryDelivery(delivery, e)
+
+
+    # Wait until a delivery is due and take it. Returns None, once the outbox is closed.
+    def _takeDueDelivery(self):
+        with self._condition:
+            while not self._stopped:
+                while self._retryQueue and self._retryQueue[0][2] not in self._pending:
+                    heapq.heappop(self._retryQueue)
+                if self._retryQueue:
+                    secondsUntilDue = self._retryQueue[0][0] - time.time()
+                    if secondsUntilDue <= 0:
+                        deliveryId = heapq.heappop(self._retryQueue)[2]
+                        return self._pending[deliveryId]
+                    self._condition.wait(secondsUntilDue)
+                else:
+                    self._condition.wait()
+            return None
+
+
+    def _retryDelivery(self, delivery, exception):
+        with self._condition:
+            delivery["attempts"] += 1
+            if delivery["attempts"] >= self._maxAttempts:
+                print("notificationOutbox: Giving up " + delivery["channel"] + " delivery to " + str(delivery["recipient"]) + " after " + str(delivery["attempts"]) + " attempts: " + str(exception))
+                self._failed += 1
+                self._finishDelivery(delivery, {"op": "failed", "id": delivery["id"], "error": str(exception)})
+                return
+            self._retried += 1
+            self._scheduleDelivery(delivery, min(INITIAL_BACKOFF_IN_SECONDS * 2 ** (delivery["attempts"] - 1), MAX_BACKOFF_IN_SECONDS))
+
+
+    # Journal the parts delivered so far, so that they are not sent again, not even after a restart.
+    def _recordDeliveredParts(self, delivery, deliveredParts):
+        with self._condition:
+            if delivery["id"] not in self._pending or delivery.get("deliveredParts", 0) == deliveredParts:
+                return
+            delivery["deliveredParts"] = deliveredParts
+            self._appendToJournal([{"op": "progress", "id": delivery["id"], "deliveredParts": deliveredParts}], sync=True)
+
+
+    # Postponed deliveries are not journaled, after a restart they are simply attempted right away.
+    def _deferDelivery(self, delivery, delayInSeconds):
+        with self._condition:
+            self._deferred += 1
+            self._scheduleDelivery(delivery, delayInSeconds, journal=False)
+
+
+    def _scheduleDelivery(self, delivery, delayInSeconds, journal=True):
+        with self._condition:
+            delivery["nextAttemptAt"] = time.time() + delayInSeconds
+            if journal:
+                self._appendToJournal([{"op": "retry", "id": delivery["id"], "attempts": delivery["attempts"], "nextAttemptAt": delivery["nextAttemptAt"]}])
+            heapq.heappush(self._retryQueue, (delivery["nextAttemptAt"], next(self._sequence), delivery["id"]))
+            self._condition.notify_all()
+
+
+    def _finishDelivery(self, delivery, entry):
+        with self._condition:
+            if self._pending.pop(delivery["id"], None) is None:
+                return
+            if entry["op"] == "done":
+                self._delivered += 1
+            self._appendToJournal([entry])
+            self._finishedLines += 1
+            if self._finishedLines >= COMPACT_AFTER_FINISHED_LINES:
+                self._compactJournal()
+
+
+    def _appendToJournal(self, entries, sync=False):
+        with open(self._path, "a") as journal:
+            for entry in entries:
+                journal.write(json.dumps(entry) + "\n")
+            if sync:
+                journal.flush()
+                os.fsync(journal.fileno())
+
+
+    def _replayJournal(self):
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        if not os.path.exists(self._path):
+            return
+        with open(self._path) as journal:
+            for line in journal:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Line cut off by a crash while writing.
+                    continue
+                op = entry.pop("op", None)
+                if op == "enqueue":
+                    self._pending[entry["id"]] = entry
+                elif op == "topic":
+                    self._lastKeyByTopic[entry["topic"]] = entry["key"]
+                elif op == "forget":
+                    self._lastKeyByTopic.pop(entry["topic"], None)
+                elif op == "progress" and entry["id"] in self._pending:
+                    self._pending[entry["id"]]["deliveredParts"] = entry["deliveredParts"]
+                elif op == "retry" and entry["id"] in self._pending:
+                    self._pending[entry["id"]].update(attempts=entry["attempts"], nextAttemptAt=entry["nextAttemptAt"])
+                elif op in ("done", "failed"):
+                    self._pending.pop(entry["id"], None)
+
+
+    # Rewrite the journal with the topics and pending deliveries only.
+    def _compactJournal(self):
+        compactedPath = self._path + ".compacting"
+        with open(compactedPath, "w") as journal:
+            for topic, key in self._lastKeyByTopic.items():
+                journal.write(json.dumps({"op": "topic", "topic": topic, "key": key}) + "\n")
+            for delivery in self._pending.values():
+                journal.write(json.dumps(dict(delivery, op="enqueue")) + "\n")
+            journal.flush()
+            os.fsync(journal.fileno())
+        os.replace(compactedPath, self._path)
+        self._finishedLines = 0
@@ -0,0 +1,45 @@
+## Cache for the content of secret files (e.g. Docker secrets).
+## Each file is read once and only read again, when its modification time or size changed.
+
+# Interaction with operating system (read files, modification times).
+import os
+
+# Thread safe access to the cache.
+import threading
+
+
+# Cached secrets as path -> (mtime, size, content).
+_cachedSecrets = {}
+_cachedSecretsLock = threading.Lock()
+
+
+def readSecretFile(secretFilePath):
+    """
+    Get the stripped content of a secret file.
+
+    Only costs a stat call, if the file did not change since it was read last.
+
+    Args:
+        secretFilePath (str): Path to the secret file.
+
+    Returns:
+        (str): Content of the secret file without surrounding whitespace.
+
+    Raises:
+        OSError: If the path is not set or the file cannot be read.
+    """
+    if not secretFilePath:
+        raise FileNotFoundError("secretCache: No secret file path set")
+
+    fileStat = os.stat(secretFilePath)
+    fileVersion = (fileStat.st_mtime_ns, fileStat.st_size)
+    with _cachedSecretsLock:
+        cachedSecret = _cachedSecrets.get(secretFilePath)
+        if cachedSecret is not None and cachedSecret[0] == fileVersion:
+            return cachedSecret[1]
+
+    with open(secretFilePath, "r") as secretFile:
+        secret = secretFile.read().strip()
+    with _cachedSecretsLock:
+        _cachedSecrets[secretFilePath] = (fileVersion, secret)
+    return secret
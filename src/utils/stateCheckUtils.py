@@ -1,13 +1,9 @@
 ## Utilities to get states of tools, that are being checked.
 
-# For accessing google drive.
 from __future__ import print_function
-from googleapiclient.discovery import build
 
 # For getting current timestamp.
 import time
-# For making POST / GET requests.
-import requests
 # For file operations with operating system.
 import os
 # For creating files.
@@ -25,74 +21,122 @@ import toolStateItem as ToolStateItem
 import backupCheckItem as BackupCheckItem
 # Website State and Message sent state.
 import websiteStateAndMessageSentItem as WebsiteStateAndMessageSentItem
+# Concurrent website probes.
+import websiteProber as WebsiteProber
+# Response time percentiles of websites.
+import latencyHistogram as LatencyHistogram
+# Newest files of Google Drive folders.
+import googleDriveFolderTracker as GoogleDriveFolderTracker
+# Long-lived Google Drive service.
+import googleDriveClient as GoogleDriveClient
 # Logger.
 import logger as Logger
 # Get configuration settings.
-import configUtils as ConfigUtils
-configUtils = ConfigUtils.ConfigUtils()
+import configSnapshot as ConfigSnapshot
 
 # Path to messageSentStates of custom checks.
 messageSentStatesDirectory = os.path.join(os.path.dirname(__file__), "..", "..", "messageSentStates/")
 
+# Newest file per Google Drive folder, kept between runs for the changes feed.
+googleDriveFolderTracker = GoogleDriveFolderTracker.GoogleDriveFolderTracker()
+# Google Drive service, reused by all runs.
+googleDriveClient = GoogleDriveClient.GoogleDriveClient()
+# Duration of the latest Google Drive query per backup name, added to the states of the backups.
+googleDriveFolderCheckDurations = {}
+
+# All functions reading or writing the DB accept an optional dbWrapper to reuse (e.g. the long-lived one of check_tools.py).
+# Without it, they check out their own connection for the duration of the call.
+
+# Shards of the checker (see checkerShards.py), set by check_tools.py in sharded mode.
+# The functions getting states then only return the tools, backups and websites of this replica.
+checkerShards = None
+
+
+# Is this replica responsible for a tool ("tool:name"), backup ("backup:name") or website ("website:url")?
+def isCheckedByThisReplica(key):
+    return checkerShards is None or checkerShards.owns(key)
+
 
 # Get states of tools that are being checked by sending their own alive message to api.
+# Pass onlyStateChanges=True to let the DB return only tools whose state disagrees with their message sent flag
+# (requires the nextDueAt column, see DatabaseWrapper.ensureNextDueAtColumn()).
 # Returns Array of ToolStateItems. See models for further information.
-def getToolStates_api():
+def getToolStates_api(onlyStateChanges=False, dbWrapper=None):
     # Array of ToolStateItems.
     toolStateItems = []
 
-    # Database connection.
-    dbWrapper = DatabaseWrapper.DatabaseWrapper()
-
     # Did all tools send a state info within desired timespan?
     now = int(time.time())
-    allToolsToCheck = dbWrapper.getAllToolsToCheck()
-    if allToolsToCheck:
-        for toolToCheck in allToolsToCheck:
+    tolerancePeriodInSeconds = ConfigSnapshot.getConfig().tolerancePeriodInSeconds
+    with DatabaseWrapper.useOrOpenDatabaseWrapper(dbWrapper) as dbWrapper:
+        if onlyStateChanges:
+            toolsToCheck = dbWrapper.getToolsWithChangedState(now - tolerancePeriodInSeconds)
+        else:
+            toolsToCheck = dbWrapper.iterateAllToolsToCheck()
+        for toolToCheck in toolsToCheck:
+            if isCheckedByThisReplica("tool:" + str(toolToCheck.name)):
+                toolStateItems.append(getToolState_api(toolToCheck, now, tolerancePeriodInSeconds))
 
-            # Has the state info been sent within the desired amount of time?
-            if int(toolToCheck.lastTimeToolWasUp) + int(toolToCheck.stateCheckFrequency_inMinutes) * 60 + configUtils.getTolerencePeriodInSeconds() < now:
+    # Return states of tools checked by the API.
+    return toolStateItems
 
-                # No valid state check withing desired timespan.
 
-                # Add state of tool to return array.
-                toolStateItem = ToolStateItem.ToolStateItem(
-                    toolToCheck.name,
-                    False,  # Tool is up boolean value.
-                    toolToCheck.toolIsDownMessageHasBeenSent,
-                    toolToCheck.description
-                )
-                toolStateItem.setCheckFrequency(toolToCheck.stateCheckFrequency_inMinutes)
-                toolStateItems.append(toolStateItem)
+# Get state of a single tool, that is being checked by sending its own alive message to api.
+# Returns ToolStateItem. See models for further information.
+def getToolState_api(toolToCheck, now, tolerancePeriodInSeconds):
 
+    # Has the state info been sent within the desired amount of time?
+    toolIsUp = int(toolToCheck.lastTimeToolWasUp) + int(toolToCheck.stateCheckFrequency_inMinutes) * 60 + tolerancePeriodInSeconds >= now
+    toolStateItem = ToolStateItem.ToolStateItem(
+        toolToCheck.name,
+        toolIsUp,  # Tool is up boolean value.
+        toolToCheck.toolIsDownMessageHasBeenSent,
+        toolToCheck.description
+    )
+    toolStateItem.setCheckFrequency(toolToCheck.stateCheckFrequency_inMinutes)
+    return toolStateItem
 
-            else:
 
-                # There is a valid state check withing desired timespan.
+# Arm the expiry timers of all tools using the api, that are not reported down yet.
+def armToolExpiryTimers_api(toolExpiryTimers, dbWrapper=None):
+    tolerancePeriodInSeconds = ConfigSnapshot.getConfig().tolerancePeriodInSeconds
+    with DatabaseWrapper.useOrOpenDatabaseWrapper(dbWrapper) as dbWrapper:
+        for toolToCheck in dbWrapper.iterateAllToolsToCheck():
+            if not toolToCheck.toolIsDownMessageHasBeenSent and isCheckedByThisReplica("tool:" + str(toolToCheck.name)):
+                toolExpiryTimers.arm(toolToCheck, tolerancePeriodInSeconds)
 
-                # Add state of tool to return array.
-                toolStateItem = ToolStateItem.ToolStateItem(
-                    toolToCheck.name,
-                    True,  # Tool is up boolean value.
-                    toolToCheck.toolIsDownMessageHasBeenSent,
-                    toolToCheck.description
-                )
-                toolStateItem.setCheckFrequency(toolToCheck.stateCheckFrequency_inMinutes)
-                toolStateItems.append(toolStateItem)
 
-    # Return states of tools checked by the API.
+# Get states of tools whose expiry timer fired.
+# Each tool is read again: tools that sent a heartbeat meanwhile are re-armed, stopped or already reported tools are dropped.
+# Returns Array of ToolStateItems of tools that are down and have not been reported yet.
+def getToolStatesOfExpiredTools_api(toolExpiryTimers, dbWrapper=None):
+    toolStateItems = []
+    expiredToolNames = toolExpiryTimers.popExpired()
+    if not expiredToolNames:
+        return toolStateItems
+
+    # Compare exactly like the timers did, otherwise a tool expiring within this second would fire again right away.
+    now = time.time()
+    tolerancePeriodInSeconds = ConfigSnapshot.getConfig().tolerancePeriodInSeconds
+    with DatabaseWrapper.useOrOpenDatabaseWrapper(dbWrapper) as dbWrapper:
+        for expiredToolName in expiredToolNames:
+            # Tools handed over to another replica meanwhile.
+            if not isCheckedByThisReplica("tool:" + str(expiredToolName)):
+                continue
+            toolToCheck = dbWrapper.getStateCheckItemByName(expiredToolName)
+            if toolToCheck is None or toolToCheck.toolIsDownMessageHasBeenSent:
+                continue
+            if not toolExpiryTimers.arm(toolToCheck, tolerancePeriodInSeconds, now):
+                toolStateItems.append(getToolState_api(toolToCheck, now, tolerancePeriodInSeconds))
     return toolStateItems
 
 
 # Get message for tool states to write in state message.
-def getToolStatesMessage():
+# Renders the states already determined by the checks (e.g. of a ToolStateSnapshot), nothing is checked again.
+def getToolStatesMessage(toolStateItems):
     # The message to return.
     toolStatesMessage = ""
 
-    # Array of ToolStateItems.
-    toolStateItems_api = getToolStates_api()
-    toolStateItems_custom = getToolStates_custom()
-    toolStateItems = toolStateItems_api + toolStateItems_custom
     for toolStateItem in toolStateItems:
 
         # Is the tool up?
@@ -109,70 +153,85 @@ def getToolStatesMessage():
             toolStateItem.statusMessage)
         toolStatesMessage += "" if toolStateItem.checkingEveryXMinutes == None else "\nChecking state every <b>" + str(
             toolStateItem.checkingEveryXMinutes) + "</b> minutes"
+        toolStatesMessage += "" if toolStateItem.latency == None else "\n" + getLatencyMessage(toolStateItem)
         toolStatesMessage += "\n\n"
 
     return toolStatesMessage
 
 
-# Get states of tools that are being checked manually from here.
-# Returns Array of ToolStateItems. See models for further information.
-def getToolStates_custom():
-    # Array of ToolStateItems.
-    toolStateItems = []
-
-    # Check website states for felicitas wisdom.
-    toolStateItems += getToolStates_websites()
-    toolStateItems += getToolStates_backups()
-
-    # Return states of tools checked by the API.
-    return toolStateItems
+# Get latency line of a tool for the state message, e.g.
+# "Latency 120 ms (p50 95 ms, p95 300 ms; connect 12.4 ms, tls 25.0 ms, ttfb 80.2 ms), threshold 500 ms".
+# The connect phase includes the dns lookup (see WebsiteProber.WebsiteProbeResult).
+def getLatencyMessage(toolStateItem):
+    latency = toolStateItem.latency
+    latencyMessage = "Latency <b>" + str(round(toolStateItem.durationInSeconds * 1000)) + " ms</b>"
+    details = []
+    if latency["p50_inMilliseconds"] is not None:
+        details.append("p50 " + str(latency["p50_inMilliseconds"]) + " ms, p95 " + str(latency["p95_inMilliseconds"]) + " ms")
+    if latency["phases_inMilliseconds"]:
+        details.append(", ".join(phase + " " + str(duration) + " ms" for phase, duration in latency["phases_inMilliseconds"].items()))
+    if details:
+        latencyMessage += " (" + "; ".join(details) + ")"
+    if latency["threshold_inMilliseconds"] > 0:
+        latencyMessage += ", threshold " + str(latency["threshold_inMilliseconds"]) + " ms"
+    else:
+        latencyMessage += ", latency check disabled"
+    return latencyMessage
 
 
 # Get states of websites.
 # Returns Array of ToolStateItems. See models for further information.
-def getToolStates_websites():
+def getToolStates_websites(dbWrapper=None):
     # Array of ToolStateItems.
     toolStateItems = []
 
     # Database connection.
-    dbWrapper = DatabaseWrapper.DatabaseWrapper()
-
-    # Check all website urls.
-    urls = configUtils.getWebsitesToCheck()
-    for url in urls:
-
-        # Create website item in db if not exists.
-        dbWrapper.createNewWebsiteCheck(WebsiteStateAndMessageSentItem.WebsiteStateAndMessageSentItem(url, "Up", False))
-
-        # Get previous check state.
-        websiteStateAndMessageSent = dbWrapper.getWebsiteCheckItemByName(url)
-
-        # Try to call website.
-        try:
-            x = requests.post(url)
-
-            # Is website considered down?
-            websiteIsUp = True if x.status_code == 200 else False
-
-            # Add state of tool to return array.
-            toolStateItem = ToolStateItem.ToolStateItem(
-                url,
-                websiteIsUp,  # Tool is up boolean value.
-                websiteStateAndMessageSent.isMessageIsDownMessageLastSentMessage()
-            )
-            toolStateItem.setStatusMessage(x.reason)
-            toolStateItem.indicateThatToolIsCustom()
-            toolStateItems.append(toolStateItem)
-        except Exception as e:
-            # Add state of tool to return array.
-            toolStateItem = ToolStateItem.ToolStateItem(
-                url,
-                False,  # Tool is up boolean value.
-                websiteStateAndMessageSent.isMessageIsDownMessageLastSentMessage()
-            )
-            toolStateItem.setStatusMessage("An Error was thrown trying to make request")
-            toolStateItem.indicateThatToolIsCustom()
-            toolStateItems.append(toolStateItem)
+    with DatabaseWrapper.useOrOpenDatabaseWrapper(dbWrapper) as dbWrapper:
+
+        # Create website items in db if not exist and get their previous check states.
+        urls = [url for url in ConfigSnapshot.getConfig().websitesToCheck if isCheckedByThisReplica("website:" + str(url))]
+        websiteStatesAndMessageSent = []
+        for url in urls:
+            dbWrapper.createNewWebsiteCheck(WebsiteStateAndMessageSentItem.WebsiteStateAndMessageSentItem(url, "Up", False))
+            websiteStatesAndMessageSent.append(dbWrapper.getWebsiteCheckItemByName(url))
+
+    # Call all websites concurrently.
+    config = ConfigSnapshot.getConfig()
+    websiteProbeResults = WebsiteProber.getWebsiteProber().probe(urls)
+    for websiteProbeResult, websiteStateAndMessageSent in zip(websiteProbeResults, websiteStatesAndMessageSent):
+        websiteIsUp = websiteProbeResult.websiteIsUp
+        statusMessage = websiteProbeResult.statusMessage
+
+        # Only answered requests count towards the response times of a website.
+        latencyInMilliseconds = round(websiteProbeResult.durationInSeconds * 1000)
+        latencyHistogram = LatencyHistogram.getLatencyHistogram(websiteProbeResult.url)
+        if websiteIsUp:
+            latencyHistogram.add(latencyInMilliseconds)
+        p50InMilliseconds = latencyHistogram.getPercentile(50)
+        p95InMilliseconds = latencyHistogram.getPercentile(95)
+
+        # Consider website down, if it responds slower than its latency threshold now and in more than 5 % of its latest responses (p95).
+        # A single slow response does not take a website down, once there are enough samples. Requiring the current response
+        # to be slow as well lets a website come back up with its first fast response, instead of waiting for its slow
+        # responses to leave the window of the histogram.
+        latencyThresholdInMilliseconds = config.getWebsiteLatencyThresholdInMilliseconds(websiteProbeResult.url)
+        if websiteIsUp and latencyThresholdInMilliseconds > 0 and latencyInMilliseconds > latencyThresholdInMilliseconds \
+                and p95InMilliseconds > latencyThresholdInMilliseconds:
+            websiteIsUp = False
+            statusMessage = "Latency too high: " + str(latencyInMilliseconds) + " ms (threshold " + str(latencyThresholdInMilliseconds) + \
+                " ms, p50 " + str(p50InMilliseconds) + " ms, p95 " + str(p95InMilliseconds) + " ms)"
+
+        # Add state of tool to return array.
+        toolStateItem = ToolStateItem.ToolStateItem(
+            websiteProbeResult.url,
+            websiteIsUp,  # Tool is up boolean value.
+            websiteStateAndMessageSent.isMessageIsDownMessageLastSentMessage()
+        )
+        toolStateItem.setStatusMessage(statusMessage)
+        toolStateItem.setDuration(websiteProbeResult.durationInSeconds)
+        toolStateItem.setLatency(websiteProbeResult.phasesInMilliseconds, p50InMilliseconds, p95InMilliseconds, latencyThresholdInMilliseconds)
+        toolStateItem.indicateThatToolIsCustom()
+        toolStateItems.append(toolStateItem)
 
     # Return states of tools checked by the API.
     return toolStateItems
@@ -180,18 +239,16 @@ def getToolStates_websites():
 
 # Get states of backups.
 # Returns Array of ToolStateItems. See models for further information.
-def getToolStates_backups():
+def getToolStates_backups(dbWrapper=None):
     # Array of ToolStateItems.
     backupStateItems = []
 
-    # Database connection.
-    dbWrapper = DatabaseWrapper.DatabaseWrapper()
-
     # Did all tools send a state info within desired timespan?
     now = int(time.time())
-    allBackupsToCheck = dbWrapper.getAllBackupsToCheck()
-    if allBackupsToCheck:
-        for backupToCheck in allBackupsToCheck:
+    with DatabaseWrapper.useOrOpenDatabaseWrapper(dbWrapper) as dbWrapper:
+        for backupToCheck in dbWrapper.iterateAllBackupsToCheck():
+            if not isCheckedByThisReplica("backup:" + str(backupToCheck.name)):
+                continue
 
             # Has the state info been sent within the desired amount of time?
             if int(backupToCheck.mostRecentBackupFile_creationDate) + int(
@@ -208,6 +265,7 @@ def getToolStates_backups():
                 )
                 toolStateItem.indicateThatToolIsBackup()
                 toolStateItem.setCheckFrequency(backupToCheck.stateCheckFrequency_inMinutes)
+                toolStateItem.setDuration(googleDriveFolderCheckDurations.get(backupToCheck.name))
                 backupStateItems.append(toolStateItem)
 
 
@@ -224,6 +282,7 @@ def getToolStates_backups():
                 )
                 toolStateItem.indicateThatToolIsBackup()
                 toolStateItem.setCheckFrequency(backupToCheck.stateCheckFrequency_inMinutes)
+                toolStateItem.setDuration(googleDriveFolderCheckDurations.get(backupToCheck.name))
                 backupStateItems.append(toolStateItem)
 
     # Return states of tools checked by the API.
@@ -234,56 +293,36 @@ def getToolStates_backups():
 # Similar behaviour as sending request to "/v1/backupcheck", but done directly from the server.
 # MAKE SURE THAT FOLDER IS GIVEN READ RIGHTS TO ACCOUNT THAT HOLDS CREDENTIALS.
 # (See previously working folder's rights in Google Drive for more info)
-def updateGoogleDriveFolderBackupChecks():
+def updateGoogleDriveFolderBackupChecks(dbWrapper=None):
 
     try:
 
         # Are there any googleDriveFolders to check?
-        googleDriveFoldersToCheck = configUtils.getGoogleDriveFoldersToCheck()
+        googleDriveFoldersToCheck = [googleDriveFolder for googleDriveFolder in ConfigSnapshot.getConfig().googleDriveFoldersToCheck
+                                     if isCheckedByThisReplica("backup:" + str(googleDriveFolder["name"]))]
         if googleDriveFoldersToCheck:
         
             # Database connection.
-            dbWrapper = DatabaseWrapper.DatabaseWrapper()
-
-            # Connect to google drive.
-            credentials = configUtils.getGoogleDriveServiceAccountCredentials()
-            service = build('drive', 'v3', credentials=credentials)
-
-            # Check all Google Drive folders of config.
-            for googleDriveFolder in googleDriveFoldersToCheck:
-
-                items = []
-                pageToken = ""
-                while pageToken is not None:
-                    response = service.files().list(q="'" + googleDriveFolder["folderID"] + "' in parents", pageSize=1000,
-                                                    pageToken=pageToken,
-                                                    fields="nextPageToken, files(kind, id, name, createdTime, md5Checksum)").execute()
-                    items.extend(response.get('files', []))
-                    pageToken = response.get('nextPageToken')
-
-                # Sort files by their creation date (newest files first).
-                items.sort(key=getCreationDate, reverse=True)
-
-                if items:
-                    backupCheckItem = BackupCheckItem.BackupCheckItem(
-                        googleDriveFolder["name"],
-                        googleDriveFolder["token"],
-                        googleDriveFolder["stateCheckFrequency_inMinutes"],
-                        dateStringUtils.convertGoogleDriveDateStringToUnixTimeStamp(items[0]["createdTime"]),
-                        items[0]["md5Checksum"],
-                        googleDriveFolder["description"]
-                    )
-                    dbWrapper.createOrUpdateBackupCheck(backupCheckItem)
-                else:
-                    backupCheckItem = BackupCheckItem.BackupCheckItem(
-                        googleDriveFolder["name"],
-                        googleDriveFolder["token"],
-                        googleDriveFolder["stateCheckFrequency_inMinutes"],
-                        "0",
-                        "no items",
-                        googleDriveFolder["description"]
-                    )
-                    dbWrapper.createOrUpdateBackupCheck(backupCheckItem)
+            with DatabaseWrapper.useOrOpenDatabaseWrapper(dbWrapper) as dbWrapper:
+
+                # Get newest file of all Google Drive folders of config, querying many folders at the same time.
+                config = ConfigSnapshot.getConfig()
+                googleDriveFolderTracker.useChangesFeed = config.googleDriveChangesFeedEnabled
+                googleDriveFolderTracker.workerCount = config.googleDriveWorkers
+                googleDriveFolderTracker.useBatchRequests = config.googleDriveBatchRequestsEnabled
+                folderCheckResults = googleDriveFolderTracker.checkFolders(googleDriveClient, [googleDriveFolder["folderID"] for googleDriveFolder in googleDriveFoldersToCheck])
+
+                # Update backup checks, a failing folder does not prevent updating the others.
+                for googleDriveFolder, folderCheckResult in zip(googleDriveFoldersToCheck, folderCheckResults):
+                    try:
+                        googleDriveFolderCheckDurations[googleDriveFolder["name"]] = folderCheckResult.durationInSeconds
+                        if folderCheckResult.error is not None:
+                            raise folderCheckResult.error
+                        updateGoogleDriveFolderBackupCheck(googleDriveFolder, folderCheckResult.newestFile, dbWrapper)
+                    except Exception as e:
+                        logger = Logger.Logger("check_tools")
+                        errormsg = f"stateCheckUtils.updateGoogleDriveFolderBackupChecks(). Error trying to update google drive backup state of {googleDriveFolder['name']}: {e}"
+                        logger.logError(errormsg)
     
     # In case of any Error: Log and print errror.
     except Exception as e:
@@ -293,9 +332,35 @@ def updateGoogleDriveFolderBackupChecks():
 
 
 
-# Sort files by their creation date -> get creation date of item.
-def getCreationDate(elem):
-    return elem["createdTime"]
+# Hash identifying the content of a Google Drive file.
+# Google Docs, Sheets, etc. have no md5Checksum, their id and creation date identify them instead,
+# otherwise their backup check would never take over the creation date of a newer file (see DatabaseWrapper.upsertBackupCheck()).
+def getGoogleDriveFileHash(googleDriveFile):
+    return googleDriveFile.get("md5Checksum") or googleDriveFile["id"] + "@" + googleDriveFile["createdTime"]
+
+
+# Write the newest file of a Google Drive folder (None for empty folders) as state of its backup check.
+def updateGoogleDriveFolderBackupCheck(googleDriveFolder, newestFile, dbWrapper):
+    if newestFile:
+        backupCheckItem = BackupCheckItem.BackupCheckItem(
+            googleDriveFolder["name"],
+            googleDriveFolder["token"],
+            googleDriveFolder["stateCheckFrequency_inMinutes"],
+            dateStringUtils.convertGoogleDriveDateStringToUnixTimeStamp(newestFile["createdTime"]),
+            getGoogleDriveFileHash(newestFile),
+            googleDriveFolder["description"]
+        )
+        dbWrapper.createOrUpdateBackupCheck(backupCheckItem)
+    else:
+        backupCheckItem = BackupCheckItem.BackupCheckItem(
+            googleDriveFolder["name"],
+            googleDriveFolder["token"],
+            googleDriveFolder["stateCheckFrequency_inMinutes"],
+            "0",
+            "no items",
+            googleDriveFolder["description"]
+        )
+        dbWrapper.createOrUpdateBackupCheck(backupCheckItem)
 
 
 # Write state of sent message to file.
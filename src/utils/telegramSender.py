@@ -0,0 +1,226 @@
+### Long-lived telegram sender used by the notification outbox.
+### Keeps one bot per token and limits messages per chat and in total with token buckets,
+### so that bursts to many chats go out in parallel without being throttled by telegram.
+
+## Imports.
+# Rate limits.
+import threading
+import time
+
+# Api for sending telegram messages.
+import telebot
+from telebot.apihelper import ApiTelegramException
+
+## Own classes.
+# Get configuration settings.
+import configSnapshot as ConfigSnapshot
+# Split messages exceeding the length limit of telegram.
+import stringUtils
+# Postpone deliveries, that are rate limited.
+import notificationOutbox as NotificationOutbox
+
+
+# Telegram limits (https://core.telegram.org/bots/faq#my-bot-is-hitting-limits-how-do-i-avoid-this).
+GLOBAL_MESSAGES_PER_SECOND = 30
+CHAT_MESSAGES_PER_SECOND = 1
+GROUP_MESSAGES_PER_SECOND = 20 / 60
+# Messages a group may receive at once, before the rate applies.
+GROUP_MESSAGES_BURST = 3
+
+# Maximum length of a single telegram message.
+MAX_MESSAGE_LENGTH = 4096
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at a constant rate. Not thread safe, guarded by TelegramRateLimiter.
+    """
+
+    def __init__(self, ratePerSecond, capacity):
+        """
+        Constructor of the token bucket, starting full.
+
+        Args:
+            ratePerSecond (float): Tokens added per second.
+            capacity (float): Maximum amount of tokens.
+        """
+        self.ratePerSecond = ratePerSecond
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updatedAt = time.monotonic()
+        self.blockedUntil = 0.0
+
+
+    def getSecondsUntilAvailable(self, now):
+        """
+        Refill the bucket and get the time until a token is available.
+
+        Args:
+            now (float): Current monotonic time.
+
+        Returns:
+            (float): Zero, if a token is available.
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updatedAt) * self.ratePerSecond)
+        self.updatedAt = now
+        secondsUntilRefilled = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.ratePerSecond
+        return max(secondsUntilRefilled, self.blockedUntil - now)
+
+
+class TelegramRateLimiter:
+    """
+    Global and per chat token buckets.
+    """
+
+    def __init__(self):
+        """
+        Constructor of the rate limiter.
+        """
+        self._lock = threading.Lock()
+        self._globalBucket = TokenBucket(GLOBAL_MESSAGES_PER_SECOND, GLOBAL_MESSAGES_PER_SECOND)
+        self._chatBuckets = {}
+
+
+    def tryAcquire(self, chatID):
+        """
+        Take a token of the chat and the global bucket, if both have one.
+
+        Args:
+            chatID (str): Chat to send a message to. Negative ids are groups with a lower limit.
+
+        Returns:
+            (float): Zero, if the message may be sent now. Otherwise the seconds to wait, nothing is taken.
+        """
+        now = time.monotonic()
+        with self._lock:
+            chatBucket = self._getChatBucket(chatID)
+            secondsUntilAvailable = max(chatBucket.getSecondsUntilAvailable(now), self._globalBucket.getSecondsUntilAvailable(now))
+            if secondsUntilAvailable == 0:
+                chatBucket.tokens -= 1
+                self._globalBucket.tokens -= 1
+            return secondsUntilAvailable
+
+
+    def block(self, chatID, seconds):
+        """
+        Send nothing to a chat for some time, e.g. after telegram answered 429 with retry_after.
+
+        Args:
+            chatID (str): Rate limited chat.
+            seconds (float): Time to wait.
+        """
+        with self._lock:
+            chatBucket = self._getChatBucket(chatID)
+            chatBucket.blockedUntil = max(chatBucket.blockedUntil, time.monotonic() + seconds)
+
+
+    def _getChatBucket(self, chatID):
+        chatBucket = self._chatBuckets.get(chatID)
+        if chatBucket is None:
+            if str(chatID).startswith("-"):
+                chatBucket = TokenBucket(GROUP_MESSAGES_PER_SECOND, GROUP_MESSAGES_BURST)
+            else:
+                chatBucket = TokenBucket(CHAT_MESSAGES_PER_SECOND, 1)
+            self._chatBuckets[chatID] = chatBucket
+        return chatBucket
+
+
+class TelegramSender:
+    """
+    Sends telegram messages with one bot, reused as long as the bot token does not change.
+
+    Telebot keeps an HTTP session per thread alive, so each worker of the outbox reuses its connection to telegram.
+    Messages, that would exceed a rate limit, are postponed via NotificationOutbox.RetryAfter instead of blocking
+    the worker, so that the other chats are served meanwhile. Long messages are split into several parts.
+    If a part fails after others have been sent, the outbox resumes the delivery with that part (see NotificationOutbox.PartiallyDelivered).
+    """
+
+    def __init__(self):
+        """
+        Constructor of the telegram sender.
+        """
+        self._rateLimiter = TelegramRateLimiter()
+        self._bot = None
+        self._botToken = None
+        self._botLock = threading.Lock()
+
+        # Metrics.
+        self._metricsLock = threading.Lock()
+        self._sentMessages = 0
+        self._rateLimitedMessages = 0
+        self._retryAfterResponses = 0
+
+
+    def send(self, chatID, subject, text, deliveredParts=0):
+        """
+        Send a message to a chat, split into several messages, if it is too long.
+
+        Args:
+            chatID (str): Chat to send the message to.
+            subject (str): Unused, telegram messages have no subject.
+            text (str): Html formatted message.
+            deliveredParts (int): Parts of the message sent by previous attempts, that are skipped.
+
+        Raises:
+            NotificationOutbox.RetryAfter: If the chat or the bot is rate limited right now.
+            NotificationOutbox.PartiallyDelivered: If a part failed after others have been sent.
+            Exception: If telegram rejected the message.
+        """
+        config = ConfigSnapshot.getConfig()
+        if not config.telegramEnabled:
+            return
+        bot = self._getBot(config.telegramBotToken)
+        messages = stringUtils.splitLongTextIntoWorkingMessages(text) if len(text) > MAX_MESSAGE_LENGTH else [text]
+
+        for index in range(deliveredParts, len(messages)):
+            try:
+                self._sendPart(bot, chatID, messages[index])
+            except Exception as e:
+                if index == 0:
+                    raise
+                raise NotificationOutbox.PartiallyDelivered(index, e) from e
+
+
+    # Send a single message, unless the chat or the bot is rate limited.
+    def _sendPart(self, bot, chatID, message):
+        secondsUntilAvailable = self._rateLimiter.tryAcquire(chatID)
+        if secondsUntilAvailable > 0:
+            with self._metricsLock:
+                self._rateLimitedMessages += 1
+            raise NotificationOutbox.RetryAfter(secondsUntilAvailable)
+        try:
+            bot.send_message(chatID, message)
+        except ApiTelegramException as e:
+            if e.error_code != 429:
+                raise
+            retryAfterInSeconds = (e.result_json.get("parameters") or {}).get("retry_after", 1)
+            self._rateLimiter.block(chatID, retryAfterInSeconds)
+            with self._metricsLock:
+                self._retryAfterResponses += 1
+            raise NotificationOutbox.RetryAfter(retryAfterInSeconds)
+        with self._metricsLock:
+            self._sentMessages += 1
+
+
+    def getMetrics(self):
+        """
+        Get send metrics.
+
+        Returns:
+            (dict): Sent messages, messages postponed by the own rate limiter and 429 responses of telegram.
+        """
+        with self._metricsLock:
+            return {
+                "sentMessages": self._sentMessages,
+                "rateLimitedMessages": self._rateLimitedMessages,
+                "retryAfterResponses": self._retryAfterResponses,
+            }
+
+
+    # Get the bot of the current token, created again if the token changed.
+    def _getBot(self, botToken):
+        with self._botLock:
+            if self._bot is None or self._botToken != botToken:
+                self._bot = telebot.TeleBot(botToken, parse_mode="HTML")
+                self._botToken = botToken
+            return self._bot
@@ -0,0 +1,115 @@
+### Expiry timers of tools using the api.
+### Holds the time at which each tool is considered down in a heap, so the earliest expiry is known without scanning all tools.
+
+## Imports.
+# Priority queue of expiries.
+import heapq
+# Current time.
+import time
+
+
+class ToolExpiryTimers:
+    """
+    Heap of (expiresAt, name) entries with at most one valid timer per tool.
+
+    Re-arming a tool leaves its old heap entry in place. Outdated entries are recognized by
+    comparing them to the current expiry of the tool and are dropped when they reach the top.
+    """
+
+    def __init__(self):
+        """
+        Constructor of the expiry timers.
+        """
+        self._expiries = []
+        self._expiresAtByName = {}
+
+        # Metrics.
+        self._fired = 0
+        self._outdatedEntries = 0
+
+
+    def arm(self, stateCheckItem, tolerancePeriodInSeconds, now=None):
+        """
+        Set the timer of a tool to the moment its last heartbeat expires.
+
+        Args:
+            stateCheckItem (StateCheckItem): Tool with lastTimeToolWasUp and frequency.
+            tolerancePeriodInSeconds (int): Extra seconds granted before a tool is considered down.
+            now (float): Timestamp to compare the expiry to. Defaults to the current time.
+
+        Returns:
+            (bool): True, if the timer has been armed. False, if the heartbeat has already expired.
+        """
+        expiresAt = int(stateCheckItem.lastTimeToolWasUp) + int(stateCheckItem.stateCheckFrequency_inMinutes) * 60 + tolerancePeriodInSeconds
+        if now is None:
+            now = time.time()
+        if expiresAt < now:
+            self.disarm(stateCheckItem.name)
+            return False
+        if self._expiresAtByName.get(stateCheckItem.name) != expiresAt:
+            self._expiresAtByName[stateCheckItem.name] = expiresAt
+            heapq.heappush(self._expiries, (expiresAt, stateCheckItem.name))
+        return True
+
+
+    def disarm(self, name):
+        """
+        Remove the timer of a tool, e.g. when it is down already or has been stopped.
+
+        Args:
+            name (str): Name of the tool.
+        """
+        self._expiresAtByName.pop(name, None)
+
+
+    def getSecondsUntilNextExpiry(self):
+        """
+        Get the time until the earliest timer fires.
+
+        Returns:
+            (float): Seconds until the next expiry (zero, if a timer already fired) or None, if no timer is armed.
+        """
+        self._dropOutdatedEntries()
+        if not self._expiries:
+            return None
+        return max(self._expiries[0][0] - time.time(), 0.0)
+
+
+    def popExpired(self):
+        """
+        Remove and return all tools whose timer fired.
+
+        Returns:
+            (list): Names of the expired tools.
+        """
+        now = time.time()
+        expiredNames = []
+        self._dropOutdatedEntries()
+        while self._expiries and self._expiries[0][0] < now:
+            expiresAt, name = heapq.heappop(self._expiries)
+            del self._expiresAtByName[name]
+            expiredNames.append(name)
+            self._dropOutdatedEntries()
+        self._fired += len(expiredNames)
+        return expiredNames
+
+
+    def getMetrics(self):
+        """
+        Get usage metrics of the timers.
+
+        Returns:
+            (dict): Armed timers, heap size and fired timers.
+        """
+        return {
+            "armedTimers": len(self._expiresAtByName),
+            "heapEntries": len(self._expiries),
+            "firedTimers": self._fired,
+            "droppedOutdatedEntries": self._outdatedEntries,
+        }
+
+
+    def _dropOutdatedEntries(self):
+        while self._expiries and self._expiresAtByName.get(self._expiries[0][1]) != self._expiries[0][0]:
+            heapq.heappop(self._expiries)
+            self._outdatedEntries += 1
@@ -0,0 +1,173 @@
+### In-memory registry of the tools checked via the api.
+### Lets the api validate tool tokens without asking the database for every heartbeat.
+
+## Imports.
+# Token hashes and constant time comparison.
+import hashlib
+import hmac
+# Thread safe access.
+import threading
+# Time to live of entries.
+import time
+# Immutable entries.
+from collections import namedtuple
+
+
+# Results of ToolRegistry.checkToken().
+TOKEN_VALID = "valid"
+TOKEN_INVALID = "invalid"
+TOKEN_UNKNOWN = "unknown"
+
+# What the registry knows about a tool. Only a hash of the token is kept in memory.
+ToolRegistryEntry = namedtuple("ToolRegistryEntry", ["ID", "tokenHash", "stateCheckFrequency_inMinutes", "description", "expiresAt"])
+
+
+class ToolRegistry:
+    """
+    Cache of name -> (ID, token hash, frequency, description) for all tools that send heartbeats.
+
+    Filled from the database at startup and kept coherent by the api on every create and stop.
+    Entries expire after the time to live, so that changes made by other api processes are
+    picked up eventually. Expired or missing tools are reported as unknown and have to be
+    validated by the database.
+    """
+
+    def __init__(self, timeToLiveInSeconds):
+        """
+        Constructor of the tool registry.
+
+        Args:
+            timeToLiveInSeconds (int): How long an entry is trusted. Zero disables the registry.
+        """
+        self._timeToLiveInSeconds = timeToLiveInSeconds
+        self._lock = threading.Lock()
+        self._entries = {}
+
+        # Metrics.
+        self._hits = 0
+        self._misses = 0
+        self._rejectedTokens = 0
+        self._expiredEntries = 0
+        self._lastLoadDurationInSeconds = 0.0
+
+
+    def isEnabled(self):
+        """
+        Is the registry used at all?
+
+        Returns:
+            (bool): False, if the time to live is zero.
+        """
+        return self._timeToLiveInSeconds > 0
+
+
+    def load(self, stateCheckItems):
+        """
+        Replace all entries, e.g. with the tools read from the database at startup.
+
+        Args:
+            stateCheckItems (list): StateCheckItems with ID, name, token, frequency and description.
+        """
+        if not self.isEnabled():
+            return
+        loadStart = time.monotonic()
+        entries = {}
+        for stateCheckItem in stateCheckItems:
+            entries[stateCheckItem.name] = self._createEntry(stateCheckItem)
+        with self._lock:
+            self._entries = entries
+            self._lastLoadDurationInSeconds = time.monotonic() - loadStart
+
+
+    def checkToken(self, name, token):
+        """
+        Validate the token of a tool against the registry.
+
+        Args:
+            name (str): Name of the tool.
+            token (str): Token sent by the tool.
+
+        Returns:
+            (str): TOKEN_VALID or TOKEN_INVALID, if the tool is known. TOKEN_UNKNOWN, if the database has to decide.
+        """
+        if not self.isEnabled():
+            return TOKEN_UNKNOWN
+        tokenHash = _hashToken(token)
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry.expiresAt <= time.monotonic():
+                del self._entries[name]
+                self._expiredEntries += 1
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return TOKEN_UNKNOWN
+            self._hits += 1
+            if hmac.compare_digest(entry.tokenHash, tokenHash):
+                return TOKEN_VALID
+            self._rejectedTokens += 1
+            return TOKEN_INVALID
+
+
+    def remember(self, stateCheckItem):
+        """
+        Add or refresh a tool, after the database accepted its heartbeat.
+
+        Args:
+            stateCheckItem (StateCheckItem): The accepted heartbeat.
+        """
+        if not self.isEnabled():
+            return
+        with self._lock:
+            # Keep the ID, heartbeats of existing tools do not carry it.
+            if stateCheckItem.ID is None and stateCheckItem.name in self._entries:
+                stateCheckItem.ID = self._entries[stateCheckItem.name].ID
+            self._entries[stateCheckItem.name] = self._createEntry(stateCheckItem)
+
+
+    def forget(self, name):
+        """
+        Remove a tool, e.g. when its state check is stopped.
+
+        Args:
+            name (str): Name of the tool.
+        """
+        with self._lock:
+            self._entries.pop(name, None)
+
+
+    def getMetrics(self):
+        """
+        Get usage metrics of the registry.
+
+        Returns:
+            (dict): Amount of entries, cache hits and misses and rejected tokens.
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "ttl_inSeconds": self._timeToLiveInSeconds,
+                "entries": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hitRate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "rejectedTokens": self._rejectedTokens,
+                "expiredEntries": self._expiredEntries,
+                "lastLoadDuration_inMilliseconds": round(self._lastLoadDurationInSeconds * 1000, 3),
+            }
+
+
+    def _createEntry(self, stateCheckItem):
+        return ToolRegistryEntry(
+            stateCheckItem.ID,
+            _hashToken(stateCheckItem.token),
+            stateCheckItem.stateCheckFrequency_inMinutes,
+            stateCheckItem.description,
+            time.monotonic() + self._timeToLiveInSeconds,
+        )
+
+
+
+# Tokens are compared by their hash, so that plain tokens are not kept in memory.
+def _hashToken(token):
+    return hashlib.sha256(token.encode()).digest()
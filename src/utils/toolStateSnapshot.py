@@ -0,0 +1,94 @@
+### Immutable snapshot of the latest tool states of the check loop.
+### Each check replaces the states it determined, so that status reports render from the states
+### the checks already computed instead of probing websites and querying the DB again.
+
+## Imports.
+# Read only view of the states.
+from types import MappingProxyType
+
+
+# Kinds of tool states, in the order they are listed in status messages.
+TOOL_STATE_KINDS = ("api", "websites", "backups")
+
+
+class ToolStateSnapshot:
+    """
+    Latest ToolStateItems per kind ("api", "websites" or "backups").
+
+    Snapshots are never modified. withToolStates() and withoutToolStates() return a new snapshot,
+    so a consumer holding a snapshot is not affected by checks running meanwhile.
+    The ToolStateItems themselves must not be modified either, once they are part of a snapshot.
+    """
+
+    def __init__(self, toolStatesByKind=None):
+        """
+        Constructor of the snapshot.
+
+        Args:
+            toolStatesByKind (dict): Tuple of ToolStateItems per kind. Kinds, that are missing, are unknown.
+        """
+        self._toolStatesByKind = MappingProxyType(dict(toolStatesByKind or {}))
+
+
+    def withToolStates(self, kind, toolStateItems):
+        """
+        Get a snapshot, in which the states of a kind are replaced.
+
+        Args:
+            kind (str): Kind of the states, one of TOOL_STATE_KINDS.
+            toolStateItems (list): All ToolStateItems of the kind.
+
+        Returns:
+            (ToolStateSnapshot): The new snapshot.
+        """
+        if kind not in TOOL_STATE_KINDS:
+            raise ValueError("Unknown kind of tool states: " + str(kind))
+        toolStatesByKind = dict(self._toolStatesByKind)
+        toolStatesByKind[kind] = tuple(toolStateItems)
+        return ToolStateSnapshot(toolStatesByKind)
+
+
+    def withoutToolStates(self, kind):
+        """
+        Get a snapshot, in which the states of a kind are unknown, e.g. because only some of them have been determined.
+
+        Args:
+            kind (str): Kind of the states.
+
+        Returns:
+            (ToolStateSnapshot): The new snapshot.
+        """
+        if kind not in self._toolStatesByKind:
+            return self
+        toolStatesByKind = dict(self._toolStatesByKind)
+        del toolStatesByKind[kind]
+        return ToolStateSnapshot(toolStatesByKind)
+
+
+    def hasToolStates(self, kind):
+        """
+        Check, whether the states of a kind are known.
+
+        Args:
+            kind (str): Kind of the states.
+
+        Returns:
+            (bool): True, if the states of the kind are part of the snapshot.
+        """
+        return kind in self._toolStatesByKind
+
+
+    def getToolStates(self, kind=None):
+        """
+        Get the states of a kind or of all known kinds.
+
+        Args:
+            kind (str): Kind of the states. None for all kinds in the order of TOOL_STATE_KINDS.
+
+        Returns:
+            (tuple): ToolStateItems, empty if the kind is unknown.
+        """
+        if kind is not None:
+            return self._toolStatesByKind.get(kind, ())
+        return tuple(toolStateItem for kind in TOOL_STATE_KINDS for toolStateItem in self._toolStatesByKind.get(kind, ()))
+
@@ -0,0 +1,262 @@
+### Probes the websites to check concurrently.
+### All probes share one keep-alive HTTP session and are bounded by connect and read timeouts.
+### Each probe also reports how long connecting, the tls handshake and the first response byte took,
+### measured on the connection of the probe itself.
+### Depending on the configured probe method, only headers or a capped part of the body are downloaded.
+
+## Imports.
+# Concurrent probes.
+from concurrent.futures import ThreadPoolExecutor
+# Result of a probe.
+from collections import namedtuple
+# Thread safe creation of the prober.
+import threading
+# Probe durations.
+import time
+
+# For making POST / GET requests.
+import requests
+from requests.adapters import HTTPAdapter
+# Connections of the session, timed while they connect.
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+## Own classes.
+# Get configuration settings.
+import configSnapshot as ConfigSnapshot
+
+
+# Result of probing a single website.
+# phasesInMilliseconds may contain "connect" (dns lookup and tcp connect, the dns lookup is not reported on its own,
+# because urllib3 resolves and connects in a single call), "tls" (handshake) and "ttfb" (time to the first response byte).
+# Connect and tls are only reported, if the probe had to open a new connection.
+WebsiteProbeResult = namedtuple("WebsiteProbeResult", ["url", "websiteIsUp", "statusMessage", "durationInSeconds", "phasesInMilliseconds"])
+
+
+class WebsiteProber:
+    """
+    Probes many websites at once on a bounded thread pool.
+
+    A hanging website only costs its own timeouts, not the time of all other probes.
+    """
+
+    def __init__(self, concurrency, connectTimeoutInSeconds, readTimeoutInSeconds, maxBodyBytes):
+        """
+        Constructor of the website prober.
+
+        Args:
+            concurrency (int): Maximum amount of websites probed at the same time.
+            connectTimeoutInSeconds (float): How long to wait for a connection to a website.
+            readTimeoutInSeconds (float): How long to wait for the response of a website.
+            maxBodyBytes (int): Maximum amount of body bytes read per probe.
+        """
+        self._timeout = (connectTimeoutInSeconds, readTimeoutInSeconds)
+        self._maxBodyBytes = maxBodyBytes
+
+        # Validators (ETag, Last-Modified) of the last accepted response per url for CONDITIONAL_GET probes.
+        self._validatorsByUrl = {}
+        self._validatorsLock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="websiteProbe")
+
+        # Keep connections to each website alive between checks.
+        self._session = requests.Session()
+        adapter = _PhaseTimingAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+
+    def probe(self, urls):
+        """
+        Probe all websites concurrently.
+
+        Args:
+            urls (list): Urls of the websites to probe.
+
+        Returns:
+            (list): One WebsiteProbeResult per url, in the order of the urls.
+        """
+        return list(self._executor.map(self.probeWebsite, urls))
+
+
+    def close(self):
+        """
+        Stop the worker threads and close the kept alive connections.
+        """
+        self._executor.shutdown(wait=False)
+        self._session.close()
+
+
+    def probeWebsite(self, url):
+        """
+        Probe a single website using its configured probe method.
+
+        A website is up, if it responds with status code 200 (or 304 to a CONDITIONAL_GET probe)
+        and its body, as far as it is read, contains the expected content (if configured).
+
+        Args:
+            url (str): Url of the website.
+
+        Returns:
+            (WebsiteProbeResult): Whether the website is up, the reason, how long the probe took and its connection phases.
+        """
+        config = ConfigSnapshot.getConfig()
+        probeMethod = config.getWebsiteProbeMethod(url)
+        expectedContent = config.getWebsiteProbeExpectedContent(url)
+
+        # Filled by the connection of the probe, if a new one has to be opened.
+        phasesInMilliseconds = {}
+        _connectionPhases.phasesInMilliseconds = phasesInMilliseconds
+        probeStart = time.monotonic()
+        try:
+            if probeMethod == "HEAD":
+                response = self._session.head(url, timeout=self._timeout)
+            elif probeMethod == "POST":
+                response = self._session.post(url, timeout=self._timeout, stream=True)
+            else:
+                response = self._session.get(url, timeout=self._timeout, stream=True, headers=self._getConditionalHeaders(url, probeMethod))
+            phasesInMilliseconds["ttfb"] = _toMilliseconds(response.elapsed.total_seconds())
+
+            with response:
+                websiteIsUp, statusMessage = self._checkResponse(url, probeMethod, response, expectedContent)
+            return WebsiteProbeResult(url, websiteIsUp, statusMessage, time.monotonic() - probeStart, phasesInMilliseconds)
+        except requests.exceptions.Timeout:
+            return WebsiteProbeResult(url, False, "Request timed out", time.monotonic() - probeStart, phasesInMilliseconds)
+        except Exception:
+            return WebsiteProbeResult(url, False, "An Error was thrown trying to make request", time.monotonic() - probeStart, phasesInMilliseconds)
+        finally:
+            _connectionPhases.phasesInMilliseconds = None
+
+
+    def _checkResponse(self, url, probeMethod, response, expectedContent):
+        # Website answered a conditional request with "not modified", so its content has been accepted before.
+        if probeMethod == "CONDITIONAL_GET" and response.status_code == 304:
+            return True, response.reason
+        if response.status_code != 200:
+            return False, response.reason
+
+        # Read at most maxBodyBytes, the rest is never downloaded.
+        if probeMethod != "HEAD":
+            body = _readCappedBody(response, self._maxBodyBytes)
+            if expectedContent is not None and expectedContent not in body.decode(response.encoding or "utf-8", errors="replace"):
+                return False, "Expected content not found in first " + str(len(body)) + " bytes"
+
+        # Remember validators to revalidate cheaply next time.
+        if probeMethod == "CONDITIONAL_GET":
+            with self._validatorsLock:
+                self._validatorsByUrl[url] = (response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return True, response.reason
+
+
+    def _getConditionalHeaders(self, url, probeMethod):
+        if probeMethod != "CONDITIONAL_GET":
+            return None
+        with self._validatorsLock:
+            entityTag, lastModified = self._validatorsByUrl.get(url, (None, None))
+        headers = {}
+        if entityTag:
+            headers["If-None-Match"] = entityTag
+        if lastModified:
+            headers["If-Modified-Since"] = lastModified
+        return headers
+
+
+# Connection phases of the probe running on the current thread.
+_connectionPhases = threading.local()
+
+
+def _recordConnectionPhase(phase, durationInSeconds):
+    phasesInMilliseconds = getattr(_connectionPhases, "phasesInMilliseconds", None)
+    if phasesInMilliseconds is not None:
+        phasesInMilliseconds[phase] = _toMilliseconds(durationInSeconds)
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    """
+    Connection recording how long connecting (dns lookup and tcp connect) took for the probe of the current thread.
+    Kept alive connections are reused without connecting, so their probes only report the time to the first byte.
+    """
+
+    def _new_conn(self):
+        phaseStart = time.monotonic()
+        connection = super()._new_conn()
+        _recordConnectionPhase("connect", time.monotonic() - phaseStart)
+        return connection
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    """
+    Connection recording how long connecting (dns lookup and tcp connect) and the tls handshake took for the probe of the current thread.
+    """
+
+    def _new_conn(self):
+        phaseStart = time.monotonic()
+        connection = super()._new_conn()
+        self._connectedAt = time.monotonic()
+        _recordConnectionPhase("connect", self._connectedAt - phaseStart)
+        return connection
+
+    def connect(self):
+        self._connectedAt = None
+        super().connect()
+        if self._connectedAt is not None:
+            _recordConnectionPhase("tls", time.monotonic() - self._connectedAt)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _PhaseTimingAdapter(HTTPAdapter):
+    """
+    Adapter of the session, whose connection pools time the connections they open.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _TimedHTTPConnectionPool, "https": _TimedHTTPSConnectionPool}
+
+
+# Read up to maxBodyBytes of a streamed response body.
+def _readCappedBody(response, maxBodyBytes):
+    body = b""
+    for chunk in response.iter_content(chunk_size=min(maxBodyBytes, 16384)):
+        body += chunk
+        if len(body) >= maxBodyBytes:
+            return body[:maxBodyBytes]
+    return body
+
+
+# Rounded milliseconds of a duration in seconds.
+def _toMilliseconds(durationInSeconds):
+    return round(durationInSeconds * 1000, 1)
+
+
+# The prober shared by all website checks of this process.
+_websiteProber = None
+_websiteProberSettings = None
+_websiteProberLock = threading.Lock()
+
+
+def getWebsiteProber():
+    """
+    Get the website prober of this process, created on first use.
+
+    A new prober is created, if the probe settings of the config changed.
+
+    Returns:
+        (WebsiteProber): The shared website prober.
+    """
+    global _websiteProber, _websiteProberSettings
+    config = ConfigSnapshot.getConfig()
+    settings = (config.websiteProbeConcurrency, config.websiteProbeConnectTimeoutInSeconds, config.websiteProbeReadTimeoutInSeconds, config.websiteProbeMaxBodyBytes)
+    with _websiteProberLock:
+        if _websiteProber is None or _websiteProberSettings != settings:
+            if _websiteProber is not None:
+                _websiteProber.close()
+            _websiteProber = WebsiteProber(*settings)
+            _websiteProberSettings = settings
+        return _websiteProber
@@ -0,0 +1,104 @@
+### Queries and wall time of loading a synthetic fleet of tools, before and after selecting all columns at once.
+### Runs against the stand-in connection with a simulated round trip, so no MySQL server is needed.
+###
+### Usage: python tests/benchmark_fleetQueries.py [amountOfTools] [roundTripInMilliseconds]
+
+import os
+import sys
+import time
+
+# Same module paths and environment as the tests.
+sys.path.insert(1, os.path.dirname(__file__))
+import conftest
+
+import databaseStandIn as DatabaseStandIn
+import databaseWrapper as DatabaseWrapper
+
+
+DEFAULT_AMOUNT_OF_TOOLS = 5000
+DEFAULT_ROUND_TRIP_IN_MILLISECONDS = 0.5
+
+
+def createFleet(amountOfTools):
+    """
+    Create the rows of a synthetic fleet of tools.
+
+    Args:
+        amountOfTools (int): Size of the fleet.
+
+    Returns:
+        (list): Rows selected with DatabaseWrapper.STATE_CHECK_COLUMNS.
+    """
+    return [(index + 1, "tool" + str(index), "description", "token", 5, 1700000000, 0) for index in range(amountOfTools)]
+
+
+def createFleetAnswer(fleet):
+    """
+    Answer the statements loading the fleet like MySQL would.
+
+    Args:
+        fleet (list): Rows of the fleet.
+
+    Returns:
+        (callable): Answer of a StandInConnection.
+    """
+    fleetByName = {row[1]: row for row in fleet}
+
+    def answer(query, params):
+        if query.startswith("SELECT name FROM checked_tools"):
+            return [(row[1],) for row in fleet]
+        if "WHERE name=%s" in query:
+            return [fleetByName[params[0]]]
+        if query.startswith("SELECT " + DatabaseWrapper.STATE_CHECK_COLUMNS + " FROM checked_tools ORDER BY ID"):
+            return fleet
+        raise AssertionError("Unexpected statement: " + query)
+
+    return answer
+
+
+# Former getAllToolsToCheck: select the names, then one query per tool.
+def getAllToolsToCheckOneByOne(dbWrapper):
+    dbWrapper.mycursor.execute("SELECT name FROM checked_tools ORDER BY ID")
+    return [dbWrapper.getStateCheckItemByName(row[0]) for row in dbWrapper.mycursor.fetchall()]
+
+
+def measure(loadFleet, fleet, roundTripInSeconds):
+    """
+    Load the fleet once and count the round trips.
+
+    Args:
+        loadFleet (callable): Loads all tools using the passed wrapper.
+        fleet (list): Rows of the fleet.
+        roundTripInSeconds (float): Simulated latency of each round trip.
+
+    Returns:
+        (tuple): Statements, fetch round trips and wall time in seconds.
+    """
+    connection = DatabaseStandIn.StandInConnection(createFleetAnswer(fleet), roundTripInSeconds)
+    dbWrapper = DatabaseStandIn.createDatabaseWrapper(connection)
+    start = time.perf_counter()
+    tools = loadFleet(dbWrapper)
+    wallTime = time.perf_counter() - start
+    assert len(tools) == len(fleet)
+    return len(connection.statements), connection.fetchRoundTrips, wallTime
+
+
+def main():
+    amountOfTools = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_AMOUNT_OF_TOOLS
+    roundTripInMilliseconds = float(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_ROUND_TRIP_IN_MILLISECONDS
+    fleet = createFleet(amountOfTools)
+
+    print(str(amountOfTools) + " tools, " + str(roundTripInMilliseconds) + " ms per round trip")
+    print("{:<32} {:>10} {:>14} {:>12}".format("", "statements", "fetch batches", "wall time"))
+    variants = (
+        ("before (one query per tool)", getAllToolsToCheckOneByOne),
+        ("after getAllToolsToCheck", lambda dbWrapper: dbWrapper.getAllToolsToCheck()),
+        ("after iterateAllToolsToCheck", lambda dbWrapper: list(dbWrapper.iterateAllToolsToCheck())),
+    )
+    for name, loadFleet in variants:
+        statements, fetchRoundTrips, wallTime = measure(loadFleet, fleet, roundTripInMilliseconds / 1000)
+        print("{:<32} {:>10} {:>14} {:>10.3f} s".format(name, statements, fetchRoundTrips, wallTime))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+### Shared setup of the tests.
+### The modules of src import each other by module name, so their folders are added to the path like check_tools.py does.
+
+import os
+import sys
+
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), "..", "src", "utils"))
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), "..", "src", "models"))
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), "..", "src", "definitions"))
+
+# Tests do not read config.txt, settings they need are set by the tests themselves.
+os.environ.setdefault("STATECHECKER_SERVER_CONFIG", "{}")
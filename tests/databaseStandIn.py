@@ -0,0 +1,139 @@
+### Stand-in for a mysql.connector connection, that records every statement sent to the DB.
+### Tests decide the result of each statement, so that the round trips of DatabaseWrapper can be counted without a MySQL server.
+
+## Imports.
+# Simulated latency of the DB.
+import time
+
+## Own classes.
+import databaseWrapper as DatabaseWrapper
+import databaseConnectionPool as DatabaseConnectionPool
+
+
+class StandInCursor:
+    """
+    Cursor answering statements with the result of StandInConnection.answer.
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._rows = []
+        self.rowcount = 0
+        self.lastrowid = None
+
+
+    def execute(self, query, params=None):
+        self._connection.roundTrip(query, params)
+        result = self._connection.answer(query, params)
+        if isinstance(result, int):
+            self._rows = []
+            self.rowcount = result
+            self.lastrowid = len(self._connection.statements) if query.startswith("INSERT") and result else None
+        else:
+            self._rows = list(result)
+            self.rowcount = len(self._rows)
+
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+
+    def fetchmany(self, size=1):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        if rows:
+            # Unbuffered cursors fetch every batch from the server.
+            self._connection.fetchRoundTrips += 1
+            if self._connection.roundTripInSeconds:
+                time.sleep(self._connection.roundTripInSeconds)
+        return rows
+
+
+    def close(self):
+        pass
+
+
+class StandInConnection:
+    """
+    Connection recording statements and commits.
+
+    answer(query, params) returns the affected rows (int) or the selected rows (list) of a statement.
+    """
+
+    def __init__(self, answer=lambda query, params: 0, roundTripInSeconds=0.0):
+        """
+        Constructor of the connection.
+
+        Args:
+            answer (callable): Result of a statement.
+            roundTripInSeconds (float): Simulated latency of each statement, fetched batch and commit.
+        """
+        self.answer = answer
+        self.roundTripInSeconds = roundTripInSeconds
+        self.statements = []
+        self.commits = 0
+        self.fetchRoundTrips = 0
+        self.in_transaction = False
+
+
+    def roundTrip(self, query, params):
+        self.statements.append((query, params))
+        if self.roundTripInSeconds:
+            time.sleep(self.roundTripInSeconds)
+
+
+    def cursor(self, buffered=True):
+        return StandInCursor(self)
+
+
+    def commit(self):
+        self.commits += 1
+        if self.roundTripInSeconds:
+            time.sleep(self.roundTripInSeconds)
+
+
+    def rollback(self):
+        pass
+
+
+class StandInPool:
+    """
+    Pool handing out a single stand-in connection.
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+
+
+    def getConnection(self):
+        return self._connection
+
+
+    def checkConnection(self, connection):
+        return connection
+
+
+    def releaseConnection(self, connection):
+        pass
+
+
+def createDatabaseWrapper(connection):
+    """
+    Create a DatabaseWrapper using a stand-in connection instead of the pool of the process.
+
+    Args:
+        connection (StandInConnection): Connection of the wrapper.
+
+    Returns:
+        (DatabaseWrapper): The wrapper.
+    """
+    getDatabaseConnectionPool = DatabaseConnectionPool.getDatabaseConnectionPool
+    DatabaseConnectionPool.getDatabaseConnectionPool = lambda: StandInPool(connection)
+    try:
+        return DatabaseWrapper.DatabaseWrapper()
+    finally:
+        DatabaseConnectionPool.getDatabaseConnectionPool = getDatabaseConnectionPool
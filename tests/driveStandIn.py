@@ -0,0 +1,180 @@
+### Stand-in for the Google Drive v3 API on a local HTTP server, that records every request.
+### Serves files.list of a folder, the changes feed and batch requests, so that GoogleDriveFolderTracker
+### can be run with a real googleapiclient service without access to Google Drive.
+
+## Imports.
+# HTTP server on a background thread.
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+# Requests and responses.
+import json
+import re
+import urllib.parse
+
+# Drive service talking to the stand-in.
+import httplib2
+from googleapiclient.discovery import build
+from googleapiclient.http import BatchHttpRequest
+
+
+# Folders, whose ID starts with this prefix, are answered with an error.
+FAILING_FOLDER_PREFIX = "fail"
+
+
+class StandInDrive:
+    """
+    Files and changes of a Drive, served on a local port.
+
+    requests records (path, query parameters) of every request and of every query in a batch request.
+    batchSizes records the amount of queries of every batch request.
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.changes = []
+        self.requests = []
+        self.batchSizes = []
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), StandInDriveHandler)
+        self._server.drive = self
+        self.url = "http://127.0.0.1:" + str(self._server.server_address[1]) + "/"
+        threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True).start()
+
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+    def addFile(self, fileID, folderID, createdTime):
+        self.files[fileID] = {"id": fileID, "name": fileID, "createdTime": createdTime, "md5Checksum": "md5-" + fileID, "parents": [folderID], "trashed": False}
+        self.changes.append((fileID, False))
+
+
+    def trashFile(self, fileID):
+        self.files[fileID]["trashed"] = True
+        self.changes.append((fileID, False))
+
+
+    def removeFile(self, fileID):
+        del self.files[fileID]
+        self.changes.append((fileID, True))
+
+
+    def getRequestPaths(self):
+        return [path for path, params in self.requests]
+
+
+    def answer(self, path, params):
+        """
+        Answer a GET request.
+
+        Args:
+            path (str): Path of the request.
+            params (dict): Query parameters of the request.
+
+        Returns:
+            (tuple): HTTP status and JSON response.
+        """
+        self.requests.append((path, params))
+        if path.endswith("/files"):
+            folderID = params["q"].split("'")[1]
+            if folderID.startswith(FAILING_FOLDER_PREFIX):
+                return 500, {"error": {"code": 500, "message": "Backend Error"}}
+            filesOfFolder = [file for file in self.files.values() if folderID in file["parents"] and not file["trashed"]]
+            if params.get("orderBy") == "createdTime desc":
+                filesOfFolder.sort(key=lambda file: file["createdTime"], reverse=True)
+            filesOfFolder = filesOfFolder[:int(params.get("pageSize", 100))]
+            return 200, {"files": [{field: file[field] for field in ("id", "name", "createdTime", "md5Checksum")} for file in filesOfFolder]}
+        if path.endswith("/changes/startPageToken"):
+            return 200, {"startPageToken": str(len(self.changes))}
+        if path.endswith("/changes"):
+            start = int(params["pageToken"])
+            end = start + int(params.get("pageSize", 100))
+            response = {"changes": []}
+            for fileID, removed in self.changes[start:end]:
+                change = {"fileId": fileID, "removed": removed}
+                if not removed:
+                    change["file"] = dict(self.files[fileID])
+                response["changes"].append(change)
+            if end < len(self.changes):
+                response["nextPageToken"] = str(end)
+            else:
+                response["newStartPageToken"] = str(len(self.changes))
+            return 200, response
+        return 404, {"error": {"code": 404, "message": "Not Found"}}
+
+
+    def createService(self):
+        """
+        Create a Drive service sending its requests and batch requests to the stand-in.
+
+        Returns:
+            (googleapiclient.discovery.Resource): Google Drive v3 service.
+        """
+        service = build("drive", "v3", http=httplib2.Http(), static_discovery=True, cache_discovery=False, client_options={"api_endpoint": self.url})
+        service.new_batch_http_request = lambda callback=None: BatchHttpRequest(callback=callback, batch_uri=self.url + "batch/drive/v3")
+        return service
+
+
+class StandInDriveHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        status, response = self.server.drive.answer(url.path, dict(urllib.parse.parse_qsl(url.query)))
+        self._send(status, "application/json", json.dumps(response))
+
+
+    # Batch request: multipart body of GET requests, answered with a multipart body of responses.
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+        if not self.path.startswith("/batch"):
+            self._send(404, "application/json", "{}")
+            return
+        boundary = self.headers["Content-Type"].split("boundary=")[1].strip("\"")
+        parts = [part for part in body.split("--" + boundary) if "HTTP/1.1" in part]
+        self.server.drive.batchSizes.append(len(parts))
+
+        responseBoundary = "responseBoundary"
+        responseBody = ""
+        for part in parts:
+            contentID = re.search(r"Content-ID: <([^>]+)>", part).group(1)
+            requestLine = [line.strip() for line in part.splitlines() if line.startswith("GET ")][0]
+            url = urllib.parse.urlparse(requestLine.split(" ")[1])
+            status, response = self.server.drive.answer(url.path, dict(urllib.parse.parse_qsl(url.query)))
+            responseBody += "--" + responseBoundary + "\r\nContent-Type: application/http\r\nContent-ID: <response-" + contentID + ">\r\n\r\n"
+            responseBody += "HTTP/1.1 " + str(status) + " " + ("OK" if status == 200 else "Error") + "\r\nContent-Type: application/json\r\n\r\n" + json.dumps(response) + "\r\n"
+        responseBody += "--" + responseBoundary + "--"
+        self._send(200, "multipart/mixed; boundary=" + responseBoundary, responseBody)
+
+
+    def _send(self, status, contentType, body):
+        body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StandInDriveClient:
+    """
+    GoogleDriveClient using a service of the stand-in, with a connection per thread.
+    """
+
+    def __init__(self, drive):
+        self._service = drive.createService()
+        self._threadLocal = threading.local()
+
+
+    def getService(self):
+        return self._service
+
+
+    def getThreadHttp(self):
+        if not hasattr(self._threadLocal, "http"):
+            self._threadLocal.http = httplib2.Http()
+        return self._threadLocal.http
@@ -0,0 +1,75 @@
+### Validation of required settings and reloads of the config snapshot.
+
+import pytest
+
+import configSnapshot as ConfigSnapshot
+
+
+# Environment of a complete configuration.
+REQUIRED_ENVIRONMENT = {
+    "DB_HOST": "db",
+    "DB_USER": "statechecker",
+    "DB_PW": "password",
+    "DB_NAME": "statechecker",
+    "SERVER_AUTHENTICATION_TOKEN": "token",
+}
+
+
+class RecordingLogger:
+    """
+    Logger recording errors instead of writing log files.
+    """
+    errors = []
+
+    def __init__(self, logScope="check_tools"):
+        pass
+
+    def logError(self, errorToLog):
+        RecordingLogger.errors.append(errorToLog)
+
+
+@pytest.fixture(autouse=True)
+def environment(monkeypatch):
+    for name, value in REQUIRED_ENVIRONMENT.items():
+        monkeypatch.setenv(name, value)
+    for name in ("DB_PW_FILE", "SERVER_AUTHENTICATION_TOKEN_FILE", "DB_POOL_SIZE"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(ConfigSnapshot.Logger, "Logger", RecordingLogger)
+    RecordingLogger.errors = []
+
+
+def test_completeConfigurationIsBuilt():
+    config = ConfigSnapshot.buildConfigSnapshot()
+
+    assert config.databasePassword == "password"
+    assert config.serverAuthenticationToken == "token"
+
+
+@pytest.mark.parametrize("name", ["DB_PW", "SERVER_AUTHENTICATION_TOKEN"])
+def test_missingRequiredSettingIsRejected(monkeypatch, name):
+    monkeypatch.delenv(name)
+
+    with pytest.raises(ValueError, match="Missing required settings"):
+        ConfigSnapshot.buildConfigSnapshot()
+
+
+def test_invalidOptionalSettingFallsBackAndIsLoggedAsError(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "five")
+
+    assert ConfigSnapshot.buildConfigSnapshot().databasePoolSize == 5
+    assert "databasePoolSize (" in RecordingLogger.errors[-1]
+
+
+def test_failedReloadKeepsPreviousSnapshot(monkeypatch):
+    monkeypatch.setattr(ConfigSnapshot, "_currentConfig", None)
+    monkeypatch.setattr(ConfigSnapshot, "_getWatchedFilesSignature", lambda: ("before",))
+    previousConfig = ConfigSnapshot.getConfig()
+
+    # Secret removed, while the process is running.
+    monkeypatch.delenv("DB_PW")
+    monkeypatch.setattr(ConfigSnapshot, "_getWatchedFilesSignature", lambda: ("after",))
+    monkeypatch.setattr(ConfigSnapshot, "_nextReloadCheck", 0.0)
+
+    assert ConfigSnapshot.getConfig() is previousConfig
+    assert "Keeping previous configuration" in RecordingLogger.errors[-1]
+    assert "databasePassword" in RecordingLogger.errors[-1]
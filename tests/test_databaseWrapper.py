@@ -0,0 +1,109 @@
+### Round trips of the heartbeat paths of DatabaseWrapper, counted with a stand-in connection.
+
+import databaseStandIn as DatabaseStandIn
+import databaseWrapper as DatabaseWrapper
+import stateCheckItem as StateCheckItem
+import backupCheckItem as BackupCheckItem
+
+
+# Tokens of the tools and backups known to the stand-in DB.
+KNOWN_TOKENS = {"knownTool": "toolToken", "knownBackup": "backupToken"}
+
+
+# Answer the heartbeat statements like MySQL would for KNOWN_TOKENS.
+def answerHeartbeat(query, params):
+    if query.startswith("UPDATE"):
+        name, token = params[-2], params[-1]
+        return 1 if KNOWN_TOKENS.get(name) == token else 0
+    if query.startswith("INSERT"):
+        return 0 if params[-1] in KNOWN_TOKENS else 1
+    raise AssertionError("Unexpected statement: " + query)
+
+
+def createDatabaseWrapper():
+    connection = DatabaseStandIn.StandInConnection(answerHeartbeat)
+    return connection, DatabaseStandIn.createDatabaseWrapper(connection)
+
+
+def test_heartbeatOfKnownToolIsASingleStatement():
+    connection, dbWrapper = createDatabaseWrapper()
+    stateCheckItem = StateCheckItem.StateCheckItem("knownTool", "toolToken", 5, "description")
+
+    assert dbWrapper.createOrUpdateStateCheck(stateCheckItem) is stateCheckItem
+    assert len(connection.statements) == 1
+    assert connection.statements[0][0].startswith("UPDATE checked_tools")
+    assert connection.commits == 1
+
+
+def test_heartbeatOfUnknownToolInsertsIt():
+    connection, dbWrapper = createDatabaseWrapper()
+    stateCheckItem = StateCheckItem.StateCheckItem("newTool", "newToken", 5)
+
+    assert dbWrapper.upsertStateCheck(stateCheckItem, 1000) == DatabaseWrapper.HEARTBEAT_CREATED
+    assert [query.split()[0] for query, params in connection.statements] == ["UPDATE", "INSERT"]
+
+
+def test_heartbeatWithInvalidTokenIsRejected():
+    connection, dbWrapper = createDatabaseWrapper()
+    stateCheckItem = StateCheckItem.StateCheckItem("knownTool", "wrongToken", 5)
+
+    assert dbWrapper.createOrUpdateStateCheck(stateCheckItem) is None
+    assert len(connection.statements) == 2
+
+
+def test_heartbeatOfKnownBackupIsASingleStatement():
+    connection, dbWrapper = createDatabaseWrapper()
+    backupCheckItem = BackupCheckItem.BackupCheckItem("knownBackup", "backupToken", 60, "1700000000", "hash")
+
+    assert dbWrapper.createOrUpdateBackupCheck(backupCheckItem) is backupCheckItem
+    assert len(connection.statements) == 1
+    assert connection.commits == 1
+
+
+def test_backupCreationDateOnlyChangesWithTheHash():
+    connection, dbWrapper = createDatabaseWrapper()
+    dbWrapper.upsertBackupCheck(BackupCheckItem.BackupCheckItem("knownBackup", "backupToken", 60, "1700000000", "hash"))
+
+    query, params = connection.statements[0]
+    assert "mostRecentBackupFile_creationDate = IF(mostRecentBackupFile_hash <=> %s, mostRecentBackupFile_creationDate, %s)" in query
+    # The date has to be compared before the hash is assigned.
+    assert query.index("mostRecentBackupFile_creationDate =") < query.index("mostRecentBackupFile_hash = %s")
+    assert params[2:5] == ("hash", "1700000000", "hash")
+
+
+def test_bufferedHeartbeatsOfManyToolsAreOneStatementPerChunk():
+    connection, dbWrapper = createDatabaseWrapper()
+    heartbeats = [(StateCheckItem.StateCheckItem("tool" + str(index), "token", 5), 1000) for index in range(1200)]
+
+    dbWrapper.updateLastTimeToolsWereUp(heartbeats, chunkSize=500)
+    assert len(connection.statements) == 3
+    assert connection.commits == 1
+
+
+# Rows of a fleet of tools selected with STATE_CHECK_COLUMNS.
+FLEET = [(index + 1, "tool" + str(index), "description", "token", 5, 1700000000, 0) for index in range(5000)]
+
+
+def answerFleet(query, params):
+    if query == "SELECT " + DatabaseWrapper.STATE_CHECK_COLUMNS + " FROM checked_tools ORDER BY ID":
+        return FLEET
+    raise AssertionError("Unexpected statement: " + query)
+
+
+def test_allToolsOfAFleetAreASingleStatement():
+    connection = DatabaseStandIn.StandInConnection(answerFleet)
+    dbWrapper = DatabaseStandIn.createDatabaseWrapper(connection)
+
+    tools = dbWrapper.getAllToolsToCheck()
+    assert len(connection.statements) == 1
+    assert [tool.name for tool in tools] == [row[1] for row in FLEET]
+
+
+def test_streamedToolsOfAFleetAreASingleStatementFetchedInBatches():
+    connection = DatabaseStandIn.StandInConnection(answerFleet)
+    dbWrapper = DatabaseStandIn.createDatabaseWrapper(connection)
+
+    tools = list(dbWrapper.iterateAllToolsToCheck(batchSize=1000))
+    assert len(connection.statements) == 1
+    assert connection.fetchRoundTrips == 5
+    assert len(tools) == 5000
@@ -0,0 +1,148 @@
+### Reuse of SMTP sessions, reconnects and BCC batches of EmailUtils, against a stand-in for smtplib.SMTP.
+
+import smtplib
+from types import SimpleNamespace
+
+import pytest
+
+import emailUtils as EmailUtils
+
+
+SENDER = "statechecker@example.com"
+
+
+class StandInSMTP:
+    """
+    SMTP session recording sent messages.
+
+    Set failures to the exceptions, that the next calls of a method (e.g. "noop" or "sendmail") raise.
+    """
+    sessions = []
+    failures = {}
+
+    def __init__(self, host, port):
+        self.sentMessages = []
+        self.closed = False
+        self.loggedIn = False
+        StandInSMTP.sessions.append(self)
+
+    def _fail(self, method):
+        if StandInSMTP.failures.get(method):
+            raise StandInSMTP.failures[method].pop(0)
+
+    def ehlo(self):
+        return (250, b"ok")
+
+    def starttls(self):
+        return (220, b"ready")
+
+    def login(self, user, password):
+        self.loggedIn = True
+        return (235, b"authenticated")
+
+    def noop(self):
+        self._fail("noop")
+        return (250, b"ok")
+
+    def sendmail(self, fromAddress, recipients, message):
+        self._fail("sendmail")
+        self.sentMessages.append((fromAddress, list(recipients), message))
+        return {}
+
+    def quit(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def emailUtils(monkeypatch):
+    config = SimpleNamespace(
+        emailEnabled=True,
+        emailSenderUser=SENDER,
+        emailSenderPassword="password",
+        emailSenderHost="smtp.example.com",
+        emailSenderPort=587,
+        emailErrorAddresses=("admin@example.com",),
+        emailInfoAddresses=("info@example.com",),
+    )
+    monkeypatch.setattr(EmailUtils.ConfigSnapshot, "getConfig", lambda: config)
+    monkeypatch.setattr(EmailUtils.smtplib, "SMTP", StandInSMTP)
+    StandInSMTP.sessions = []
+    StandInSMTP.failures = {}
+    return EmailUtils.EmailUtils()
+
+
+def test_sessionOfTheLoginIsReusedForAllEmails(emailUtils):
+    for index in range(3):
+        emailUtils.send_mail("admin@example.com", "Subject " + str(index), "message")
+
+    assert len(StandInSMTP.sessions) == 1
+    assert len(StandInSMTP.sessions[0].sentMessages) == 3
+    metrics = emailUtils.get_metrics()
+    assert metrics["sessions_opened"] == 1
+    assert metrics["sessions_reused"] == 3
+    assert metrics["noops"] == 0
+
+
+def test_idleSessionIsCheckedWithNoopAndReplacedIfDropped(emailUtils, monkeypatch):
+    monkeypatch.setattr(EmailUtils, "SMTP_NOOP_AFTER_IDLE_SECONDS", -1)
+    StandInSMTP.failures["noop"] = [smtplib.SMTPServerDisconnected("Connection unexpectedly closed")]
+
+    emailUtils.send_mail("admin@example.com", "Subject", "message")
+
+    droppedSession, newSession = StandInSMTP.sessions
+    assert droppedSession.closed and droppedSession.sentMessages == []
+    assert newSession.loggedIn and len(newSession.sentMessages) == 1
+    metrics = emailUtils.get_metrics()
+    assert metrics["noops"] == 1
+    assert metrics["sessions_opened"] == 2
+
+
+def test_sessionIdleForTooLongIsClosedWithoutNoop(emailUtils, monkeypatch):
+    monkeypatch.setattr(EmailUtils, "SMTP_MAX_IDLE_SECONDS", -1)
+
+    emailUtils.send_mail("admin@example.com", "Subject", "message")
+
+    assert len(StandInSMTP.sessions) == 2
+    assert StandInSMTP.sessions[0].closed
+    assert emailUtils.get_metrics()["noops"] == 0
+
+
+def test_sessionDroppedWhileSendingIsReconnectedOnce(emailUtils):
+    StandInSMTP.failures["sendmail"] = [smtplib.SMTPServerDisconnected("Connection unexpectedly closed")]
+
+    emailUtils.send_mail("admin@example.com", "Subject", "message")
+
+    assert len(StandInSMTP.sessions) == 2
+    assert len(StandInSMTP.sessions[1].sentMessages) == 1
+    metrics = emailUtils.get_metrics()
+    assert metrics["reconnects"] == 1
+    assert metrics["messages_sent"] == 1
+    assert metrics["send_failures"] == 0
+
+
+def test_failedReconnectIsRaisedForRetry(emailUtils):
+    StandInSMTP.failures["sendmail"] = [smtplib.SMTPServerDisconnected("closed"), smtplib.SMTPServerDisconnected("closed again")]
+
+    with pytest.raises(smtplib.SMTPServerDisconnected):
+        emailUtils.send_mail("admin@example.com", "Subject", "message")
+    assert emailUtils.get_metrics()["send_failures"] == 1
+
+
+def test_manyRecipientsAreSentInBccBatches(emailUtils):
+    recipients = ["user" + str(index) + "@example.com" for index in range(120)]
+
+    emailUtils.send_mail(recipients, "Subject", "message")
+
+    sentMessages = StandInSMTP.sessions[0].sentMessages
+    assert [len(batchRecipients) for fromAddress, batchRecipients, message in sentMessages] == [50, 50, 20]
+    assert [recipient for fromAddress, batchRecipients, message in sentMessages for recipient in batchRecipients] == recipients
+    # The same rendered message, that does not disclose the recipients.
+    renderedMessages = {message for fromAddress, batchRecipients, message in sentMessages}
+    assert len(renderedMessages) == 1
+    renderedMessage = renderedMessages.pop()
+    assert "To: " + SENDER in renderedMessage
+    assert "user0@example.com" not in renderedMessage
+    assert emailUtils.get_metrics()["recipients_sent"] == 120
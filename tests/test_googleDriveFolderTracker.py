@@ -0,0 +1,117 @@
+### Queries of GoogleDriveFolderTracker against a local stand-in for the Drive v3 API.
+
+import pytest
+
+import driveStandIn as DriveStandIn
+import googleDriveFolderTracker as GoogleDriveFolderTracker
+
+
+@pytest.fixture
+def drive():
+    drive = DriveStandIn.StandInDrive()
+    yield drive
+    drive.close()
+
+
+def getNewestFileIDs(results):
+    return {result.folderID: result.newestFile["id"] if result.newestFile else None for result in results}
+
+
+def test_newestFileIsQueriedOrderedByCreationDate(drive):
+    drive.addFile("older", "folderA", "2024-01-01T00:00:00.000Z")
+    drive.addFile("newest", "folderA", "2024-03-01T00:00:00.000Z")
+    drive.addFile("middle", "folderA", "2024-02-01T00:00:00.000Z")
+    tracker = GoogleDriveFolderTracker.GoogleDriveFolderTracker()
+
+    results = tracker.checkFolders(DriveStandIn.StandInDriveClient(drive), ["folderA", "emptyFolder"])
+
+    assert getNewestFileIDs(results) == {"folderA": "newest", "emptyFolder": None}
+    assert results[0].newestFile == {"id": "newest", "name": "newest", "createdTime": "2024-03-01T00:00:00.000Z", "md5Checksum": "md5-newest"}
+    path, params = drive.requests[0]
+    assert path.endswith("/files")
+    assert params["q"] == "'folderA' in parents and trashed = false"
+    assert params["orderBy"] == "createdTime desc"
+    assert params["pageSize"] == "1"
+    assert params["fields"] == "files(" + GoogleDriveFolderTracker.FILE_FIELDS + ")"
+
+
+def test_everyRunQueriesEveryFolderWithoutChangesFeed(drive):
+    drive.addFile("fileA", "folderA", "2024-01-01T00:00:00.000Z")
+    googleDriveClient = DriveStandIn.StandInDriveClient(drive)
+    tracker = GoogleDriveFolderTracker.GoogleDriveFolderTracker()
+
+    tracker.checkFolders(googleDriveClient, ["folderA", "folderB"])
+    tracker.checkFolders(googleDriveClient, ["folderA", "folderB"])
+
+    assert len(drive.requests) == 4
+    assert tracker.getMetrics()["folderQueries"] == 4
+
+
+def test_changesFeedUpdatesNewestFileWithoutQueryingFolders(drive):
+    drive.addFile("fileA", "folderA", "2024-01-01T00:00:00.000Z")
+    googleDriveClient = DriveStandIn.StandInDriveClient(drive)
+    tracker = GoogleDriveFolderTracker.GoogleDriveFolderTracker(useChangesFeed=True)
+    tracker.checkFolders(googleDriveClient, ["folderA", "folderB"])
+    assert drive.getRequestPaths()[0].endswith("/changes/startPageToken")
+
+    drive.addFile("newerFileA", "folderA", "2024-02-01T00:00:00.000Z")
+    drive.addFile("olderFileA", "folderA", "2023-01-01T00:00:00.000Z")
+    drive.addFile("fileB", "folderB", "2024-01-01T00:00:00.000Z")
+    drive.addFile("untrackedFile", "untrackedFolder", "2025-01-01T00:00:00.000Z")
+    drive.requests.clear()
+    results = tracker.checkFolders(googleDriveClient, ["folderA", "folderB"])
+
+    assert getNewestFileIDs(results) == {"folderA": "newerFileA", "folderB": "fileB"}
+    assert len(drive.requests) == 1
+    assert drive.getRequestPaths()[0].endswith("/changes")
+
+
+@pytest.mark.parametrize("removeNewestFile", [
+    lambda drive: drive.removeFile("newestFileA"),
+    lambda drive: drive.trashFile("newestFileA"),
+], ids=["removed", "trashed"])
+def test_goneNewestFileTriggersANewQuery(drive, removeNewestFile):
+    drive.addFile("fileA", "folderA", "2024-01-01T00:00:00.000Z")
+    drive.addFile("newestFileA", "folderA", "2024-02-01T00:00:00.000Z")
+    drive.addFile("fileB", "folderB", "2024-01-01T00:00:00.000Z")
+    googleDriveClient = DriveStandIn.StandInDriveClient(drive)
+    tracker = GoogleDriveFolderTracker.GoogleDriveFolderTracker(useChangesFeed=True)
+    assert getNewestFileIDs(tracker.checkFolders(googleDriveClient, ["folderA", "folderB"]))["folderA"] == "newestFileA"
+
+    removeNewestFile(drive)
+    drive.requests.clear()
+    results = tracker.checkFolders(googleDriveClient, ["folderA", "folderB"])
+
+    assert getNewestFileIDs(results) == {"folderA": "fileA", "folderB": "fileB"}
+    changesRequest, folderQuery = drive.requests
+    assert changesRequest[0].endswith("/changes")
+    assert folderQuery[1]["q"] == "'folderA' in parents and trashed = false"
+
+
+def test_batchRequestsQueryUpToHundredFoldersEach(drive):
+    folderIDs = ["folder" + str(index) for index in range(150)] + ["failingFolder"]
+    for index in range(150):
+        drive.addFile("file" + str(index), "folder" + str(index), "2024-01-01T00:00:00.000Z")
+    tracker = GoogleDriveFolderTracker.GoogleDriveFolderTracker(workerCount=2, useBatchRequests=True)
+
+    results = tracker.checkFolders(DriveStandIn.StandInDriveClient(drive), folderIDs)
+
+    assert sorted(drive.batchSizes) == [51, 100]
+    assert [result.folderID for result in results] == folderIDs
+    assert all(result.newestFile["id"] == "file" + str(index) and result.error is None for index, result in enumerate(results[:150]))
+    # A failed query only fails its own folder.
+    assert results[150].newestFile is None and results[150].error is not None
+    metrics = tracker.getMetrics()
+    assert metrics["batchRequests"] == 2
+    assert metrics["failedFolderQueries"] == 1
+
+
+def test_failedFolderIsQueriedAgainOnTheNextRun(drive):
+    googleDriveClient = DriveStandIn.StandInDriveClient(drive)
+    tracker = GoogleDriveFolderTracker.GoogleDriveFolderTracker(useChangesFeed=True, workerCount=4)
+    tracker.checkFolders(googleDriveClient, ["folderA", "failingFolder"])
+
+    drive.requests.clear()
+    tracker.checkFolders(googleDriveClient, ["folderA", "failingFolder"])
+
+    assert [params.get("q") for path, params in drive.requests[1:]] == ["'failingFolder' in parents and trashed = false"]
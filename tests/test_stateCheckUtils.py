@@ -0,0 +1,83 @@
+### Latency threshold of the website checks, compared against the current response and the p95 of the latest responses.
+
+from types import SimpleNamespace
+
+import pytest
+
+import stateCheckUtils as StateCheckUtils
+import websiteProber as WebsiteProber
+import websiteStateAndMessageSentItem as WebsiteStateAndMessageSentItem
+
+
+URL = "https://websiteToTest.com"
+THRESHOLD_IN_MILLISECONDS = 500
+
+
+class StandInDatabaseWrapper:
+    """
+    Database wrapper knowing a single website, that is up.
+    """
+
+    def createNewWebsiteCheck(self, websiteCheckItem):
+        pass
+
+    def getWebsiteCheckItemByName(self, name):
+        return WebsiteStateAndMessageSentItem.WebsiteStateAndMessageSentItem(name, "Up", False)
+
+
+class StandInProber:
+    """
+    Prober answering every probe of the website after the next latency.
+    """
+
+    def __init__(self):
+        self.latencyInMilliseconds = 0
+
+    def probe(self, urls):
+        return [WebsiteProber.WebsiteProbeResult(url, True, "OK", self.latencyInMilliseconds / 1000, {"ttfb": self.latencyInMilliseconds}) for url in urls]
+
+
+@pytest.fixture
+def checkWebsite(monkeypatch):
+    config = SimpleNamespace(websitesToCheck=(URL,), getWebsiteLatencyThresholdInMilliseconds=lambda url: THRESHOLD_IN_MILLISECONDS)
+    monkeypatch.setattr(StateCheckUtils.ConfigSnapshot, "getConfig", lambda: config)
+    prober = StandInProber()
+    monkeypatch.setattr(StateCheckUtils.WebsiteProber, "getWebsiteProber", lambda: prober)
+    monkeypatch.setattr(StateCheckUtils.LatencyHistogram, "_latencyHistograms", {})
+
+    # Check the website once with the passed latency and return its state.
+    def checkWebsite(latencyInMilliseconds):
+        prober.latencyInMilliseconds = latencyInMilliseconds
+        toolStateItem, = StateCheckUtils.getToolStates_websites(StandInDatabaseWrapper())
+        return toolStateItem
+
+    return checkWebsite
+
+
+def test_singleSlowResponseDoesNotTakeWebsiteDown(checkWebsite):
+    for check in range(50):
+        checkWebsite(100)
+
+    toolStateItem = checkWebsite(900)
+    assert toolStateItem.toolIsUp
+    assert toolStateItem.latency["p95_inMilliseconds"] == 100
+
+
+def test_websiteSlowInMoreThanFivePercentOfResponsesIsDown(checkWebsite):
+    for check in range(50):
+        checkWebsite(100)
+    for check in range(2):
+        assert checkWebsite(900).toolIsUp
+
+    toolStateItem = checkWebsite(900)
+    assert not toolStateItem.toolIsUp
+    assert toolStateItem.statusMessage.startswith("Latency too high: 900 ms (threshold 500 ms")
+
+
+def test_websiteIsUpAgainWithItsFirstFastResponse(checkWebsite):
+    for check in range(10):
+        assert not checkWebsite(900).toolIsUp
+
+    toolStateItem = checkWebsite(100)
+    assert toolStateItem.toolIsUp
+    assert toolStateItem.latency["p95_inMilliseconds"] == 900
@@ -0,0 +1,99 @@
+### Delivery of long telegram messages through the notification outbox, resumed after a failed part.
+
+import os
+import time
+from types import SimpleNamespace
+
+from telebot.apihelper import ApiTelegramException
+
+import notificationOutbox as NotificationOutbox
+import telegramSender as TelegramSender
+import stringUtils
+
+
+# Message split into three parts.
+LONG_TEXT = "\n".join("line " + str(index) + " " + "x" * 90 for index in range(110))
+PARTS = stringUtils.splitLongTextIntoWorkingMessages(LONG_TEXT)
+
+
+class FakeBot:
+    """
+    Bot recording the indexes of the sent parts and failing the parts listed in failures once each.
+    """
+
+    def __init__(self, failures):
+        self.failures = dict(failures)
+        self.sentParts = []
+
+    def send_message(self, chatID, message):
+        part = PARTS.index(message)
+        failure = self.failures.pop(part, None)
+        if failure is not None:
+            raise failure
+        self.sentParts.append(part)
+
+
+def createSender(monkeypatch, bot):
+    monkeypatch.setattr(TelegramSender.ConfigSnapshot, "getConfig", lambda: SimpleNamespace(telegramEnabled=True, telegramBotToken="token"))
+    telegramSender = TelegramSender.TelegramSender()
+    monkeypatch.setattr(telegramSender, "_getBot", lambda botToken: bot)
+    monkeypatch.setattr(telegramSender._rateLimiter, "tryAcquire", lambda chatID: 0)
+    return telegramSender
+
+
+# Deliver the long message (or the deliveries pending in the journal) and wait until nothing is pending anymore.
+def deliver(tmp_path, monkeypatch, telegramSender, enqueue=True):
+    monkeypatch.setattr(NotificationOutbox, "INITIAL_BACKOFF_IN_SECONDS", 0)
+    outbox = NotificationOutbox.NotificationOutbox({"telegram": telegramSender.send}, 1, 3, path=os.path.join(str(tmp_path), "outbox.jsonl"))
+    try:
+        if enqueue:
+            outbox.enqueue("longMessage", [("telegram", "111", None, LONG_TEXT)])
+        deadline = time.monotonic() + 5
+        while outbox.getMetrics()["pendingDeliveries"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return outbox.getMetrics()
+    finally:
+        outbox.close()
+
+
+def test_longTextIsSplitIntoThreeParts():
+    assert len(PARTS) == 3
+
+
+def test_failedPartIsResumedWithoutResendingEarlierParts(tmp_path, monkeypatch):
+    bot = FakeBot({1: ConnectionError("connection reset")})
+    metrics = deliver(tmp_path, monkeypatch, createSender(monkeypatch, bot))
+
+    assert bot.sentParts == [0, 1, 2]
+    assert metrics["deliveredDeliveries"] == 1
+    assert metrics["retriedDeliveries"] == 1
+
+
+def test_rateLimitedPartIsResumedWithoutResendingEarlierParts(tmp_path, monkeypatch):
+    tooManyRequests = ApiTelegramException("sendMessage", None, {"error_code": 429, "description": "Too Many Requests", "parameters": {"retry_after": 0}})
+    bot = FakeBot({2: tooManyRequests})
+    metrics = deliver(tmp_path, monkeypatch, createSender(monkeypatch, bot))
+
+    assert bot.sentParts == [0, 1, 2]
+    assert metrics["deferredDeliveries"] == 1
+
+
+def test_deliveredPartsSurviveRestarts(tmp_path, monkeypatch):
+    journalPath = os.path.join(str(tmp_path), "outbox.jsonl")
+
+    # First part sent, then postponed for longer than the outbox runs.
+    def sendFirstPartOnly(recipient, subject, text, deliveredParts):
+        raise NotificationOutbox.PartiallyDelivered(1, NotificationOutbox.RetryAfter(60))
+
+    outbox = NotificationOutbox.NotificationOutbox({"telegram": sendFirstPartOnly}, 1, 3, path=journalPath)
+    outbox.enqueue("longMessage", [("telegram", "111", None, LONG_TEXT)])
+    deadline = time.monotonic() + 5
+    while not outbox.getMetrics()["deferredDeliveries"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    outbox.close()
+
+    # Postponed deliveries are attempted right away after a restart, starting with the second part.
+    bot = FakeBot({})
+    metrics = deliver(tmp_path, monkeypatch, createSender(monkeypatch, bot), enqueue=False)
+    assert bot.sentParts == [1, 2]
+    assert metrics["deliveredDeliveries"] == 1